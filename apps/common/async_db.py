@@ -1,11 +1,203 @@
-from typing import Awaitable
+import asyncio
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Sequence, TypeVar, Union
 
-from channels.db import database_sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied
+from django.db import close_old_connections
 
 
+logger = logging.getLogger(__name__)
 
-@database_sync_to_async
-def has_perm_async(user: User, permission: str) -> Awaitable[bool]:
+T = TypeVar("T")
+
+
+
+class DatabaseExecutor:
+    """Thread pool running the synchronous (database bound) work of async
+    views and consumers.
+    
+    Each thread holds its own database connection, so the number of threads
+    bounds the number of connections a process opens. Jobs submitted while
+    every thread is busy wait in the pool's queue, the time they wait is kept
+    in a histogram whose buckets' upper bounds (in seconds) are given by
+    `buckets`.
+    
+    A warning is logged, at most once every `warning_interval` seconds, when
+    the saturation of the pool (running and waiting jobs over the number of
+    threads) exceeds `saturation_warning`."""
+    
+    
+    def __init__(self, threads: int, buckets: Sequence[float], saturation_warning: float,
+                 warning_interval: float):
+        self.threads = threads
+        self.buckets = tuple(sorted(buckets))
+        self.saturation_warning = saturation_warning
+        self.warning_interval = warning_interval
+        
+        self.running = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.submitted = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.histogram = [0] * (len(self.buckets) + 1)
+        
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._last_warning = float("-inf")
+    
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """The underlying executor, created on first use so that no thread is
+        started by processes never using it."""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.threads, "async-db")
+        return self._executor
+    
+    
+    @property
+    def saturation(self) -> float:
+        """Number of running and waiting jobs over the number of threads."""
+        return (self.running + self.waiting) / self.threads
+    
+    
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run `func(*args, **kwargs)` in a thread of the pool, propagating
+        the exceptions it raises."""
+        submitted = time.monotonic()
+        with self._lock:
+            self.submitted += 1
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+            self._check_saturation(submitted)
+        
+        context = contextvars.copy_context()
+        future = self.executor.submit(context.run, self._handle, submitted, func, args, kwargs)
+        future.add_done_callback(self._cancelled)
+        return await asyncio.wrap_future(future)
+    
+    
+    def _handle(self, submitted: float, func: Callable[..., T], args: tuple,
+                kwargs: Dict[str, Any]) -> T:
+        """Run `func` in the current thread, updating the metrics of the
+        pool."""
+        wait = time.monotonic() - submitted
+        with self._lock:
+            self.waiting -= 1
+            self.running += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.histogram[bisect.bisect_left(self.buckets, wait)] += 1
+        
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+    
+    
+    def _cancelled(self, future: Future) -> None:
+        """Remove jobs cancelled before being started from the waiting
+        ones."""
+        if future.cancelled():
+            with self._lock:
+                self.waiting -= 1
+    
+    
+    def _check_saturation(self, now: float) -> None:
+        """Log a warning if the pool is saturated, `_lock` must be held."""
+        saturation = self.saturation
+        if saturation <= self.saturation_warning or now - self._last_warning < self.warning_interval:
+            return
+        self._last_warning = now
+        logger.warning(
+            f"Database thread pool saturated ({saturation:.0%}): {self.running} jobs running and "
+            f"{self.waiting} waiting for {self.threads} threads, consider increasing "
+            f"ASYNC_DB_THREADS (and PostgreSQL's max_connections accordingly)"
+        )
+    
+    
+    def stats(self) -> Dict[str, Union[int, float, Dict[str, int]]]:
+        """Return metrics about the use of the pool.
+        
+        * `threads` - Number of threads of the pool.
+        * `running` - Number of jobs currently running.
+        * `waiting` - Number of jobs currently waiting for a thread.
+        * `waiting_max` - Maximum number of jobs that waited at once.
+        * `saturation` - Number of running and waiting jobs over the number
+           of threads.
+        * `submitted` - Number of jobs submitted.
+        * `completed` - Number of jobs finished.
+        * `wait_avg` - Average seconds spent waiting by started jobs.
+        * `wait_max` - Maximum seconds spent waiting by a started job.
+        * `wait_histogram` - Number of started jobs per maximum seconds spent
+           waiting, the last bucket being `inf`."""
+        with self._lock:
+            started = self.submitted - self.waiting
+            return {
+                "threads":        self.threads,
+                "running":        self.running,
+                "waiting":        self.waiting,
+                "waiting_max":    self.max_waiting,
+                "saturation":     self.saturation,
+                "submitted":      self.submitted,
+                "completed":      self.completed,
+                "wait_avg":       self.total_wait / started if started else 0.0,
+                "wait_max":       self.max_wait,
+                "wait_histogram": {
+                    f"{bound:g}": count for bound, count in
+                    zip(self.buckets + (float("inf"),), self.histogram)
+                },
+            }
+
+
+
+database_executor = DatabaseExecutor(
+    settings.ASYNC_DB_THREADS, settings.ASYNC_DB_WAIT_BUCKETS,
+    settings.ASYNC_DB_SATURATION_WARNING, settings.ASYNC_DB_WARNING_INTERVAL
+)
+
+
+
+async def run_sync(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run `func(*args, **kwargs)` in a single hop to `database_executor`.
+    
+    Each hop has a cost (scheduling on the thread pool, waiting for a free
+    thread, closing obsolete database connections before and after), and
+    holds a thread while waiting for the database. Every synchronous work of
+    a request (permission checks, queries, validation, serialization...)
+    should thus be grouped in a single function given to `run_sync()` rather
+    than making one hop per call.
+    
+    Exceptions raised by `func` are propagated."""
+    return await database_executor.run(func, *args, **kwargs)
+
+
+
+async def has_perm_async(user: User, permission: str) -> bool:
     """Asynchronously check if a `User` has a the given permission."""
-    return user.has_perm(permission)
+    # `user` is often lazy and loaded from the session on first access, which
+    # must thus be done in the thread
+    return await run_sync(lambda: user.has_perm(permission))
+
+
+
+def check_perm(user: User, permission: str, message: str) -> None:
+    """Raise `PermissionDenied` with `message` if `user` does not have the
+    given permission."""
+    if not user.has_perm(permission):
+        raise PermissionDenied(message)
@@ -0,0 +1,26 @@
+from typing import List
+
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+
+
+def is_process_local(alias: str) -> bool:
+    """Return whether the Django cache named by `alias` is only seen by the
+    current process (e.g. `LocMemCache`)."""
+    return isinstance(caches[alias], LocMemCache)
+
+
+
+def check_shared_cache(alias: str, setting: str, consequence: str, id: str) -> List[checks.Warning]:
+    """Return a warning of identifier `id` if the cache named by `alias` (set
+    in `setting`) is not shared by every process, `consequence` telling what
+    happens in that case."""
+    if not is_process_local(alias):
+        return []
+    return [checks.Warning(
+        f"Cache '{alias}' ({setting}) is local to each process, {consequence}.",
+        hint=f"Use a cache shared by every process (e.g. Redis or Memcached) for '{alias}'.",
+        id=id,
+    )]
@@ -1,6 +1,10 @@
+import asyncio
+import threading
+
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import User
-from django.test import TransactionTestCase
+from django.core.exceptions import PermissionDenied
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
 
 from common import async_db
 
@@ -16,3 +20,76 @@ class HasPermAsyncTestCase(TransactionTestCase):
         
         self.assertTrue(await async_db.has_perm_async(superuser, "django_sandbox:view_usage"))
         self.assertFalse(await async_db.has_perm_async(user, "django_sandbox:view_usage"))
+
+
+
+class CheckPermTestCase(TestCase):
+    
+    def test_ok(self):
+        superuser = User.objects.create_user("superuser", is_superuser=True)
+        async_db.check_perm(superuser, "django_sandbox.view_usage", "Missing view permission")
+    
+    
+    def test_denied(self):
+        user = User.objects.create_user("user")
+        with self.assertRaisesMessage(PermissionDenied, "Missing view permission"):
+            async_db.check_perm(user, "django_sandbox.view_usage", "Missing view permission")
+
+
+
+class RunSyncTestCase(SimpleTestCase):
+    
+    async def test_ok(self):
+        self.assertEqual(3, await async_db.run_sync(lambda a, b: a + b, 1, b=2))
+    
+    
+    async def test_exception_propagated(self):
+        with self.assertRaises(ValueError):
+            await async_db.run_sync(int, "not an int")
+
+
+
+class DatabaseExecutorTestCase(SimpleTestCase):
+    
+    def setUp(self):
+        self.executor = async_db.DatabaseExecutor(1, (0.1, 1), 2, 60)
+    
+    
+    async def test_run(self):
+        self.assertEqual(3, await self.executor.run(lambda a, b: a + b, 1, b=2))
+        stats = self.executor.stats()
+        self.assertEqual(1, stats["submitted"])
+        self.assertEqual(1, stats["completed"])
+        self.assertEqual(0, stats["running"])
+        self.assertEqual(0, stats["waiting"])
+        self.assertEqual({"0.1": 1, "1": 0, "inf": 0}, stats["wait_histogram"])
+    
+    
+    async def test_run_exception(self):
+        with self.assertRaises(ValueError):
+            await self.executor.run(int, "not an int")
+        self.assertEqual(1, self.executor.stats()["completed"])
+    
+    
+    async def test_cancelled_while_waiting(self):
+        event = threading.Event()
+        running = asyncio.ensure_future(self.executor.run(event.wait))
+        waiting = asyncio.ensure_future(self.executor.run(int, "1"))
+        await asyncio.sleep(0.05)
+        self.assertEqual(1, self.executor.stats()["waiting"])
+        
+        waiting.cancel()
+        await asyncio.sleep(0)
+        self.assertEqual(0, self.executor.stats()["waiting"])
+        event.set()
+        await running
+        self.assertEqual(1, self.executor.stats()["completed"])
+    
+    
+    async def test_saturation_warning(self):
+        self.executor.saturation_warning = 0.5
+        with self.assertLogs("common.async_db", "WARNING") as logs:
+            await self.executor.run(int, "1")
+            await self.executor.run(int, "1")
+        self.assertEqual(1, len(logs.records))
+        self.assertIn("Database thread pool saturated", logs.output[0])
@@ -0,0 +1,25 @@
+from django.test import SimpleTestCase, override_settings
+
+from common.caches import check_shared_cache, is_process_local
+
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared':  {
+        'BACKEND':  'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/tmp/platon_test_cache',
+    },
+})
+class CheckSharedCacheTestCase(SimpleTestCase):
+    
+    def test_process_local(self):
+        self.assertTrue(is_process_local("default"))
+        warnings = check_shared_cache("default", "SETTING", "nothing is shared", "common.W001")
+        self.assertEqual(["common.W001"], [w.id for w in warnings])
+        self.assertIn("SETTING", warnings[0].msg)
+    
+    
+    def test_shared(self):
+        self.assertFalse(is_process_local("shared"))
+        self.assertEqual([], check_shared_cache("shared", "SETTING", "nothing is shared", "common.W001"))
@@ -3,7 +3,8 @@ from asgiref.sync import async_to_sync
 from django.contrib import admin, messages
 from django.utils.translation import ngettext
 
-from .models import CommandResult, ContainerSpecs, Request, Response, Sandbox, SandboxSpecs, Usage
+from .models import (CommandResult, ContainerSpecs, Request, Response, Sandbox, SandboxSpecs, Usage,
+                     UsageAggregate)
 
 
 
@@ -110,6 +111,14 @@ class UsageAdmin(admin.ModelAdmin):
 
 
 
+@admin.register(UsageAggregate)
+class UsageAggregateAdmin(admin.ModelAdmin):
+    """Admin interface for UsageAggregate."""
+    
+    list_display = ('id', 'sandbox', 'resolution', 'date', 'samples')
+
+
+
 @admin.register(Request)
 class RequestAdmin(admin.ModelAdmin):
     """Admin interface for Request."""
@@ -1,15 +1,25 @@
-import json
 import logging
-import sys
 
-from django.apps import AppConfig, apps
+from django.apps import AppConfig
 from django.conf import settings
+from django.core import checks
+from django.db.models.signals import post_delete, post_migrate, post_save
+
+from django_sandbox.fields import CODECS, zstandard
 
 
 logger = logging.getLogger(__name__)
 
 
 
+def sync_periodic_tasks(sender, **kwargs):
+    """Synchronize the periodic tasks of this app once migrated."""
+    from django_sandbox.periodic import sync_periodic_tasks as sync
+    
+    sync()
+
+
+
 class DjangoSandboxConfig(AppConfig):
     name = 'django_sandbox'
     
@@ -19,16 +29,16 @@ class DjangoSandboxConfig(AppConfig):
         
         * SANDBOX_POLL_USAGE_EVERY settings in an integer above 15.
         * SANDBOX_POLL_SPECS_EVERY settings is an integer above 300.
-        * Every existing "poll usage" periodic task are done every
-          SANDBOX_POLL_SPECS_EVERY.
-        * Every existing "poll specifications" periodic task are done every
-          SANDBOX_POLL_USAGE_EVERY.
-        * Every existing Sandbox have a period task for "poll usage" and
-          "poll specification"
+        * SANDBOX_OUTPUT_COMPRESSION settings is a supported codec.
+        
+        Also register the system checks warning about caches which must be
+        shared by every process (`SANDBOX_DETAIL_CACHE` and
+        `SANDBOX_USAGE_SNAPSHOT`).
+        
+        No query is made here since this is run by every process (ASGI and
+        Celery workers, management commands...). Periodic tasks are created by
+        the `sync_periodic_tasks` command, which is also run after `migrate`.
         """
-        if {"makemigrations", "migrate", "reset_db"}.intersection(sys.argv):
-            return
-        # Check settings
         if (not isinstance(settings.SANDBOX_POLL_USAGE_EVERY, int)
                 or settings.SANDBOX_POLL_USAGE_EVERY < 15):
             raise ValueError(
@@ -40,49 +50,24 @@ class DjangoSandboxConfig(AppConfig):
                 f"Incorrect SANDBOX_POLL_SPECS_EVERY settings:{settings.SANDBOX_POLL_SPECS_EVERY}"
             )
         
-        # Load needed models
-        PeriodicTask = apps.get_model(app_label='django_celery_beat', model_name='PeriodicTask')
-        IntervalSchedule = apps.get_model(
-            app_label='django_celery_beat', model_name='IntervalSchedule'
-        )
-        Sandbox = apps.get_model(app_label='django_sandbox', model_name='Sandbox')
+        if settings.SANDBOX_OUTPUT_COMPRESSION not in CODECS:
+            raise ValueError(
+                f"Incorrect SANDBOX_OUTPUT_COMPRESSION settings:"
+                f"{settings.SANDBOX_OUTPUT_COMPRESSION}"
+            )
+        if settings.SANDBOX_OUTPUT_COMPRESSION == "zstd" and zstandard is None:
+            raise ValueError(
+                "SANDBOX_OUTPUT_COMPRESSION is set to 'zstd' but 'zstandard' is not installed"
+            )
         
-        # Retrieving / creating schedules needed for periodic tasks
-        usage_schedule, created = IntervalSchedule.objects.get_or_create(
-            every=settings.SANDBOX_POLL_USAGE_EVERY, period=IntervalSchedule.SECONDS
-        )
-        specs_schedule, created = IntervalSchedule.objects.get_or_create(
-            every=settings.SANDBOX_POLL_SPECS_EVERY,
-            period=IntervalSchedule.SECONDS
-        )
+        post_migrate.connect(sync_periodic_tasks, sender=self)
         
-        # Updating every existing periodic tasks so that they correspond to
-        # SANDBOX_POLL_USAGE_EVERY & SANDBOX_POLL_SPECS_EVERY
-        PeriodicTask.objects.filter(
-            name__startswith="sandbox_poll_usage"
-        ).update(interval=usage_schedule.pk)
-        PeriodicTask.objects.filter(
-            name__startswith="sandbox_poll_specifications"
-        ).update(interval=specs_schedule.pk)
+        from django_sandbox.cache import check_detail_cache
+        from django_sandbox.snapshot import check_usage_snapshot
+        checks.register(check_detail_cache, checks.Tags.caches)
+        checks.register(check_usage_snapshot, checks.Tags.caches)
         
-        # Checking that every sandbox has corresponding periodic tasks
-        for sandbox in Sandbox.objects.all():
-            task_name = f"sandbox_poll_usage_{sandbox.pk}"
-            try:
-                PeriodicTask.objects.get(name=task_name)
-            except PeriodicTask.DoesNotExist:
-                logger.info(f"Creating periodic task to poll usage of sandbox {sandbox}")
-                PeriodicTask.objects.create(
-                    name=task_name, interval=usage_schedule, task='django_sandbox.tasks.poll_usage',
-                    args=json.dumps([sandbox.pk])
-                )
-            
-            task_name = f"sandbox_poll_specifications_{sandbox.pk}"
-            try:
-                PeriodicTask.objects.get(name=task_name)
-            except PeriodicTask.DoesNotExist:
-                logger.info(f"Creating periodic task to poll specifications of sandbox {sandbox}")
-                PeriodicTask.objects.create(
-                    name=task_name, interval=specs_schedule, args=json.dumps([sandbox.pk]),
-                    task='django_sandbox.tasks.poll_specifications',
-                )
+        from django_sandbox.models import Sandbox, Usage
+        from django_sandbox.snapshot import discard_snapshot, update_snapshot
+        post_save.connect(update_snapshot, sender=Usage)
+        post_delete.connect(discard_snapshot, sender=Sandbox)
@@ -0,0 +1,140 @@
+import logging
+import time
+from typing import Callable, Dict, Optional, Union
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+
+class CircuitBreaker:
+    """Circuit breaker of a single sandbox.
+    
+    * `closed` - The sandbox is healthy, every execution is allowed.
+    * `open` - The sandbox failed `threshold` consecutive times, executions
+       are refused until the backoff delay elapses.
+    * `half-open` - The backoff delay elapsed, a single probe execution is
+       allowed. Its success closes the breaker, its failure opens it again with
+       a doubled backoff delay (from `backoff` up to `max_backoff` seconds)."""
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+    
+    
+    def __init__(self, threshold: int, backoff: float, max_backoff: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self.threshold = threshold
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.failures = 0
+        self.trips = 0
+        self.opened_at: float = 0.0
+        self.probing = False
+    
+    
+    @property
+    def delay(self) -> float:
+        """Seconds the breaker stays open since its last trip."""
+        return min(self.backoff * 2 ** max(self.trips - 1, 0), self.max_backoff)
+    
+    
+    @property
+    def state(self) -> str:
+        if self.trips == 0:
+            return self.CLOSED
+        if self.clock() - self.opened_at < self.delay:
+            return self.OPEN
+        return self.HALF_OPEN
+    
+    
+    def allow(self) -> Optional[str]:
+        """Return the state in which an execution is allowed to be sent to the
+        sandbox, or None if it is refused.
+        
+        `HALF_OPEN` is returned when the execution reserved the probe, it must
+        then record its outcome or call `release()`."""
+        state = self.state
+        if state == self.CLOSED:
+            return state
+        if state == self.HALF_OPEN and not self.probing:
+            self.probing = True
+            return state
+        return None
+    
+    
+    def release(self) -> None:
+        """Release the probe reserved by `allow()` without recording any
+        outcome, e.g. if the execution was cancelled."""
+        self.probing = False
+    
+    
+    def record_success(self) -> None:
+        """Record a successful request to the sandbox, closing the breaker."""
+        self.failures = 0
+        self.trips = 0
+        self.probing = False
+    
+    
+    def record_failure(self) -> None:
+        """Record a failed request to the sandbox, opening the breaker after
+        `threshold` consecutive failures or a failed probe."""
+        self.failures += 1
+        if self.trips or self.failures >= self.threshold:
+            self.trips += 1
+            self.opened_at = self.clock()
+            self.probing = False
+
+
+
+class CircuitBreakers:
+    """Circuit breakers of every sandbox of this process, indexed by the
+    primary key of the sandbox."""
+    
+    
+    def __init__(self, threshold: int, backoff: float, max_backoff: float):
+        self.threshold = threshold
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._breakers: Dict[int, CircuitBreaker] = dict()
+    
+    
+    def get(self, sandbox_pk: int) -> CircuitBreaker:
+        """Return the breaker of the sandbox of primary key `sandbox_pk`."""
+        breaker = self._breakers.get(sandbox_pk)
+        if breaker is None:
+            breaker = CircuitBreaker(self.threshold, self.backoff, self.max_backoff)
+            self._breakers[sandbox_pk] = breaker
+        return breaker
+    
+    
+    def record(self, sandbox_pk: int, success: bool) -> None:
+        """Record the outcome of a request to the sandbox of primary key
+        `sandbox_pk`."""
+        breaker = self.get(sandbox_pk)
+        before = breaker.state
+        if success:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+        if breaker.state != before:
+            logger.info(f"Circuit breaker of sandbox {sandbox_pk} is now {breaker.state}")
+    
+    
+    def stats(self) -> Dict[int, Dict[str, Union[str, int]]]:
+        """Return the state and number of consecutive failures of every
+        breaker."""
+        return {
+            pk: {"state": b.state, "failures": b.failures}
+            for pk, b in self._breakers.items()
+        }
+
+
+
+breakers = CircuitBreakers(
+    settings.SANDBOX_BREAKER_THRESHOLD, settings.SANDBOX_BREAKER_BACKOFF,
+    settings.SANDBOX_BREAKER_MAX_BACKOFF
+)
@@ -0,0 +1,155 @@
+import hashlib
+import json
+from typing import Any, Dict, Iterable, Optional, Tuple, Type
+
+import dgeq
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+from common.caches import check_shared_cache
+
+
+
+class ExecutionCache:
+    """Content-addressed cache of the raw responses of deterministic
+    executions.
+    
+    Responses are stored in the Django cache named by `alias`, which is
+    responsible for their expiration and eviction (e.g. `TIMEOUT` and
+    `MAX_ENTRIES` of a `LocMemCache`, which evicts the least recently used
+    entries)."""
+    
+    
+    def __init__(self, alias: str):
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+    
+    
+    @property
+    def cache(self):
+        return caches[self.alias]
+    
+    
+    @staticmethod
+    def cacheable(config: Dict[str, Any]) -> bool:
+        """Whether the execution described by `config` can be cached, the
+        ones saving their environment cannot."""
+        return not config.get("save", False)
+    
+    
+    @staticmethod
+    def key(config: Dict[str, Any], environment: Optional[bytes]) -> str:
+        """Return the key corresponding to an execution of `config` on
+        `environment`."""
+        digest = hashlib.sha256(
+            json.dumps(config, sort_keys=True, separators=(",", ":")).encode()
+        )
+        digest.update(b"\0")
+        digest.update(environment or b"")
+        return f"sandbox_execution_{digest.hexdigest()}"
+    
+    
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the raw response stored under `key`, None if absent."""
+        raw = await sync_to_async(self.cache.get)(key)
+        if raw is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return raw
+    
+    
+    async def set(self, key: str, raw: Dict[str, Any]) -> None:
+        """Store the raw response `raw` under `key`."""
+        await sync_to_async(self.cache.set)(key, raw)
+
+
+
+class DetailCache:
+    """Read-through cache of the serialized rows returned by the detail
+    endpoints, along with their ETag.
+    
+    Rows are stored in the Django cache named by `alias`, which is
+    responsible for their expiration. They must be invalidated whenever the
+    corresponding instance is modified, which is done by signals for saved and
+    deleted instances, but must be done explicitly when using `update()` or
+    `bulk_update()`.
+    
+    Models with many-relations (e.g. `Sandbox` and its usages) cannot be
+    cached, since their rows contain the related primary keys, which change
+    without the instance being saved.
+    
+    Methods are synchronous and make queries on a miss, they should be called
+    through `run_sync()`."""
+    
+    
+    def __init__(self, alias: str):
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+    
+    
+    @property
+    def cache(self):
+        return caches[self.alias]
+    
+    
+    @staticmethod
+    def key(model: Type[models.Model], pk: int) -> str:
+        """Return the key of the instance of `model` of primary key `pk`."""
+        return f"sandbox_detail_{model._meta.model_name}_{pk}"
+    
+    
+    @staticmethod
+    def etag(row: Dict[str, Any]) -> str:
+        """Return the ETag of the serialized row `row`."""
+        content = DjangoJSONEncoder(sort_keys=True, separators=(",", ":")).encode(row)
+        return f'"{hashlib.sha256(content.encode()).hexdigest()[:32]}"'
+    
+    
+    def get(self, model: Type[models.Model], pk: int) -> Tuple[str, Dict[str, Any]]:
+        """Return the ETag and the serialized row of the instance of `model`
+        of primary key `pk`, retrieving it from the database if it is not
+        cached.
+        
+        Raise `model.DoesNotExist` if no such instance exists, and
+        `ValueError` if `model` has many-relations."""
+        if any(f.one_to_many or f.many_to_many for f in model._meta.get_fields()):
+            raise ValueError(f"Rows of model '{model.__name__}' with many-relations cannot be cached")
+        
+        key = self.key(model, pk)
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        
+        self.misses += 1
+        row = dgeq.serialize(model.objects.get(pk=pk))
+        entry = (self.etag(row), row)
+        self.cache.set(key, entry)
+        return entry
+    
+    
+    def invalidate(self, model: Type[models.Model], pks: Iterable[int]) -> None:
+        """Remove the instances of `model` whose primary key are in `pks`."""
+        self.cache.delete_many([self.key(model, pk) for pk in pks])
+
+
+
+execution_cache = ExecutionCache(settings.SANDBOX_EXECUTION_CACHE)
+detail_cache = DetailCache(settings.SANDBOX_DETAIL_CACHE)
+
+
+
+def check_detail_cache(app_configs, **kwargs):
+    """Warn if `SANDBOX_DETAIL_CACHE` is not shared by every process."""
+    return check_shared_cache(
+        detail_cache.alias, "SANDBOX_DETAIL_CACHE",
+        "specifications polled by the Celery workers are not seen by the other processes "
+        "before the entries expire",
+        "django_sandbox.W001"
+    )
@@ -1,15 +1,44 @@
-from channels.generic.websocket import AsyncWebsocketConsumer
-from django.core.exceptions import PermissionDenied
+import asyncio
+import base64
+import binascii
+import io
+import json
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs
 
-from common.async_db import has_perm_async
+import aiohttp
+import dgeq
+from channels.generic.http import AsyncHttpConsumer
+from channels.generic.websocket import AsyncJsonWebsocketConsumer, AsyncWebsocketConsumer
+from django.conf import settings
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from common.async_db import check_perm, has_perm_async, run_sync
+from common.enums import ErrorCode
+from .exceptions import SandboxDisabledError, SandboxError
+from .execution_queue import execution_queue
+from .frames import UsageFrames
+from .models import Request, Sandbox
+from .pool import sandbox_pool
+
+
+logger = logging.getLogger(__name__)
 
 
 
 class UsageConsumer(AsyncWebsocketConsumer):
-    """Allow to automatically receive the last polled Sandbox's Usage."""
+    """Allow to automatically receive the last polled Sandbox's Usage.
+    
+    The format of the frames can be given with the `format` parameter of the
+    query string, either `json` (default), `delta` or `msgpack` (see
+    `UsageFrames`). The connection is rejected if the format is unknown or
+    unavailable."""
     
     sandbox_id: int
     sandbox_group_name: str
+    frames: UsageFrames
     
     
     async def connect(self):
@@ -20,6 +49,13 @@ class UsageConsumer(AsyncWebsocketConsumer):
         self.sandbox_id = self.scope['url_route']['kwargs']['pk']
         self.sandbox_group_name = 'sandbox_usage_%s' % self.sandbox_id
         
+        query = parse_qs(self.scope["query_string"].decode())
+        try:
+            self.frames = UsageFrames(query.get("format", ["json"])[-1])
+        except ValueError:
+            await self.close()
+            return
+        
         await self.channel_layer.group_add(
             self.sandbox_group_name,
             self.channel_name
@@ -38,7 +74,11 @@ class UsageConsumer(AsyncWebsocketConsumer):
     
     async def sandbox_usage(self, event):
         """Send usage to connected consumer."""
-        await self.send(text_data=event['usage'])
+        frame = self.frames.encode(event['usage'])
+        if isinstance(frame, bytes):
+            await self.send(bytes_data=frame)
+        else:
+            await self.send(text_data=frame)
 
 
 
@@ -112,3 +152,402 @@ class ContainerSpecsConsumer(AsyncWebsocketConsumer):
     async def container_specs(self, event):
         """Send container specifications to connected consumer."""
         await self.send(text_data=event['specs'])
+
+
+
+class MonitoringConsumer(AsyncJsonWebsocketConsumer):
+    """Allow to receive the polled usage and specifications of many sandboxes
+    over a single connection.
+    
+    Each message sent to this consumer must be a JSON object containing :
+    
+    * `action` (`str`) - Either `subscribe` or `unsubscribe`.
+    * `subscriptions` (`list`) - List of `[sandbox, stream]` pairs, `sandbox`
+       being the pk of a sandbox and `stream` one of `STREAMS`.
+    * `id` - Optional value echoed back in the answer.
+    
+    It is answered by a `subscribed` or `unsubscribed` frame containing every
+    `subscriptions` of the consumer, or by an `error` frame containing the
+    `message` and `code` of the error, nothing being (un)subscribed then.
+    
+    Updates received for the subscribed pairs during
+    `SANDBOX_MONITORING_BATCH_DELAY` seconds are coalesced into a single
+    `batch` frame containing a list of `updates`, each with the `sandbox`, the
+    `stream` and the serialized object as `data`. Only the last update of
+    each pair is kept.
+    
+    Permissions are checked once, when connecting, the connection is refused
+    if the user cannot view any stream."""
+    
+    # Group name (formatted with the pk of the sandbox) and view permission of
+    # each stream.
+    STREAMS = {
+        "usage":           ("sandbox_usage_%s", "django_sandbox.view_usage"),
+        "sandbox_specs":   ("sandbox_sandbox_specs_%s", "django_sandbox.view_sandboxspecs"),
+        "container_specs": ("sandbox_container_specs_%s", "django_sandbox.view_containerspecs"),
+    }
+    
+    streams: Set[str]
+    subscriptions: Set[Tuple[int, str]]
+    _pending: Dict[Tuple[int, str], str]
+    _flusher: Optional[asyncio.Task]
+    
+    
+    async def connect(self):
+        """Connect this consumer."""
+        user = self.scope["user"]
+        self.streams = await run_sync(lambda: {
+            stream for stream, (_, permission) in self.STREAMS.items() if user.has_perm(permission)
+        })
+        if not self.streams:
+            raise PermissionDenied()
+        
+        self.subscriptions = set()
+        self._pending = dict()
+        self._flusher = None
+        await self.accept()
+    
+    
+    async def disconnect(self, close_code):
+        """Disconnect this consumer."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+        await asyncio.gather(*(
+            self.channel_layer.group_discard(self.STREAMS[s][0] % pk, self.channel_name)
+            for pk, s in self.subscriptions
+        ))
+    
+    
+    def _parse(self, content: Any) -> Tuple[str, Set[Tuple[int, str]]]:
+        """Return the action and the `(sandbox, stream)` pairs of `content`,
+        raising `ValidationError` if it is malformed."""
+        if not isinstance(content, dict) or content.get("action") not in ("subscribe", "unsubscribe"):
+            raise ValidationError({"action": ["Must be either 'subscribe' or 'unsubscribe'"]})
+        
+        subscriptions = content.get("subscriptions")
+        if not isinstance(subscriptions, list) or not all(
+                isinstance(p, list) and len(p) == 2 and type(p[0]) is int and p[1] in self.STREAMS
+                for p in subscriptions):
+            raise ValidationError({"subscriptions": [
+                f"Must be a list of [sandbox, stream] pairs, stream being one of "
+                f"{list(self.STREAMS)}"
+            ]})
+        
+        return content["action"], {tuple(p) for p in subscriptions}
+    
+    
+    async def receive_json(self, content, **kwargs):
+        """Subscribe to or unsubscribe from the pairs given in `content`."""
+        frame_id = content.get("id") if isinstance(content, dict) else None
+        try:
+            action, pairs = self._parse(content)
+            if action == "subscribe":
+                await self.subscribe(pairs)
+            else:
+                await self.unsubscribe(pairs)
+        except (PermissionDenied, ValidationError) as e:
+            return await self.send_json({
+                "id":      frame_id,
+                "type":    "error",
+                "message": str(e.message_dict) if isinstance(e, ValidationError) else str(e),
+                "code":    ErrorCode.from_exception(e).value,
+            })
+        
+        await self.send_json({
+            "id":            frame_id,
+            "type":          f"{action}d",
+            "subscriptions": sorted(self.subscriptions),
+        })
+    
+    
+    async def subscribe(self, pairs: Set[Tuple[int, str]]) -> None:
+        """Subscribe to every `(sandbox, stream)` of `pairs`."""
+        denied = {s for _, s in pairs} - self.streams
+        if denied:
+            raise PermissionDenied(f"Missing view permission on streams {sorted(denied)}")
+        
+        pairs = pairs - self.subscriptions
+        maximum = settings.SANDBOX_MONITORING_MAX_SUBSCRIPTIONS
+        if len(self.subscriptions) + len(pairs) > maximum:
+            raise ValidationError({"subscriptions": [
+                f"Cannot subscribe to more than {maximum} pairs"
+            ]})
+        
+        self.subscriptions |= pairs
+        await asyncio.gather(*(
+            self.channel_layer.group_add(self.STREAMS[s][0] % pk, self.channel_name)
+            for pk, s in pairs
+        ))
+    
+    
+    async def unsubscribe(self, pairs: Set[Tuple[int, str]]) -> None:
+        """Unsubscribe from every `(sandbox, stream)` of `pairs`."""
+        pairs &= self.subscriptions
+        self.subscriptions -= pairs
+        for pair in pairs:
+            self._pending.pop(pair, None)
+        await asyncio.gather(*(
+            self.channel_layer.group_discard(self.STREAMS[s][0] % pk, self.channel_name)
+            for pk, s in pairs
+        ))
+    
+    
+    def queue(self, sandbox: int, stream: str, data: str) -> None:
+        """Queue `data` to be sent in the next batch, replacing the update of
+        the same pair already queued."""
+        if (sandbox, stream) not in self.subscriptions:  # Received after unsubscribing
+            return
+        self._pending[(sandbox, stream)] = data
+        if self._flusher is None:
+            self._flusher = asyncio.get_running_loop().create_task(self.flush())
+    
+    
+    async def flush(self) -> None:
+        """Wait for `SANDBOX_MONITORING_BATCH_DELAY` seconds and send the queued
+        updates in a single frame."""
+        await asyncio.sleep(settings.SANDBOX_MONITORING_BATCH_DELAY)
+        pending, self._pending, self._flusher = self._pending, dict(), None
+        await self.send_json({
+            "type":    "batch",
+            "updates": [
+                {"sandbox": pk, "stream": s, "data": json.loads(data)}
+                for (pk, s), data in pending.items()
+            ],
+        })
+    
+    
+    async def sandbox_usage(self, event):
+        """Queue the usage of a sandbox."""
+        self.queue(event["sandbox"], "usage", event["usage"])
+    
+    
+    async def sandbox_specs(self, event):
+        """Queue the sandbox specifications of a sandbox."""
+        self.queue(event["sandbox"], "sandbox_specs", event["specs"])
+    
+    
+    async def container_specs(self, event):
+        """Queue the container specifications of a sandbox."""
+        self.queue(event["sandbox"], "container_specs", event["specs"])
+
+
+
+class ExecutionConsumer(AsyncJsonWebsocketConsumer):
+    """Allow to execute on a sandbox and receive the progress of the
+    execution as it happens.
+    
+    Each message sent to this consumer submits an execution to the execution
+    queue. It must be a JSON object containing :
+    
+    * `config` (`dict`) - Config of the execution, see `Sandbox.execute()`.
+    * `environment` (`str`) - Optional base64-encoded tgz of the environment.
+    * `sandbox` (`int`) - Optional pk of the sandbox to execute on, selected
+       by the scheduler if missing.
+    * `course` (`str`) - Optional identifier of the course the execution
+       belongs to.
+    * `id` - Optional value echoed back in every frame of this execution.
+    
+    The following frames are then sent, each containing the `id` and the
+    `type` of the frame :
+    
+    * `queued` - The execution has been queued, contains the `ticket` id.
+    * `started` - The execution left the queue, contains the `sandbox` pk.
+    * `command` - Contains the serialized `CommandResult` of a command as
+       `result`, as well as its `index`.
+    * `response` - Contains the serialized `Request` and `Response` as
+       `request` and `response`, ends the execution.
+    * `error` - Contains the `message` and `code` of the error, ends the
+       execution.
+    
+    Since the sandbox only answers once every command has been executed,
+    `command` frames are sent as soon as the answer is received, before the
+    `response` frame."""
+    
+    _tasks: Set[asyncio.Task]
+    
+    
+    @classmethod
+    async def encode_json(cls, content):
+        return DjangoJSONEncoder().encode(content)
+    
+    
+    async def connect(self):
+        """Connect this consumer."""
+        if not await has_perm_async(self.scope["user"], "django_sandbox.add_request"):
+            raise PermissionDenied()
+        
+        self._tasks = set()
+        await self.accept()
+    
+    
+    async def disconnect(self, close_code):
+        """Disconnect this consumer, the submitted executions still run to
+        completion."""
+        for task in self._tasks:
+            task.cancel()
+    
+    
+    async def receive_json(self, content, **kwargs):
+        """Submit an execution and stream its progress in the background."""
+        task = asyncio.get_running_loop().create_task(self.execute(content))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    
+    async def execute(self, content: Any) -> None:
+        """Submit the execution described by `content` and send its
+        progress."""
+        frame_id = content.get("id") if isinstance(content, dict) else None
+        ticket = None
+        try:
+            if not isinstance(content, dict) or not isinstance(content.get("config"), dict):
+                raise ValidationError({"config": ["This field must be an object"]})
+            
+            environment = None
+            if content.get("environment") is not None:
+                try:
+                    environment = io.BytesIO(
+                        base64.b64decode(content["environment"], validate=True)
+                    )
+                except (binascii.Error, TypeError):
+                    raise ValidationError({"environment": ["Invalid base64 content"]})
+            
+            sandbox = None
+            if content.get("sandbox") is not None:
+                if not isinstance(content["sandbox"], int) or isinstance(content["sandbox"], bool):
+                    raise ValidationError({"sandbox": ["This field must be an integer"]})
+                sandbox = await run_sync(Sandbox.objects.get, pk=content["sandbox"])
+            
+            ticket = await execution_queue.submit(
+                self.scope["user"], content["config"], environment, sandbox,
+                content.get("course")
+            )
+            await self.send_json({"id": frame_id, "type": "queued", "ticket": ticket.id})
+            
+            await ticket.started.wait()
+            await self.send_json({"id": frame_id, "type": "started", "sandbox": ticket.sandbox.pk})
+            
+            request = await ticket
+            for frame in await run_sync(self._result_frames, request):
+                await self.send_json({"id": frame_id, **frame})
+        
+        except (Sandbox.DoesNotExist, SandboxError, ValidationError) as e:
+            await self.send_error(
+                frame_id, str(e.message_dict) if isinstance(e, ValidationError) else str(e), e
+            )
+        
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            await self.send_error(frame_id, f"Could not reach the sandbox: {e!r}", e)
+        
+        except asyncio.CancelledError as e:
+            if ticket is None or not ticket.done():
+                raise  # The consumer is disconnecting
+            await self.send_error(frame_id, "The execution was cancelled", e)
+        
+        except Exception as e:
+            logger.exception(f"Execution submitted through websocket failed (frame id '{frame_id}')")
+            await self.send_error(frame_id, f"An unexpected error occurred: {e!r}", e)
+    
+    
+    async def send_error(self, frame_id: Any, message: str, exception: BaseException) -> None:
+        """Send the terminal `error` frame of the execution of id
+        `frame_id`."""
+        await self.send_json({
+            "id":      frame_id,
+            "type":    "error",
+            "message": message,
+            "code":    ErrorCode.from_exception(exception).value,
+        })
+    
+    
+    @staticmethod
+    def _result_frames(request: Request) -> List[Dict[str, Any]]:
+        """Return the `command` and `response` frames of `request`."""
+        frames = list()
+        if request.response is not None:
+            for i, result in enumerate(request.response.execution.order_by("pk")):
+                frames.append({"type": "command", "index": i, "result": dgeq.serialize(result)})
+        frames.append({
+            "type":     "response",
+            "request":  dgeq.serialize(request),
+            "response": dgeq.serialize(request.response) if request.response else None,
+        })
+        return frames
+
+
+
+class DownloadConsumer(AsyncHttpConsumer):
+    """Allow to download an environment (or only one of its files with the
+    `file` parameter) stored on a sandbox.
+    
+    The response of the sandbox is streamed to the client by chunks of
+    `SANDBOX_DOWNLOAD_CHUNK_SIZE` bytes, the environment is thus never held in
+    memory. The `Range` header is forwarded to the sandbox and its partial
+    response relayed as is."""
+    
+    # Headers of the sandbox's response relayed to the client.
+    RELAYED_HEADERS = (
+        "Accept-Ranges", "Content-Disposition", "Content-Length", "Content-Range", "Content-Type",
+        "ETag", "Last-Modified",
+    )
+    
+    
+    async def send_error(self, status: int, e: Exception):
+        """Send a JSON error response similar to the one of the views."""
+        await self.send_response(
+            status,
+            json.dumps({
+                "status":  False,
+                "message": str(e),
+                "code":    ErrorCode.from_exception(e).value
+            }).encode(),
+            headers=[(b"Content-Type", b"application/json")],
+        )
+    
+    
+    async def handle(self, body):
+        kwargs = self.scope["url_route"]["kwargs"]
+        query = parse_qs(self.scope["query_string"].decode())
+        headers = dict(self.scope["headers"])
+        
+        try:
+            def get():
+                check_perm(
+                    self.scope["user"], "django_sandbox.view_response",
+                    "Missing view permission on Response"
+                )
+                return Sandbox.objects.get(pk=kwargs["pk"])
+            
+            sandbox = await run_sync(get)
+            if not sandbox.enabled:
+                raise SandboxDisabledError("Cannot retrieve from a disabled sandbox")
+        except PermissionDenied as e:
+            return await self.send_error(403, e)
+        except Sandbox.DoesNotExist as e:
+            return await self.send_error(404, e)
+        except SandboxDisabledError as e:
+            return await self.send_error(400, e)
+        
+        url = sandbox.download_url(kwargs["environment"], query.get("file", [None])[-1])
+        forwarded = {"Range": headers[b"range"].decode()} if b"range" in headers else {}
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=60)
+        started = False
+        try:
+            async with sandbox_pool.acquire_session(sandbox.url) as session:
+                async with session.get(url, headers=forwarded, timeout=timeout) as response:
+                    await self.send_headers(status=response.status, headers=[
+                        (name.encode(), response.headers[name].encode())
+                        for name in self.RELAYED_HEADERS if name in response.headers
+                    ])
+                    started = True
+                    async for chunk in response.content.iter_chunked(
+                            settings.SANDBOX_DOWNLOAD_CHUNK_SIZE):
+                        await self.send_body(chunk, more_body=True)
+                    await self.send_body(b"")
+        except aiohttp.ClientError as e:  # pragma: no cover
+            if not started:
+                return await self.send_error(502, e)
+            # The status has already been sent, the response is ended early so
+            # that the client sees a truncated body (shorter than its length)
+            logger.warning(f"Download from sandbox {sandbox} interrupted", exc_info=True)
+            await self.send_body(b"")
@@ -0,0 +1,126 @@
+import asyncio
+import hashlib
+import io
+import logging
+import weakref
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from asgiref.sync import sync_to_async
+from dateutil.parser import isoparse
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+
+
+class EnvironmentCache:
+    """Content-addressed cache of the environments uploaded to sandboxes.
+    
+    The first time an environment is sent to a sandbox, it is saved on the
+    sandbox through an execution doing nothing. Its UUID is then stored in the
+    Django cache named by `alias`, under the hash of its content, until it
+    expires on the sandbox (minus `margin` seconds). Subsequent executions of
+    the same environment only send its UUID.
+    
+    Concurrent uploads of the same environment to the same sandbox are
+    coalesced within an event loop."""
+    
+    # Config of the execution used to save an environment on a sandbox.
+    UPLOAD_CONFIG = {"commands": ["true"], "save": True}
+    
+    
+    def __init__(self, alias: Optional[str], margin: float):
+        self.alias = alias
+        self.margin = margin
+        self.hits = 0
+        self.misses = 0
+        self.uploads = 0
+        self._inflight: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Future]]'
+        self._inflight = weakref.WeakKeyDictionary()
+    
+    
+    @property
+    def enabled(self) -> bool:
+        return self.alias is not None
+    
+    
+    @property
+    def cache(self):
+        return caches[self.alias]
+    
+    
+    @staticmethod
+    def key(sandbox_pk: int, content: bytes) -> str:
+        """Return the key of the environment `content` on the sandbox of
+        primary key `sandbox_pk`."""
+        return f"sandbox_environment_{sandbox_pk}_{hashlib.sha256(content).hexdigest()}"
+    
+    
+    def _timeout(self, expire: str, now: datetime = None) -> float:
+        """Return the number of seconds the environment expiring at `expire`
+        can be kept in the cache."""
+        now = now or timezone.now()
+        return (isoparse(expire) - now).total_seconds() - self.margin
+    
+    
+    async def _upload(self, asandbox: Any, key: str, content: bytes) -> Optional[str]:
+        """Save `content` on the sandbox and store its UUID under `key`.
+        
+        Return the UUID, None if the environment could not be saved."""
+        self.uploads += 1
+        raw = await asandbox.execute(dict(self.UPLOAD_CONFIG), io.BytesIO(content))
+        if raw.get("status") != 0 or not raw.get("environment") or "expire" not in raw:
+            logger.warning(f"Could not save environment on the sandbox: {raw}")
+            return None
+        
+        timeout = self._timeout(raw["expire"])
+        if timeout > 0:
+            await sync_to_async(self.cache.set)(key, raw["environment"], timeout)
+        return raw["environment"]
+    
+    
+    async def resolve(self, sandbox_pk: int, asandbox: Any, content: bytes) -> Optional[str]:
+        """Return the UUID of the environment `content` on the sandbox of
+        primary key `sandbox_pk`, uploading it with `asandbox` if needed.
+        
+        Return None if the environment could not be saved on the sandbox."""
+        key = self.key(sandbox_pk, content)
+        environment = await sync_to_async(self.cache.get)(key)
+        if environment is not None:
+            self.hits += 1
+            return environment
+        
+        self.misses += 1
+        inflight = self._inflight.setdefault(asyncio.get_running_loop(), dict())
+        if key in inflight:
+            return await asyncio.shield(inflight[key])
+        
+        future = asyncio.get_running_loop().create_future()
+        inflight[key] = future
+        try:
+            environment = await self._upload(asandbox, key, content)
+            future.set_result(environment)
+            return environment
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieve the exception so that it is not logged if nobody waited for it
+            future.exception()
+            raise
+        finally:
+            del inflight[key]
+    
+    
+    async def invalidate(self, sandbox_pk: int, content: bytes) -> None:
+        """Forget the environment `content` on the sandbox of primary key
+        `sandbox_pk`, e.g. if it was deleted before its expiration."""
+        await sync_to_async(self.cache.delete)(self.key(sandbox_pk, content))
+
+
+
+environment_cache = EnvironmentCache(
+    settings.SANDBOX_ENVIRONMENT_CACHE, settings.SANDBOX_ENVIRONMENT_CACHE_MARGIN
+)
@@ -6,3 +6,21 @@ class SandboxError(Exception):
 class SandboxDisabledError(SandboxError):
     """Raised when trying to launch a request to a disabled Sandbox."""
     pass
+
+
+
+class NoSandboxAvailableError(SandboxError):
+    """Raised when no enabled and reachable Sandbox can be selected."""
+    pass
+
+
+
+class QueueFullError(SandboxError):
+    """Raised when submitting an execution to a full execution queue."""
+    pass
+
+
+
+class SandboxUnavailableError(SandboxError):
+    """Raised when the circuit breaker of a Sandbox refuses a request."""
+    pass
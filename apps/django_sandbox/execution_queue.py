@@ -0,0 +1,285 @@
+import asyncio
+import collections
+import logging
+import time
+import uuid
+from typing import Any, BinaryIO, Deque, Dict, Hashable, Optional, Set, Union
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+
+from django_sandbox.exceptions import QueueFullError
+from django_sandbox.models import Request, Sandbox
+from django_sandbox.scheduling import SandboxScheduler, scheduler as default_scheduler
+
+
+logger = logging.getLogger(__name__)
+
+
+
+class ExecutionTicket:
+    """An execution submitted to an `ExecutionQueue`.
+    
+    The ticket can be awaited to retrieve the resulting `Request`, or polled
+    through `state`, `done()` and `result()`. The `started` event is set once
+    the execution leaves the queue."""
+    
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    
+    
+    def __init__(self, sandbox: Sandbox, user: Union[AnonymousUser, User], config: Dict[str, Any],
+                 environment: Optional[BinaryIO], course: Optional[Hashable], capacity: int):
+        self.id = uuid.uuid4().hex
+        self.sandbox = sandbox
+        self.user = user
+        self.config = config
+        self.environment = environment
+        self.course = course
+        self.capacity = capacity
+        self.state = self.QUEUED
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.started = asyncio.Event()
+        self._future = asyncio.get_running_loop().create_future()
+    
+    
+    def __repr__(self):
+        return f"<ExecutionTicket - {self.id} ({self.state})>"
+    
+    
+    def __await__(self):
+        return asyncio.shield(self._future).__await__()
+    
+    
+    @property
+    def user_key(self) -> Optional[int]:
+        """Key used to enforce the per-user concurrency limit, None for
+        anonymous users."""
+        return self.user.pk if self.user.is_authenticated else None
+    
+    
+    @property
+    def wait_time(self) -> float:
+        """Seconds spent (or being spent) waiting in the queue."""
+        end = self.started_at if self.started_at is not None else time.monotonic()
+        return end - self.submitted_at
+    
+    
+    def done(self) -> bool:
+        """Whether the execution is finished."""
+        return self._future.done()
+    
+    
+    def result(self) -> Request:
+        """Return the resulting `Request`, raise `asyncio.InvalidStateError`
+        if the execution is not finished."""
+        return self._future.result()
+    
+    
+    def status(self) -> Dict[str, Any]:
+        """Return a serializable summary of this ticket."""
+        return {
+            "id":        self.id,
+            "state":     self.state,
+            "sandbox":   self.sandbox.pk,
+            "wait_time": self.wait_time,
+            "request":   self.result().pk if self.state == self.DONE else None,
+        }
+
+
+
+class ExecutionQueue:
+    """Queue executions so that sandboxes are never sent more executions than
+    they have containers.
+    
+    Executions are admitted in submission order as long as :
+    
+    * The target sandbox has a free container (`ContainerSpecs.count`,
+      `default_capacity` if unknown).
+    * The user has less than `max_per_user` running executions.
+    * The course has less than `max_per_course` running executions.
+    
+    Other executions wait in the queue, which holds at most `max_depth`
+    executions, `QueueFullError` being raised beyond.
+    
+    Tickets can be retrieved with `get()` until `ticket_ttl` seconds after
+    their execution finished.
+    
+    The queue is meant to be used from a single event loop, such as the one
+    of the ASGI server."""
+    
+    
+    def __init__(self, max_depth: int, max_per_user: int, max_per_course: int,
+                 default_capacity: int, ticket_ttl: float,
+                 scheduler: SandboxScheduler = default_scheduler):
+        self.max_depth = max_depth
+        self.max_per_user = max_per_user
+        self.max_per_course = max_per_course
+        self.default_capacity = default_capacity
+        self.ticket_ttl = ticket_ttl
+        self.scheduler = scheduler
+        
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        
+        self._waiting: Deque[ExecutionTicket] = collections.deque()
+        self._sandboxes: Dict[int, int] = collections.Counter()
+        self._users: Dict[Optional[int], int] = collections.Counter()
+        self._courses: Dict[Hashable, int] = collections.Counter()
+        self._tasks: Set[asyncio.Task] = set()
+        self._tickets: Dict[str, ExecutionTicket] = dict()
+        self._finished: Deque[ExecutionTicket] = collections.deque()
+    
+    
+    async def _capacity(self, sandbox: Sandbox) -> int:
+        """Return the number of containers of `sandbox`."""
+        for load in await self.scheduler.snapshot():
+            if load.sandbox.pk == sandbox.pk and load.capacity is not None:
+                return load.capacity
+        return self.default_capacity
+    
+    
+    def _admissible(self, ticket: ExecutionTicket) -> bool:
+        """Whether `ticket` can be started without exceeding any limit."""
+        if self._sandboxes[ticket.sandbox.pk] >= ticket.capacity:
+            return False
+        if ticket.user_key is not None and self._users[ticket.user_key] >= self.max_per_user:
+            return False
+        if ticket.course is not None and self._courses[ticket.course] >= self.max_per_course:
+            return False
+        return True
+    
+    
+    def _dispatch(self) -> None:
+        """Start every waiting ticket that can be admitted."""
+        for ticket in list(self._waiting):
+            if not self._admissible(ticket):
+                continue
+            
+            self._waiting.remove(ticket)
+            ticket.state = ExecutionTicket.RUNNING
+            ticket.started_at = time.monotonic()
+            ticket.started.set()
+            self.total_wait += ticket.wait_time
+            self.max_wait = max(self.max_wait, ticket.wait_time)
+            
+            self._sandboxes[ticket.sandbox.pk] += 1
+            self._users[ticket.user_key] += 1
+            if ticket.course is not None:
+                self._courses[ticket.course] += 1
+            
+            task = asyncio.get_running_loop().create_task(self._run(ticket))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    
+    def _expire(self) -> None:
+        """Forget the tickets finished for more than `ticket_ttl` seconds."""
+        now = time.monotonic()
+        while self._finished and now - self._finished[0].finished_at > self.ticket_ttl:
+            del self._tickets[self._finished.popleft().id]
+    
+    
+    async def _run(self, ticket: ExecutionTicket) -> None:
+        """Execute `ticket` and release its slot once done."""
+        try:
+            with self.scheduler.track(ticket.sandbox):
+                request = await ticket.sandbox.execute(
+                    ticket.user, ticket.config, ticket.environment
+                )
+            ticket.state = ExecutionTicket.DONE
+            ticket._future.set_result(request)
+        except Exception as e:  # pragma: no cover
+            logger.exception(f"Queued execution {ticket.id} failed on sandbox {ticket.sandbox}")
+            ticket.state = ExecutionTicket.FAILED
+            ticket._future.set_exception(e)
+        finally:
+            if not ticket._future.done():  # Cancelled
+                ticket.state = ExecutionTicket.FAILED
+                ticket._future.cancel()
+            ticket.finished_at = time.monotonic()
+            self._finished.append(ticket)
+            self.completed += 1
+            self._sandboxes[ticket.sandbox.pk] -= 1
+            self._users[ticket.user_key] -= 1
+            if ticket.course is not None:
+                self._courses[ticket.course] -= 1
+            self._dispatch()
+    
+    
+    async def submit(self, user: Union[AnonymousUser, User], config: Dict[str, Any],
+                     environment: BinaryIO = None, sandbox: Sandbox = None,
+                     course: Hashable = None) -> ExecutionTicket:
+        """Queue an execution, see `Sandbox.execute()`.
+        
+        If `sandbox` is not given, it is selected by the scheduler (see
+        `Sandbox.objects.execute_balanced()`). `course` can be any hashable
+        identifying the course the execution belongs to (e.g. the LTI
+        context's id), it is used to enforce the per-course limit.
+        
+        Raise `QueueFullError` if the queue already holds `max_depth`
+        executions."""
+        if len(self._waiting) >= self.max_depth:
+            self.rejected += 1
+            raise QueueFullError(f"Execution queue is full ({self.max_depth} waiting executions)")
+        
+        if sandbox is None:
+            sandbox = await self.scheduler.select()
+        
+        ticket = ExecutionTicket(
+            sandbox, user, config, environment, course, await self._capacity(sandbox)
+        )
+        self.submitted += 1
+        self._expire()
+        self._tickets[ticket.id] = ticket
+        self._waiting.append(ticket)
+        self._dispatch()
+        return ticket
+    
+    
+    def get(self, ticket_id: str) -> Optional[ExecutionTicket]:
+        """Return the ticket corresponding to `ticket_id`, None if it does not
+        exist or finished for more than `ticket_ttl` seconds."""
+        self._expire()
+        return self._tickets.get(ticket_id)
+    
+    
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Return counters about the use of the queue.
+        
+        * `depth` - Number of executions currently waiting.
+        * `running` - Number of executions currently running.
+        * `submitted` - Number of executions submitted.
+        * `rejected` - Number of executions rejected because the queue was
+           full.
+        * `completed` - Number of executions finished.
+        * `wait_avg` - Average seconds spent waiting by started executions.
+        * `wait_max` - Maximum seconds spent waiting by a started execution.
+        * `wait_oldest` - Seconds the oldest waiting execution has been
+           waiting for."""
+        started = self.submitted - len(self._waiting)
+        return {
+            "depth":       len(self._waiting),
+            "running":     sum(self._sandboxes.values()),
+            "submitted":   self.submitted,
+            "rejected":    self.rejected,
+            "completed":   self.completed,
+            "wait_avg":    self.total_wait / started if started else 0.0,
+            "wait_max":    self.max_wait,
+            "wait_oldest": self._waiting[0].wait_time if self._waiting else 0.0,
+        }
+
+
+
+execution_queue = ExecutionQueue(
+    settings.SANDBOX_QUEUE_MAX_DEPTH, settings.SANDBOX_QUEUE_MAX_PER_USER,
+    settings.SANDBOX_QUEUE_MAX_PER_COURSE, settings.SANDBOX_QUEUE_DEFAULT_CAPACITY,
+    settings.SANDBOX_QUEUE_TICKET_TTL
+)
@@ -0,0 +1,116 @@
+import zlib
+from typing import Any, Optional, Union
+
+from django.conf import settings
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+# First byte of a stored value, telling how the remaining bytes are encoded.
+RAW = b"\x00"
+ZLIB = b"\x01"
+ZSTD = b"\x02"
+
+CODECS = {None: RAW, "zlib": ZLIB, "zstd": ZSTD}
+
+TRUNCATION_MARKER = "\n\n[... {} characters truncated ...]\n\n"
+
+
+
+def truncate(text: str, max_size: Optional[int]) -> str:
+    """Truncate `text` to its first and last `max_size / 2` characters,
+    replacing the middle with a marker. `text` is returned unchanged if
+    `max_size` is None or if it is not longer than `max_size`."""
+    if max_size is None or len(text) <= max_size:
+        return text
+    head = max_size // 2
+    tail = max_size - head
+    return text[:head] + TRUNCATION_MARKER.format(len(text) - max_size) + text[len(text) - tail:]
+
+
+
+def compress(text: str, codec: Optional[str], threshold: int) -> bytes:
+    """Encode `text` using `codec` (`zlib`, `zstd` or None) if it is at least
+    `threshold` bytes long, the codec being stored in the first byte."""
+    data = text.encode()
+    if codec is None or len(data) < threshold:
+        return RAW + data
+    if codec == "zstd":
+        return ZSTD + zstandard.ZstdCompressor().compress(data)
+    return ZLIB + zlib.compress(data)
+
+
+
+def decompress(data: Union[bytes, memoryview]) -> str:
+    """Decode a value encoded by `compress()`."""
+    data = bytes(data)
+    codec, data = data[:1], data[1:]
+    if codec == ZLIB:
+        data = zlib.decompress(data)
+    elif codec == ZSTD:
+        data = zstandard.ZstdDecompressor().decompress(data)
+    return data.decode()
+
+
+
+class CompressedTextAttribute(DeferredAttribute):
+    """Decompress the value of a `CompressedTextField` on first access."""
+    
+    
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, (bytes, memoryview)):
+            value = instance.__dict__[self.field.attname] = decompress(value)
+        return value
+
+
+    def __set__(self, instance, value):
+        # Being a data descriptor, `__get__()` is called even once the value
+        # is in the instance's `__dict__`
+        instance.__dict__[self.field.attname] = value
+
+
+
+class CompressedTextField(models.BinaryField):
+    """A text field truncated to `SANDBOX_OUTPUT_MAX_SIZE` characters and
+    compressed with `SANDBOX_OUTPUT_COMPRESSION` when longer than
+    `SANDBOX_OUTPUT_COMPRESSION_THRESHOLD` bytes.
+    
+    Values are stored as bytes and only decompressed when the attribute is
+    accessed, so that loading a row does not decompress fields that are never
+    used. Since values are compressed, lookups other than `isnull` should not
+    be used on this field."""
+    
+    descriptor_class = CompressedTextAttribute
+
+
+    def _check_str_default_value(self):
+        # Unlike BinaryField, values (and thus defaults) are strings
+        return []
+
+
+    def get_prep_value(self, value: Any) -> Any:
+        if isinstance(value, str):
+            value = compress(
+                truncate(value, settings.SANDBOX_OUTPUT_MAX_SIZE),
+                settings.SANDBOX_OUTPUT_COMPRESSION, settings.SANDBOX_OUTPUT_COMPRESSION_THRESHOLD
+            )
+        return super().get_prep_value(value)
+    
+    
+    def to_python(self, value: Any) -> Any:
+        if isinstance(value, (bytes, memoryview)):
+            return decompress(value)
+        return value
+    
+    
+    def value_to_string(self, obj: models.Model) -> str:
+        return self.value_from_object(obj)
@@ -0,0 +1,86 @@
+import json
+from typing import Any, List, Optional, Tuple, Union
+
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+
+# Formats of the frames a client of `UsageConsumer` can ask for.
+FORMATS = ("json", "delta", "msgpack")
+
+
+
+def flatten(value: Any, path: Tuple[Union[str, int], ...] = ()
+            ) -> Tuple[List[List[Union[str, int]]], List[Any]]:
+    """Flatten the nested dicts and lists of `value` into a list of columns
+    and a list of scalar values.
+    
+    Each column is the path (list of keys and indexes) leading to the value
+    of the same index. Empty dicts and lists are kept as values."""
+    if isinstance(value, dict) and value:
+        items = value.items()
+    elif isinstance(value, list) and value:
+        items = enumerate(value)
+    else:
+        return [list(path)], [value]
+    
+    columns, values = list(), list()
+    for key, item in items:
+        c, v = flatten(item, path + (key,))
+        columns += c
+        values += v
+    return columns, values
+
+
+
+class UsageFrames:
+    """Encode the successive usages of a sandbox sent to a client in the
+    format it asked for :
+    
+    * `json` - The serialized `Usage`, as sent by the poller.
+    * `delta` - The `Usage` flattened into columns (see `flatten()`). A
+       `key` frame containing the `columns` and every `values` is sent first,
+       and every time the columns change (e.g. a filesystem is mounted or the
+       sandbox is not reached anymore). Other frames are `delta` frames,
+       containing the indexes of the `changed` columns since the previous
+       frame and their new `values`.
+    * `msgpack` - The frames of the `delta` format, encoded with MessagePack
+       and sent as binary frames. Requires the `msgpack` package.
+    
+    Since a `delta` frame depends on the previous ones, a new instance must be
+    used for each client."""
+    
+    
+    def __init__(self, format: str):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown usage frame format '{format}', must be one of {FORMATS}")
+        if format == "msgpack" and msgpack is None:
+            raise ValueError("Usage frame format 'msgpack' requires the 'msgpack' package")
+        
+        self.format = format
+        self.columns: Optional[List[List[Union[str, int]]]] = None
+        self.values: Optional[List[Any]] = None
+    
+    
+    def encode(self, usage: str) -> Union[str, bytes]:
+        """Encode `usage`, a JSON serialized `Usage`, into the next frame."""
+        if self.format == "json":
+            return usage
+        
+        columns, values = flatten(json.loads(usage))
+        if columns != self.columns:
+            frame = {"type": "key", "columns": columns, "values": values}
+        else:
+            changed = [
+                i for i, (old, new) in enumerate(zip(self.values, values))
+                if type(old) is not type(new) or old != new
+            ]
+            frame = {"type": "delta", "changed": changed, "values": [values[i] for i in changed]}
+        self.columns, self.values = columns, values
+        
+        if self.format == "msgpack":
+            return msgpack.packb(frame, use_bin_type=True)
+        return json.dumps(frame, separators=(",", ":"))
@@ -0,0 +1,123 @@
+import asyncio
+import time
+import uuid
+from typing import Any, Callable, Dict, List
+
+import dgeq
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from common.async_db import run_sync
+
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Return the `p` percentile (between 0 and 1) of `values`."""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the latency of a PATCH-like request (get, full_clean, save, serialize) doing one "
+        "thread hop per ORM call with one doing all its synchronous work in a single hop."
+    )
+    
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests", type=int, default=1000, help="Number of requests of each scenario."
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=50, help="Number of requests running concurrently."
+        )
+    
+    
+    def handle(self, *args, **options):
+        user = User.objects.create_user(f"benchmark-{uuid.uuid4().hex[:16]}")
+        try:
+            for name, scenario in (("Per-call hops", self.per_call), ("Single hop", self.single)):
+                stats = asyncio.run(
+                    self.run(scenario, user.pk, options["requests"], options["concurrency"])
+                )
+                self.stdout.write(self.style.SUCCESS(name))
+                self.stdout.write(
+                    f"  throughput: {stats['throughput']:.0f} requests/s "
+                    f"({stats['hops']} hops, at most {stats['in_flight']} in flight)\n"
+                    f"  latency (ms): p50={stats['latency'][0.5]:.2f} "
+                    f"p90={stats['latency'][0.9]:.2f} p99={stats['latency'][0.99]:.2f} "
+                    f"max={stats['latency'][1]:.2f}\n"
+                    f"  thread pool wait (ms): p50={stats['wait'][0.5]:.2f} "
+                    f"p90={stats['wait'][0.9]:.2f} p99={stats['wait'][0.99]:.2f} "
+                    f"max={stats['wait'][1]:.2f}"
+                )
+        finally:
+            user.delete()
+    
+    
+    async def run(self, scenario: Callable, pk: int, requests: int,
+                  concurrency: int) -> Dict[str, Any]:
+        """Run `requests` times `scenario`, `concurrency` at a time, and return
+        the latencies of the requests and the time each hop waited for a
+        thread of the pool."""
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = list()
+        waits = list()
+        in_flight = [0, 0]  # current, max
+        
+        async def hop(func: Callable, *args: Any, **kwargs: Any) -> Any:
+            submitted = time.perf_counter()
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+            
+            def timed():
+                waits.append(time.perf_counter() - submitted)
+                return func(*args, **kwargs)
+            
+            try:
+                return await run_sync(timed)
+            finally:
+                in_flight[0] -= 1
+        
+        async def request():
+            async with semaphore:
+                start = time.perf_counter()
+                await scenario(hop, pk)
+                latencies.append(time.perf_counter() - start)
+        
+        start = time.perf_counter()
+        await asyncio.gather(*(request() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+        
+        return {
+            "throughput": requests / elapsed,
+            "hops":       len(waits),
+            "in_flight":  in_flight[1],
+            "latency":    {p: percentile(latencies, p) * 1000 for p in (0.5, 0.9, 0.99, 1)},
+            "wait":       {p: percentile(waits, p) * 1000 for p in (0.5, 0.9, 0.99, 1)},
+        }
+    
+    
+    @staticmethod
+    async def per_call(hop: Callable, pk: int) -> None:
+        """Wrap each ORM call in its own hop, as the views used to."""
+        user = await hop(User.objects.get, pk=pk)
+        user.first_name = "benchmark"
+        await hop(user.full_clean)
+        await hop(user.save)
+        await hop(dgeq.serialize, user)
+    
+    
+    @staticmethod
+    async def single(hop: Callable, pk: int) -> None:
+        """Do every synchronous work of the request in a single hop."""
+        
+        def patch():
+            user = User.objects.get(pk=pk)
+            user.first_name = "benchmark"
+            user.full_clean()
+            user.save()
+            return dgeq.serialize(user)
+        
+        await hop(patch)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from django_sandbox.outputs import compress_outputs, table_sizes
+
+
+
+class Command(BaseCommand):
+    help = "Truncate and compress the outputs of executions saved uncompressed."
+    
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Number of rows rewritten per query."
+        )
+    
+    
+    def handle(self, *args, **options):
+        before = table_sizes()
+        rewritten = compress_outputs(options["batch_size"])
+        after = table_sizes()
+        
+        self.stdout.write(self.style.SUCCESS(f"Outputs compressed: {rewritten} rows rewritten"))
+        for table in before:
+            self.stdout.write(
+                f"{table}: {before[table] / 2 ** 20:.1f} MiB -> {after[table] / 2 ** 20:.1f} MiB"
+            )
+        self.stdout.write(
+            "Space freed by rewritten rows is reused by new rows, run 'VACUUM FULL' on these "
+            "tables to return it to the operating system."
+        )
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from django_sandbox.periodic import sync_periodic_tasks
+
+
+
+class Command(BaseCommand):
+    help = "Create or update the periodic tasks polling sandboxes and compacting their usages."
+    
+    
+    def handle(self, *args, **options):
+        created, updated, deleted = sync_periodic_tasks()
+        self.stdout.write(self.style.SUCCESS(
+            f"Periodic tasks synchronized: {created} created, {updated} updated, {deleted} deleted"
+        ))
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 15:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_sandbox', '0003_auto_20200924_1204'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usage',
+            index=models.Index(fields=['sandbox', '-date'], name='django_sand_sandbox_b0dadc_idx'),
+        ),
+    ]
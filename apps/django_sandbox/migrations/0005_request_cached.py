@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_sandbox', '0004_auto_20261018_1728'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='request',
+            name='cached',
+            field=models.BooleanField(default=False),
+        ),
+    ]
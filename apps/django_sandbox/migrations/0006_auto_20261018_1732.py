@@ -0,0 +1,67 @@
+# Generated by Django 3.1.14 on 2026-10-18 15:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_sandbox', '0005_request_cached'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsageAggregate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.PositiveIntegerField(choices=[(60, 'minute'), (3600, 'hour')])),
+                ('date', models.DateTimeField()),
+                ('samples', models.PositiveIntegerField()),
+                ('reached', models.PositiveIntegerField()),
+                ('cpu_usage_min', models.FloatField(blank=True, null=True)),
+                ('cpu_usage_max', models.FloatField(blank=True, null=True)),
+                ('cpu_usage_avg', models.FloatField(blank=True, null=True)),
+                ('cpu_freq_min', models.FloatField(blank=True, null=True)),
+                ('cpu_freq_max', models.FloatField(blank=True, null=True)),
+                ('cpu_freq_avg', models.FloatField(blank=True, null=True)),
+                ('memory_ram_min', models.BigIntegerField(blank=True, null=True)),
+                ('memory_ram_max', models.BigIntegerField(blank=True, null=True)),
+                ('memory_ram_avg', models.FloatField(blank=True, null=True)),
+                ('memory_swap_min', models.BigIntegerField(blank=True, null=True)),
+                ('memory_swap_max', models.BigIntegerField(blank=True, null=True)),
+                ('memory_swap_avg', models.FloatField(blank=True, null=True)),
+                ('sending_packets_min', models.BigIntegerField(blank=True, null=True)),
+                ('sending_packets_max', models.BigIntegerField(blank=True, null=True)),
+                ('sending_packets_avg', models.FloatField(blank=True, null=True)),
+                ('sending_bytes_min', models.BigIntegerField(blank=True, null=True)),
+                ('sending_bytes_max', models.BigIntegerField(blank=True, null=True)),
+                ('sending_bytes_avg', models.FloatField(blank=True, null=True)),
+                ('receiving_packets_min', models.BigIntegerField(blank=True, null=True)),
+                ('receiving_packets_max', models.BigIntegerField(blank=True, null=True)),
+                ('receiving_packets_avg', models.FloatField(blank=True, null=True)),
+                ('receiving_bytes_min', models.BigIntegerField(blank=True, null=True)),
+                ('receiving_bytes_max', models.BigIntegerField(blank=True, null=True)),
+                ('receiving_bytes_avg', models.FloatField(blank=True, null=True)),
+                ('process_min', models.IntegerField(blank=True, null=True)),
+                ('process_max', models.IntegerField(blank=True, null=True)),
+                ('process_avg', models.FloatField(blank=True, null=True)),
+                ('container_min', models.IntegerField(blank=True, null=True)),
+                ('container_max', models.IntegerField(blank=True, null=True)),
+                ('container_avg', models.FloatField(blank=True, null=True)),
+                ('sandbox', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_aggregates', to='django_sandbox.sandbox')),
+            ],
+            options={
+                'ordering': ['-date', 'sandbox'],
+                'get_latest_by': 'date',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='usageaggregate',
+            index=models.Index(fields=['resolution', 'sandbox', '-date'], name='django_sand_resolut_dea851_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='usageaggregate',
+            unique_together={('sandbox', 'resolution', 'date')},
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.1.14 on 2026-10-18 15:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_sandbox', '0006_auto_20261018_1732'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['sandbox', '-date'], name='django_sand_sandbox_dac10c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['user', '-date'], name='django_sand_user_id_9e7b10_idx'),
+        ),
+    ]
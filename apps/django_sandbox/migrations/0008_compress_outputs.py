@@ -0,0 +1,46 @@
+# Generated by Django 3.1.14 on 2026-10-18 15:51
+
+from django.db import migrations
+import django_sandbox.fields
+
+
+# Existing outputs are converted to bytes, prefixed with the byte marking them as
+# uncompressed (see `django_sandbox.fields.RAW`).
+CONVERT = (
+    'ALTER TABLE "{table}" ALTER COLUMN "{column}" TYPE bytea '
+    'USING decode(\'00\', \'hex\') || convert_to("{column}", \'UTF8\')'
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_sandbox', '0007_auto_20261018_1749'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(CONVERT.format(table="django_sandbox_commandresult", column="stderr")),
+                migrations.RunSQL(CONVERT.format(table="django_sandbox_commandresult", column="stdout")),
+                migrations.RunSQL(CONVERT.format(table="django_sandbox_response", column="result")),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='commandresult',
+                    name='stderr',
+                    field=django_sandbox.fields.CompressedTextField(default=''),
+                ),
+                migrations.AlterField(
+                    model_name='commandresult',
+                    name='stdout',
+                    field=django_sandbox.fields.CompressedTextField(default=''),
+                ),
+                migrations.AlterField(
+                    model_name='response',
+                    name='result',
+                    field=django_sandbox.fields.CompressedTextField(default=''),
+                ),
+            ],
+        ),
+    ]
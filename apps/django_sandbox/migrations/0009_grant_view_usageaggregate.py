@@ -0,0 +1,40 @@
+# Generated by Django 3.1.14 on 2026-10-18 18:20
+
+from django.contrib.auth.management import create_permissions
+from django.db import migrations
+
+
+def grant_view_usageaggregate(apps, schema_editor):
+    """Grant `view_usageaggregate` to every user and group having
+    `view_usage`, aggregates being the rolled up `Usage`."""
+    # Permissions are only created after migrations by default
+    app_config = apps.get_app_config("django_sandbox")
+    app_config.models_module = True
+    create_permissions(app_config, apps=apps, verbosity=0)
+    app_config.models_module = None
+
+    Permission = apps.get_model("auth", "Permission")
+    try:
+        view_usage = Permission.objects.get(
+            content_type__app_label="django_sandbox", codename="view_usage"
+        )
+    except Permission.DoesNotExist:  # pragma: no cover
+        return
+    view_usageaggregate = Permission.objects.get(
+        content_type__app_label="django_sandbox", codename="view_usageaggregate"
+    )
+    view_usageaggregate.user_set.add(*view_usage.user_set.all())
+    view_usageaggregate.group_set.add(*view_usage.group_set.all())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('django_sandbox', '0008_compress_outputs'),
+    ]
+
+    operations = [
+        migrations.RunPython(grant_view_usageaggregate, migrations.RunPython.noop),
+    ]
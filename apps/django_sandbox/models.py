@@ -1,27 +1,160 @@
 import asyncio
-import json
+import io
 import logging
+import time
 import traceback
-from typing import Any, BinaryIO, Dict, Optional, Tuple, Union
+from typing import (Any, BinaryIO, Dict, Iterable, List, Optional, Set, TYPE_CHECKING, Tuple,
+                    Union)
+from urllib.parse import quote, urljoin
 
-from aiohttp import ClientError
-from channels.db import database_sync_to_async
+from aiohttp import ClientError, ServerTimeoutError
 from dateutil.parser import isoparse
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser, User
 from django.contrib.postgres.fields import ArrayField
 from django.core.validators import URLValidator
-from django.db import models
-from django.db.models.signals import post_save
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from django_celery_beat.models import IntervalSchedule, PeriodicTask
-from sandbox_api import ASandbox
 
-from django_sandbox.exceptions import SandboxDisabledError
+from common.async_db import run_sync
+from django_sandbox.breaker import breakers
+from django_sandbox.cache import detail_cache, execution_cache
+from django_sandbox.environments import environment_cache
+from django_sandbox.exceptions import (NoSandboxAvailableError, SandboxDisabledError,
+                                       SandboxUnavailableError)
+from django_sandbox.fields import CompressedTextField
+from django_sandbox.pool import sandbox_pool
+from django_sandbox.retry import latencies, retry_policy
+
+
+if TYPE_CHECKING:  # pragma: no cover
+    from django_sandbox.scheduling import SchedulingPolicy
 
 
 logger = logging.getLogger(__name__)
 
+# Number of rows inserted per query when saving executions in bulk.
+SAVE_BATCH_SIZE = 1000
+
+# Executions still running after a hedged execution returned.
+_hedged: Set[asyncio.Future] = set()
+
+
+
+class SandboxManager(models.Manager):
+    """Manager of `Sandbox`, allowing to execute on an automatically selected
+    sandbox."""
+    
+    
+    async def execute_balanced(self, user: Union[AnonymousUser, User], config: Dict[str, Any],
+                               environment: BinaryIO = None,
+                               policy: Union[str, 'SchedulingPolicy'] = None,
+                               hedge: bool = None) -> 'Request':
+        """Execute a request on the enabled and reachable sandbox selected by
+        `policy`, see `Sandbox.execute()`.
+        
+        `policy` can be a `SchedulingPolicy` or its dotted path, defaulting to
+        `SANDBOX_SCHEDULING_POLICY`. `NoSandboxAvailableError` is raised if no
+        sandbox can be selected.
+        
+        If `hedge` is True (default to `SANDBOX_HEDGE`) and the execution is
+        idempotent, a duplicate is sent to another sandbox when the first one
+        takes longer than the `SANDBOX_HEDGE_PERCENTILE` of the latencies
+        observed so far. The first successful `Request` is returned, the other
+        execution still runs to completion and is recorded as well. If an
+        execution raises, the other one is cancelled."""
+        from django_sandbox.scheduling import get_policy, scheduler
+        
+        policy = get_policy(policy) if policy is not None else None
+        hedge = settings.SANDBOX_HEDGE if hedge is None else hedge
+        sandbox = await scheduler.select(policy)
+        
+        threshold = latencies.percentile(settings.SANDBOX_HEDGE_PERCENTILE)
+        if not hedge or threshold is None or not retry_policy.idempotent(config):
+            with scheduler.track(sandbox):
+                return await sandbox.execute(user, config, environment)
+        
+        content = environment.read() if environment is not None else None
+        
+        async def run(s: Sandbox) -> Request:
+            with scheduler.track(s):
+                return await s.execute(
+                    user, config, io.BytesIO(content) if content is not None else None
+                )
+        
+        tasks = [asyncio.ensure_future(run(sandbox))]
+        done, _ = await asyncio.wait(tasks, timeout=threshold)
+        if not done:
+            try:
+                other = await scheduler.select(policy, exclude={sandbox.pk})
+                tasks.append(asyncio.ensure_future(run(other)))
+                logger.info(f"Hedging execution on sandbox {sandbox} with sandbox {other}")
+            except NoSandboxAvailableError:
+                pass
+        
+        request = None
+        try:
+            for future in asyncio.as_completed(tasks):
+                request = await future
+                if request.success:
+                    break
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        for task in tasks:
+            if not task.done():
+                _hedged.add(task)
+                task.add_done_callback(_hedged.discard)
+        return request
+    
+    
+    async def execute_batch(self, items: Iterable[Tuple[Union[AnonymousUser, User], Dict[str, Any],
+                                                        Optional[BinaryIO]]],
+                            concurrency: int = None, policy: Union[str, 'SchedulingPolicy'] = None,
+                            cache: bool = False) -> List['Request']:
+        """Execute every `(user, config, environment)` of `items`, each on the
+        sandbox selected by `policy` (see `execute_balanced()`).
+        
+        At most `concurrency` executions (default to
+        `SANDBOX_BATCH_CONCURRENCY`) are running at once. Results are saved in
+        bulk (see `ExecutionOutcome.save_all()`) and the created `Request` are
+        returned in the same order as `items`. An item whose execution raises
+        produces a failed `Request` containing the traceback of the error.
+        
+        `NoSandboxAvailableError` is raised if no sandbox can be selected for
+        an item, in which case the remaining executions are cancelled and only
+        the completed ones are saved."""
+        from django_sandbox.scheduling import get_policy, scheduler
+        
+        policy = get_policy(policy) if policy is not None else None
+        semaphore = asyncio.Semaphore(concurrency or settings.SANDBOX_BATCH_CONCURRENCY)
+        
+        async def run(user: Union[AnonymousUser, User], config: Dict[str, Any],
+                      environment: Optional[BinaryIO]) -> ExecutionOutcome:
+            async with semaphore:
+                sandbox = await scheduler.select(policy)
+                with scheduler.track(sandbox):
+                    try:
+                        return await sandbox.perform(user, config, environment, cache)
+                    except Exception as e:
+                        return ExecutionOutcome(
+                            sandbox, user, config, traceback=traceback.format_exc(), exc_info=e
+                        )
+        
+        tasks = [asyncio.ensure_future(run(*item)) for item in items]
+        try:
+            outcomes = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            completed = [t.result() for t in tasks if not t.cancelled() and t.exception() is None]
+            await run_sync(ExecutionOutcome.save_all, completed)
+            raise
+        return await run_sync(ExecutionOutcome.save_all, list(outcomes))
+
 
 
 class Sandbox(models.Model):
@@ -32,6 +165,8 @@ class Sandbox(models.Model):
     )
     enabled = models.BooleanField()
     
+    objects = SandboxManager()
+    
     
     class Meta:
         verbose_name_plural = "Sandboxes"
@@ -41,27 +176,13 @@ class Sandbox(models.Model):
         return f"<Sandbox - {self.name} ({self.pk})>"
     
     
-    @receiver(post_save, sender='django_sandbox.Sandbox')
-    def create_periodic_tasks(sender, instance, created, **kwargs):
-        """Create a periodic tasks to poll specs and usage of this Sandbox."""
-        if created:
-            usage_schedule, created = IntervalSchedule.objects.get_or_create(
-                every=settings.SANDBOX_POLL_USAGE_EVERY, period=IntervalSchedule.SECONDS
-            )
-            specs_schedule, created = IntervalSchedule.objects.get_or_create(
-                every=settings.SANDBOX_POLL_SPECS_EVERY,
-                period=IntervalSchedule.SECONDS
-            )
-            logger.info(f"Creating periodic task to poll usage of sandbox {instance}")
-            PeriodicTask.objects.create(
-                name=f"sandbox_poll_usage_{instance.pk}", interval=usage_schedule,
-                task='django_sandbox.tasks.poll_usage', args=json.dumps([instance.pk])
-            )
-            logger.info(f"Creating periodic task to poll specifications of sandbox {instance}")
-            PeriodicTask.objects.create(
-                name=f"sandbox_poll_specifications_{instance.pk}", interval=specs_schedule,
-                task='django_sandbox.tasks.poll_specifications', args=json.dumps([instance.pk])
-            )
+    async def fetch_specifications(self) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Fetch the raw specifications and libraries of the sandbox, without
+        saving them (see `SandboxSpecs.update_from()` and
+        `ContainerSpecs.update_from()`)."""
+        async with sandbox_pool.acquire(self.url) as asandbox:
+            raw_specs, libs = await asyncio.gather(asandbox.specifications(), asandbox.libraries())
+        return raw_specs, libs
     
     
     async def poll_specifications(self) -> Tuple['SandboxSpecs', 'ContainerSpecs']:
@@ -72,74 +193,63 @@ class Sandbox(models.Model):
         if not self.enabled:
             raise SandboxDisabledError("Cannot poll specifications of a disabled sandbox")
         
-        async with ASandbox(self.url) as asandbox:
-            raw_specs, libs = await asyncio.gather(asandbox.specifications(), asandbox.libraries())
-        
-        host, container = raw_specs["host"], raw_specs["container"]
+        raw_specs, libs = await self.fetch_specifications()
         
-        aw1 = database_sync_to_async(SandboxSpecs.objects.filter(sandbox=self).update)(
-            polled=True, sandbox_version=host["sandbox_version"],
-            docker_version=host["docker_version"], cpu_core=host["cpu"]["core"],
-            cpu_logical=host["cpu"]["logical"], cpu_freq_min=host["cpu"]["freq_min"],
-            cpu_freq_max=host["cpu"]["freq_max"], memory_ram=host["memory"]["ram"],
-            memory_swap=host["memory"]["swap"], memory_storage=host["memory"]["storage"]
-        )
-        aw2 = database_sync_to_async(ContainerSpecs.objects.filter(sandbox=self).update)(
-            polled=True, working_dir_device=container["working_dir_device"],
-            count=container["count"], process=container["process"],
-            cpu_count=container["cpu"]["count"], cpu_period=container["cpu"]["period"],
-            cpu_shares=container["cpu"]["shares"], cpu_quota=container["cpu"]["quota"],
-            memory_ram=container["memory"]["ram"], memory_swap=container["memory"]["swap"],
-            memory_storage=container["memory"]["storage"],
-            writing_io=container["io"]["read_iops"], writing_bytes=container["io"]["read_bps"],
-            reading_io=container["io"]["write_iops"], reading_bytes=container["io"]["write_bps"],
-            libraries=libs["libraries"], bin=libs["bin"]
-        )
-        await asyncio.gather(aw1, aw2)
+        def save():
+            with transaction.atomic():
+                host = SandboxSpecs.objects.get(sandbox=self)
+                host.update_from(raw_specs)
+                host.save()
+                container = ContainerSpecs.objects.get(sandbox=self)
+                container.update_from(raw_specs, libs)
+                container.save()
+            return host, container
         
-        host = await database_sync_to_async(SandboxSpecs.objects.get)(sandbox=self)
-        container = await database_sync_to_async(ContainerSpecs.objects.get)(sandbox=self)
-        
-        return host, container
+        return await run_sync(save)
     
     
-    async def poll_usage(self) -> 'Usage':
-        """Poll the current usage of the Sandbox.
+    async def fetch_usage(self) -> 'Usage':
+        """Fetch the current usage of the Sandbox, without saving it.
         
-        If the sandbox is disabled, a `SandboxUsage` with its field `enabled`
-        will be produced, all the other fields, with the exception of `sandbox`
-        and `date` will be None."""
+        If the sandbox is disabled, the returned `Usage` will have its field
+        `enabled` set to False. If the sandbox could not be reached, it will
+        have its field `reached` set to False. In both cases, all the other
+        fields, with the exception of `sandbox` and `date` will be None."""
         if not self.enabled:
-            return await database_sync_to_async(Usage.objects.create)(
-                sandbox=self, enabled=False
-            )
+            return Usage(sandbox=self, enabled=False)
         
         try:
-            async with ASandbox(self.url) as asandbox:
+            async with sandbox_pool.acquire(self.url) as asandbox:
                 raw = await asandbox.usage()
-            
-            usage = await database_sync_to_async(Usage.objects.create)(
-                sandbox=self, cpu_usage=[raw["cpu"]["usage"]] + raw["cpu"]["usage_avg"],
-                cpu_freq=raw["cpu"]["frequency"], memory_ram=raw["memory"]["ram"],
-                memory_swap=raw["memory"]["swap"], memory_storage=raw["memory"]["storage"],
-                writing_io=raw["io"]["read_iops"], writing_bytes=raw["io"]["read_bps"],
-                reading_io=raw["io"]["write_iops"], reading_bytes=raw["io"]["write_bps"],
-                process=raw["process"], container=raw["container"],
-                sending_packets=raw["network"]["sent_packets"],
-                sending_bytes=raw["network"]["sent_bytes"],
-                receiving_packets=raw["network"]["received_packets"],
-                receiving_bytes=raw["network"]["received_bytes"]
-            )
         except ClientError:  # pragma: no cover
-            usage = await database_sync_to_async(Usage.objects.create)(
-                sandbox=self, reached=False
-            )
+            breakers.record(self.pk, False)
+            return Usage(sandbox=self, reached=False)
+        breakers.record(self.pk, True)
         
+        return Usage(
+            sandbox=self, cpu_usage=[raw["cpu"]["usage"]] + raw["cpu"]["usage_avg"],
+            cpu_freq=raw["cpu"]["frequency"], memory_ram=raw["memory"]["ram"],
+            memory_swap=raw["memory"]["swap"], memory_storage=raw["memory"]["storage"],
+            writing_io=raw["io"]["read_iops"], writing_bytes=raw["io"]["read_bps"],
+            reading_io=raw["io"]["write_iops"], reading_bytes=raw["io"]["write_bps"],
+            process=raw["process"], container=raw["container"],
+            sending_packets=raw["network"]["sent_packets"],
+            sending_bytes=raw["network"]["sent_bytes"],
+            receiving_packets=raw["network"]["received_packets"],
+            receiving_bytes=raw["network"]["received_bytes"]
+        )
+    
+    
+    async def poll_usage(self) -> 'Usage':
+        """Poll and save the current usage of the Sandbox, see
+        `fetch_usage()`."""
+        usage = await self.fetch_usage()
+        await run_sync(usage.save)
         return usage
     
     
     async def execute(self, user: Union[AnonymousUser, User], config: Dict[str, Any],
-                      environment: BinaryIO = None) -> 'Request':
+                      environment: BinaryIO = None, cache: bool = False) -> 'Request':
         """Execute a request on the Sandbox based on `config` and
         `environment`.
         
@@ -172,51 +282,155 @@ class Sandbox(models.Model):
                `expire` field (ISO 8601 format). If the field save is
                missing, it is assumed to be False.
                
-        The sandbox must be enabled, a failed SandboxExecution will be produced
-        otherwise."""
+        If `cache` is True and `config` does not ask to save the environment,
+        the response is looked up in the execution cache (see
+        `SANDBOX_EXECUTION_CACHE`) using a hash of `config` and `environment`.
+        On a hit, the sandbox is not contacted and the resulting `Request` is
+        marked as `cached`. Responses for which an error occurred on the
+        sandbox are never cached.
+        
+        Identical environments are only sent once to the sandbox, see
+        `SANDBOX_ENVIRONMENT_CACHE`.
+        
+        Idempotent executions failing to reach the sandbox are retried, see
+        `SANDBOX_RETRY_ATTEMPTS`.
+        
+        The sandbox must be enabled and its circuit breaker (see
+        `django_sandbox.breaker`) must allow the execution, a failed
+        SandboxExecution will be produced otherwise."""
+        outcome = await self.perform(user, config, environment, cache)
+        return (await run_sync(ExecutionOutcome.save_all, [outcome]))[0]
+    
+    
+    async def perform(self, user: Union[AnonymousUser, User], config: Dict[str, Any],
+                      environment: BinaryIO = None, cache: bool = False) -> 'ExecutionOutcome':
+        """Execute a request on the Sandbox like `execute()`, but return the
+        outcome of the execution without saving it.
+        
+        Outcomes can then be saved in bulk with `ExecutionOutcome.save_all()`."""
         try:
             if not self.enabled:
                 raise SandboxDisabledError("Cannot execute on a disabled sandbox")
             
-            async with ASandbox(self.url) as asandbox:
-                r = await asandbox.execute(config, environment)
+            key = None
+            if cache and execution_cache.cacheable(config):
+                content = environment.read() if environment is not None else None
+                environment = io.BytesIO(content) if content is not None else None
+                key = execution_cache.key(config, content)
+                r = await execution_cache.get(key)
+                if r is not None:
+                    return ExecutionOutcome(self, user, config, r, cached=True)
             
-            response = await database_sync_to_async(Response.objects.create)(
-                status=r["status"], total_time=r["total_time"], result=r.get("result", ""),
-                environment=r.get("environment", ""),
-                expire=isoparse(r["expire"]) if "expire" in r else None
-            )
+            r = await self._send_with_retry(config, environment)
             
-            for e in r["execution"]:
-                await database_sync_to_async(CommandResult.objects.create)(
-                    response=response, command=e["command"], exit_code=e["exit_code"],
-                    stdout=e["stdout"], stderr=e["stderr"], time=e["time"]
-                )
+            if key is not None and r["status"] >= 0:
+                await execution_cache.set(key, r)
             
-            request = await database_sync_to_async(Request.objects.create)(
-                sandbox=self, config=config, success=True, response=response,
-                user=user if user.is_authenticated else None
-            )
+            return ExecutionOutcome(self, user, config, r)
         
         except ClientError as e:   # pragma: no cover
-            request = await database_sync_to_async(Request.objects.create)(
-                sandbox=self, config=config, success=False, traceback=traceback.format_exc(),
-                response=None, user=user if user.is_authenticated else None
-            )
-            logger.warning(
-                f"Execution failed on sandbox {self}, see request of id '{request.pk}'",
-                exc_info=e
-            )
+            return ExecutionOutcome(self, user, config, traceback=traceback.format_exc(), exc_info=e)
         
         except SandboxDisabledError:
-            request = await database_sync_to_async(Request.objects.create)(
-                sandbox=self, config=config, success=False, traceback=traceback.format_exc(),
-                response=None, user=user if user.is_authenticated else None
+            return ExecutionOutcome(
+                self, user, config, traceback=traceback.format_exc(),
+                reason="because it was disabled"
             )
-            logger.warning(f"Execution failed on sandbox {self} because it was disabled,"
-                           f"see request of id '{request.pk}'")
         
-        return request
+        except SandboxUnavailableError:
+            return ExecutionOutcome(
+                self, user, config, traceback=traceback.format_exc(),
+                reason="because its circuit breaker is open"
+            )
+    
+    
+    async def _send_with_retry(self, config: Dict[str, Any],
+                               environment: Optional[BinaryIO]) -> Dict[str, Any]:
+        """Send the execution to the sandbox, returning its raw response.
+        
+        Idempotent executions failing to reach the sandbox are retried
+        according to `retry_policy`. Every attempt must be allowed by the
+        sandbox's circuit breaker, `SandboxUnavailableError` being raised
+        otherwise, and its outcome is recorded by the breaker. The probe of a
+        half-open breaker is only released by the attempt which reserved it.
+        
+        The last error is raised as a `ClientError` if no attempt succeeded,
+        timeouts being raised as `ServerTimeoutError`."""
+        content = environment.read() if environment is not None else None
+        attempts = retry_policy.attempts_for(config)
+        for attempt in range(attempts):
+            breaker = breakers.get(self.pk)
+            admitted = breaker.allow()
+            if admitted is None:
+                raise SandboxUnavailableError(
+                    f"Sandbox is unavailable after {breaker.failures} failed requests"
+                )
+            
+            start = time.monotonic()
+            try:
+                async with sandbox_pool.acquire(self.url) as asandbox:
+                    r = await self._send(
+                        asandbox, config, io.BytesIO(content) if content is not None else None
+                    )
+            except (ClientError, asyncio.TimeoutError) as e:
+                breakers.record(self.pk, False)
+                if attempt + 1 >= attempts:
+                    if isinstance(e, ClientError):
+                        raise
+                    # Handled like any other failure to reach the sandbox
+                    raise ServerTimeoutError(f"Sandbox did not answer in time: {e!r}") from e
+                logger.info(f"Retrying execution on sandbox {self} after: {e!r}")
+                await asyncio.sleep(retry_policy.delay(attempt))
+                continue
+            except BaseException:
+                # Only the attempt holding the probe may release it
+                if admitted == breaker.HALF_OPEN:
+                    breaker.release()
+                raise
+            
+            breakers.record(self.pk, True)
+            latencies.record(time.monotonic() - start)
+            return r
+    
+    
+    async def _send(self, asandbox: Any, config: Dict[str, Any],
+                    environment: Optional[BinaryIO]) -> Dict[str, Any]:
+        """Send the execution to the sandbox through `asandbox`, returning its
+        raw response.
+        
+        Unless `config` already uses a stored environment, `environment` is
+        replaced by the UUID of an identical environment saved on the sandbox
+        (see `SANDBOX_ENVIRONMENT_CACHE`). If the sandbox rejects this UUID,
+        the entry is invalidated and the execution is sent once again with
+        `environment`."""
+        if environment is None or "environment" in config or not environment_cache.enabled:
+            return await asandbox.execute(config, environment)
+        
+        content = environment.read()
+        uuid = await environment_cache.resolve(self.pk, asandbox, content)
+        if uuid is None:
+            return await asandbox.execute(config, io.BytesIO(content))
+        
+        try:
+            r = await asandbox.execute({**config, "environment": uuid}, None)
+        except ClientError as e:
+            logger.info(f"Sandbox {self} rejected stored environment '{uuid}': {e!r}")
+            r = None
+        
+        if r is None or r["status"] < 0:
+            # The environment may have been deleted before its expiration,
+            # send it once again along with the execution
+            await environment_cache.invalidate(self.pk, content)
+            return await asandbox.execute(config, io.BytesIO(content))
+        return r
+    
+    
+    def download_url(self, environment: str, file: str = None) -> str:
+        """Return the URL of the sandbox endpoint serving `environment`, or
+        only its file `file` if given."""
+        if file is None:
+            return urljoin(self.url, f"api/v1/environments/{quote(environment)}/")
+        return urljoin(self.url, f"api/v1/files/{quote(environment)}/{quote(file.strip('/'))}/")
     
     
     async def retrieve(self, environment: str, file: str = None) -> Optional[BinaryIO]:
@@ -230,7 +444,7 @@ class Sandbox(models.Model):
         if not self.enabled:
             raise SandboxDisabledError("Cannot retrieve from a disabled sandbox")
         
-        async with ASandbox(self.url) as asandbox:
+        async with sandbox_pool.acquire(self.url) as asandbox:
             return await asandbox.download(environment, file)
 
 
@@ -275,6 +489,22 @@ class SandboxSpecs(models.Model):
         verbose_name_plural = "Sandbox Specifications"
     
     
+    def update_from(self, raw_specs: Dict[str, Any]) -> None:
+        """Set the fields of these specifications from the raw specifications
+        returned by the sandbox, without saving them."""
+        host = raw_specs["host"]
+        self.polled = True
+        self.sandbox_version = host["sandbox_version"]
+        self.docker_version = host["docker_version"]
+        self.cpu_core = host["cpu"]["core"]
+        self.cpu_logical = host["cpu"]["logical"]
+        self.cpu_freq_min = host["cpu"]["freq_min"]
+        self.cpu_freq_max = host["cpu"]["freq_max"]
+        self.memory_ram = host["memory"]["ram"]
+        self.memory_swap = host["memory"]["swap"]
+        self.memory_storage = host["memory"]["storage"]
+    
+    
     @receiver(post_save, sender=Sandbox)
     def create(sender, instance, created, **kwargs):
         """When a new Sandbox is created, create the corresponding
@@ -365,12 +595,38 @@ class ContainerSpecs(models.Model):
     libraries = models.JSONField(null=True, blank=True, default=None)
     bin = ArrayField(models.CharField(max_length=64), null=True, blank=True, default=None)
     
+    # Fields left out of collections unless asked for, see `DeferredQuery`
+    DEFERRED_FIELDS = ("libraries", "bin")
+    
     
     class Meta:
         verbose_name = "Container Specifications"
         verbose_name_plural = "Container Specifications"
     
     
+    def update_from(self, raw_specs: Dict[str, Any], libs: Dict[str, Any]) -> None:
+        """Set the fields of these specifications from the raw specifications
+        and libraries returned by the sandbox, without saving them."""
+        container = raw_specs["container"]
+        self.polled = True
+        self.working_dir_device = container["working_dir_device"]
+        self.count = container["count"]
+        self.process = container["process"]
+        self.cpu_count = container["cpu"]["count"]
+        self.cpu_period = container["cpu"]["period"]
+        self.cpu_shares = container["cpu"]["shares"]
+        self.cpu_quota = container["cpu"]["quota"]
+        self.memory_ram = container["memory"]["ram"]
+        self.memory_swap = container["memory"]["swap"]
+        self.memory_storage = container["memory"]["storage"]
+        self.writing_io = container["io"]["read_iops"]
+        self.writing_bytes = container["io"]["read_bps"]
+        self.reading_io = container["io"]["write_iops"]
+        self.reading_bytes = container["io"]["write_bps"]
+        self.libraries = libs["libraries"]
+        self.bin = libs["bin"]
+    
+    
     @receiver(post_save, sender=Sandbox)
     def create(sender, instance, created, **kwargs):
         """When a new Sandbox is created, create the corresponding
@@ -380,6 +636,14 @@ class ContainerSpecs(models.Model):
 
 
 
+@receiver([post_save, post_delete], sender=SandboxSpecs)
+@receiver([post_save, post_delete], sender=ContainerSpecs)
+def invalidate_detail(sender, instance, **kwargs):
+    """Remove a saved or deleted instance from `detail_cache`."""
+    detail_cache.invalidate(sender, [instance.pk])
+
+
+
 class Usage(models.Model):
     """Represents the usage of a Sandbox at the given datetime.
     
@@ -443,7 +707,85 @@ class Usage(models.Model):
     
     class Meta:
         ordering = ['-date', 'sandbox']
-        indexes = [models.Index(fields=['-date'])]
+        indexes = [models.Index(fields=['-date']), models.Index(fields=['sandbox', '-date'])]
+        get_latest_by = "date"
+
+
+
+class UsageAggregate(models.Model):
+    """Aggregation of the `Usage` of a Sandbox over a minute or an hour.
+    
+    Raw `Usage` older than `SANDBOX_USAGE_RAW_RETENTION` are rolled up into
+    aggregates of one minute, which are themselves rolled up into aggregates
+    of one hour once older than `SANDBOX_USAGE_MINUTE_RETENTION` (see
+    `django_sandbox.rollup`).
+    
+    Fields :
+    
+    * `sandbox` (`Sandbox`) - Sandbox this `UsageAggregate` corresponds to.
+    * `resolution` (`int`) - Duration covered by the aggregate in seconds,
+       either `MINUTE` or `HOUR`.
+    * `date` (`datetime`) - Start of the period covered by the aggregate.
+    * `samples` (`int`) - Number of `Usage` aggregated.
+    * `reached` (`int`) - Number of `Usage` for which the sandbox was enabled
+       and reached.
+    * `<metric>_min`, `<metric>_max`, `<metric>_avg` - Minimum, maximum and
+       average of each numeric metric of `Usage` over the period, `cpu_usage`
+       being the CPU usage rate at the time of polling.
+    
+    Metrics stored as dictionaries (storage and disk I/O) are only kept in
+    raw `Usage`."""
+    MINUTE = 60
+    HOUR = 60 * 60
+    RESOLUTIONS = ((MINUTE, "minute"), (HOUR, "hour"))
+    METRICS = (
+        "cpu_usage", "cpu_freq", "memory_ram", "memory_swap", "sending_packets",
+        "sending_bytes", "receiving_packets", "receiving_bytes", "process", "container",
+    )
+    
+    sandbox = models.ForeignKey(
+        Sandbox, related_name="usage_aggregates", on_delete=models.CASCADE
+    )
+    resolution = models.PositiveIntegerField(choices=RESOLUTIONS)
+    date = models.DateTimeField()
+    samples = models.PositiveIntegerField()
+    reached = models.PositiveIntegerField()
+    cpu_usage_min = models.FloatField(null=True, blank=True)
+    cpu_usage_max = models.FloatField(null=True, blank=True)
+    cpu_usage_avg = models.FloatField(null=True, blank=True)
+    cpu_freq_min = models.FloatField(null=True, blank=True)
+    cpu_freq_max = models.FloatField(null=True, blank=True)
+    cpu_freq_avg = models.FloatField(null=True, blank=True)
+    memory_ram_min = models.BigIntegerField(null=True, blank=True)
+    memory_ram_max = models.BigIntegerField(null=True, blank=True)
+    memory_ram_avg = models.FloatField(null=True, blank=True)
+    memory_swap_min = models.BigIntegerField(null=True, blank=True)
+    memory_swap_max = models.BigIntegerField(null=True, blank=True)
+    memory_swap_avg = models.FloatField(null=True, blank=True)
+    sending_packets_min = models.BigIntegerField(null=True, blank=True)
+    sending_packets_max = models.BigIntegerField(null=True, blank=True)
+    sending_packets_avg = models.FloatField(null=True, blank=True)
+    sending_bytes_min = models.BigIntegerField(null=True, blank=True)
+    sending_bytes_max = models.BigIntegerField(null=True, blank=True)
+    sending_bytes_avg = models.FloatField(null=True, blank=True)
+    receiving_packets_min = models.BigIntegerField(null=True, blank=True)
+    receiving_packets_max = models.BigIntegerField(null=True, blank=True)
+    receiving_packets_avg = models.FloatField(null=True, blank=True)
+    receiving_bytes_min = models.BigIntegerField(null=True, blank=True)
+    receiving_bytes_max = models.BigIntegerField(null=True, blank=True)
+    receiving_bytes_avg = models.FloatField(null=True, blank=True)
+    process_min = models.IntegerField(null=True, blank=True)
+    process_max = models.IntegerField(null=True, blank=True)
+    process_avg = models.FloatField(null=True, blank=True)
+    container_min = models.IntegerField(null=True, blank=True)
+    container_max = models.IntegerField(null=True, blank=True)
+    container_avg = models.FloatField(null=True, blank=True)
+    
+    
+    class Meta:
+        ordering = ['-date', 'sandbox']
+        indexes = [models.Index(fields=['resolution', 'sandbox', '-date'])]
+        unique_together = [['sandbox', 'resolution', 'date']]
         get_latest_by = "date"
 
 
@@ -473,9 +815,12 @@ class Response(models.Model):
     """
     status = models.IntegerField()
     total_time = models.FloatField()
-    result = models.TextField(default="")
+    result = CompressedTextField(default="")
     environment = models.CharField(max_length=36, default="")
     expire = models.DateTimeField(null=True, blank=True)
+    
+    # Fields left out of collections unless asked for, see `DeferredQuery`
+    DEFERRED_FIELDS = ("result",)
 
 
 
@@ -490,13 +835,19 @@ class CommandResult(models.Model):
     * `stdout` (`str`) - Everything written on *stdout* by the command.
     * `stderr` (`str`) - Everything written on *stderr* by the command.
     * `time` (`float`) - Execution's time taken by the command in second.
+    
+    `stdout` and `stderr` (as well as `Response.result`) are truncated and
+    compressed, see `CompressedTextField`.
     """
     response = models.ForeignKey(Response, related_name="execution", on_delete=models.CASCADE)
     command = models.TextField()
     exit_code = models.IntegerField()
-    stdout = models.TextField(default="")
-    stderr = models.TextField(default="")
+    stdout = CompressedTextField(default="")
+    stderr = CompressedTextField(default="")
     time = models.FloatField()
+    
+    # Fields left out of collections unless asked for, see `DeferredQuery`
+    DEFERRED_FIELDS = ("stdout", "stderr")
 
 
 
@@ -513,6 +864,8 @@ class Request(models.Model):
     * `traceback` (`str`) - Traceback if the request failed.
     * `config` (`dict`) - Config dictionary use for this request.
     * `response` (`dictionary`) - Dictionary containing the response.
+    * `cached` (`bool`) - Whether the response was retrieved from the
+       execution cache instead of the sandbox.
     
     `traceback` will be an empty string if `success` is True, and `response`
     will be None if `success` is False.
@@ -528,9 +881,87 @@ class Request(models.Model):
     success = models.BooleanField()
     traceback = models.TextField(default="")
     config = models.JSONField()
+    cached = models.BooleanField(default=False)
+    
+    # Fields left out of collections unless asked for, see `DeferredQuery`
+    DEFERRED_FIELDS = ("config", "traceback")
     
     
     class Meta:
         ordering = ['-date', 'sandbox']
-        indexes = [models.Index(fields=['-date'])]
+        indexes = [
+            models.Index(fields=['-date']),
+            models.Index(fields=['sandbox', '-date']),
+            models.Index(fields=['user', '-date']),
+        ]
         get_latest_by = "date"
+
+
+
+class ExecutionOutcome:
+    """Outcome of an execution that has not been saved yet, see
+    `Sandbox.perform()`.
+    
+    `raw` is the raw response of the sandbox, None if the execution failed, in
+    which case `traceback` contains the traceback of the error and `reason` a
+    short explanation. `exc_info`, if given, is the exception logged along
+    with the failure."""
+    
+    
+    def __init__(self, sandbox: Sandbox, user: Union[AnonymousUser, User], config: Dict[str, Any],
+                 raw: Optional[Dict[str, Any]] = None, cached: bool = False,
+                 traceback: str = "", reason: str = "", exc_info: BaseException = None):
+        self.sandbox = sandbox
+        self.user = user
+        self.config = config
+        self.raw = raw
+        self.cached = cached
+        self.traceback = traceback
+        self.reason = reason
+        self.exc_info = exc_info
+    
+    
+    @staticmethod
+    def save_all(outcomes: List['ExecutionOutcome']) -> List[Request]:
+        """Save the `Response`, `CommandResult` and `Request` of every
+        outcome, returning the created `Request` in the same order.
+        
+        Everything is saved within a single transaction, using one query per
+        model (per batch of `SAVE_BATCH_SIZE` rows)."""
+        with transaction.atomic():
+            succeeded = [o for o in outcomes if o.raw is not None]
+            responses = Response.objects.bulk_create([
+                Response(
+                    status=o.raw["status"], total_time=o.raw["total_time"],
+                    result=o.raw.get("result", ""), environment=o.raw.get("environment", ""),
+                    expire=isoparse(o.raw["expire"]) if "expire" in o.raw else None
+                )
+                for o in succeeded
+            ], batch_size=SAVE_BATCH_SIZE)
+            CommandResult.objects.bulk_create([
+                CommandResult(
+                    response=response, command=e["command"], exit_code=e["exit_code"],
+                    stdout=e["stdout"], stderr=e["stderr"], time=e["time"]
+                )
+                for o, response in zip(succeeded, responses) for e in o.raw["execution"]
+            ], batch_size=SAVE_BATCH_SIZE)
+            
+            responses = iter(responses)
+            requests = Request.objects.bulk_create([
+                Request(
+                    sandbox=o.sandbox, config=o.config, success=o.raw is not None,
+                    traceback=o.traceback, cached=o.cached,
+                    response=next(responses) if o.raw is not None else None,
+                    user=o.user if o.user.is_authenticated else None
+                )
+                for o in outcomes
+            ], batch_size=SAVE_BATCH_SIZE)
+        
+        for o, request in zip(outcomes, requests):
+            if o.raw is None:
+                reason = f" {o.reason}" if o.reason else ""
+                logger.warning(
+                    f"Execution failed on sandbox {o.sandbox}{reason}, see request of id "
+                    f"'{request.pk}'", exc_info=o.exc_info
+                )
+        return requests
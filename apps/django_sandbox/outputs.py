@@ -0,0 +1,64 @@
+import functools
+import logging
+import operator
+from typing import Dict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.functions import Length
+
+from django_sandbox.fields import RAW, decompress
+from django_sandbox.models import CommandResult, Response
+
+
+logger = logging.getLogger(__name__)
+
+# Fields of each model storing outputs, see `CompressedTextField`.
+OUTPUT_FIELDS = (
+    (CommandResult, ("stdout", "stderr")),
+    (Response, ("result",)),
+)
+
+
+
+def compress_outputs(batch_size: int = 1000) -> int:
+    """Truncate and compress the outputs saved uncompressed (e.g. before
+    their field became a `CompressedTextField`, or with a higher
+    `SANDBOX_OUTPUT_COMPRESSION_THRESHOLD`).
+    
+    Rows are rewritten by batches of `batch_size`, return the number of
+    rewritten rows."""
+    threshold = settings.SANDBOX_OUTPUT_COMPRESSION_THRESHOLD
+    rewritten = 0
+    for model, fields in OUTPUT_FIELDS:
+        queryset = model.objects.annotate(
+            **{f"output_{f}": Length(f) for f in fields}
+        ).filter(
+            functools.reduce(operator.or_, (Q(**{f"output_{f}__gt": threshold}) for f in fields))
+        ).order_by("pk")
+        
+        last = 0
+        while rows := list(queryset.filter(pk__gt=last).values_list("pk", *fields)[:batch_size]):
+            last = rows[-1][0]
+            instances = [
+                model(pk=row[0], **{f: decompress(v) for f, v in zip(fields, row[1:])})
+                for row in rows if any(bytes(v[:1]) == RAW for v in row[1:])
+            ]
+            model.objects.bulk_update(instances, fields)
+            rewritten += len(instances)
+    
+    logger.info(f"Outputs compressed: {rewritten} rows rewritten")
+    return rewritten
+
+
+
+def table_sizes() -> Dict[str, int]:
+    """Return the size in bytes (including indexes and TOAST storage) of the
+    tables storing outputs."""
+    tables = [model._meta.db_table for model, _ in OUTPUT_FIELDS]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT " + ", ".join(["pg_total_relation_size(%s)"] * len(tables)), tables
+        )
+        return dict(zip(tables, cursor.fetchone()))
@@ -0,0 +1,94 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from dateutil.parser import isoparse
+from dgeq.constants import DGEQ_DEFAULT_LIMIT, DGEQ_MAX_LIMIT
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import QueryDict
+
+from django_sandbox.queries import DeferredQuery
+
+
+CURSOR = "c:cursor"
+
+
+
+def encode_cursor(date: datetime, pk: int) -> str:
+    """Return the opaque token pointing after the row of key `(date, pk)`."""
+    key = json.dumps([date.isoformat(), pk], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(key).decode().rstrip("=")
+
+
+
+def decode_cursor(token: str) -> Tuple[datetime, int]:
+    """Return the key `(date, pk)` encoded in `token`.
+    
+    Raise `ValidationError` if `token` is not a valid cursor."""
+    try:
+        date, pk = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if not isinstance(pk, int):
+            raise TypeError
+        return isoparse(date), pk
+    except (binascii.Error, ValueError, TypeError):
+        raise ValidationError({CURSOR: [f"Invalid cursor '{token}'"]})
+
+
+
+class KeysetQuery(DeferredQuery):
+    """A `DeferredQuery` paginated on `(-date, -pk)` instead of offsets.
+    
+    Each page starts right after the row pointed by the cursor, using the
+    index on `-date`, so retrieving a page takes the same time whatever its
+    depth. The token of the next page is returned in the `cursor` field of
+    the result, None on the last page.
+    
+    `c:start` and `c:sort` cannot be used since the order is fixed, the size
+    of the page is given by `c:limit` (default to `DGEQ_DEFAULT_LIMIT`)."""
+    
+    
+    def __init__(self, model, query_dict: QueryDict, **kwargs):
+        query_dict = query_dict.copy()
+        if unsupported := {"c:start", "c:sort"} & set(query_dict.keys()):
+            raise ValidationError({f: [f"Cannot be used with '{CURSOR}'"] for f in unsupported})
+        
+        token = query_dict.pop(CURSOR, [""])[-1]
+        self.after = decode_cursor(token) if token else None
+        self.page_size = self._page_size(query_dict.pop("c:limit", [None])[-1])
+        
+        super().__init__(model, query_dict, **kwargs)
+    
+    
+    @staticmethod
+    def _page_size(limit: Optional[str]) -> int:
+        """Return the size of the page given the value of `c:limit`."""
+        if limit is None:
+            return DGEQ_DEFAULT_LIMIT
+        if not limit.isdigit() or not 0 < int(limit) <= DGEQ_MAX_LIMIT:
+            raise ValidationError({"c:limit": [
+                f"Must be an integer between 1 and {DGEQ_MAX_LIMIT} with '{CURSOR}'"
+            ]})
+        return int(limit)
+    
+    
+    def _evaluate(self) -> List[Dict[str, Any]]:
+        queryset = self.queryset
+        if self.after is not None:
+            date, pk = self.after
+            queryset = queryset.filter(Q(date__lt=date) | Q(date=date, pk__lt=pk))
+        queryset = queryset.order_by("-date", "-pk")
+        
+        # One more row is retrieved to know whether there is a next page
+        self.queryset = queryset[:self.page_size + 1]
+        self.limit_set = True
+        rows = super()._evaluate()
+        
+        self.result["cursor"] = None
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            date, pk = queryset.values_list("date", "pk")[self.page_size - 1]
+            self.result["cursor"] = encode_cursor(date, pk)
+        return rows
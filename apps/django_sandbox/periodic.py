@@ -0,0 +1,78 @@
+import logging
+from typing import Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django_celery_beat.models import IntervalSchedule, PeriodicTask, PeriodicTasks
+
+
+logger = logging.getLogger(__name__)
+
+# Name, task and setting holding the interval (in seconds) of every periodic
+# task of this app.
+PERIODIC_TASKS = (
+    ("sandbox_poll_usage", "django_sandbox.tasks.poll_usage", "SANDBOX_POLL_USAGE_EVERY"),
+    (
+        "sandbox_poll_specifications", "django_sandbox.tasks.poll_specifications",
+        "SANDBOX_POLL_SPECS_EVERY"
+    ),
+    ("sandbox_compact_usage", "django_sandbox.tasks.compact_usage", "SANDBOX_USAGE_COMPACT_EVERY"),
+)
+
+# Per-sandbox tasks created by previous versions.
+LEGACY_TASKS = r"^sandbox_poll_(usage|specifications)_\d+$"
+
+
+
+def sync_periodic_tasks() -> Tuple[int, int, int]:
+    """Make the periodic tasks of this app match `PERIODIC_TASKS` and the
+    current settings.
+    
+    Missing tasks are created and tasks with an outdated task or interval are
+    updated, using a constant number of queries. Legacy per-sandbox tasks are
+    deleted. Calling this function again without changing the settings does
+    not modify anything.
+    
+    Return the number of created, updated and deleted tasks."""
+    with transaction.atomic():
+        periods = {getattr(settings, setting) for _, _, setting in PERIODIC_TASKS}
+        schedules = {
+            s.every: s for s in IntervalSchedule.objects.filter(
+                every__in=periods, period=IntervalSchedule.SECONDS
+            )
+        }
+        schedules.update({
+            s.every: s for s in IntervalSchedule.objects.bulk_create([
+                IntervalSchedule(every=every, period=IntervalSchedule.SECONDS)
+                for every in periods - schedules.keys()
+            ])
+        })
+        
+        existing = PeriodicTask.objects.in_bulk(
+            [name for name, _, _ in PERIODIC_TASKS], field_name="name"
+        )
+        created, updated = list(), list()
+        for name, task, setting in PERIODIC_TASKS:
+            schedule = schedules[getattr(settings, setting)]
+            periodic_task = existing.get(name)
+            if periodic_task is None:
+                created.append(PeriodicTask(name=name, task=task, interval=schedule))
+            elif periodic_task.task != task or periodic_task.interval_id != schedule.pk:
+                periodic_task.task = task
+                periodic_task.interval = schedule
+                updated.append(periodic_task)
+        
+        PeriodicTask.objects.bulk_create(created)
+        PeriodicTask.objects.bulk_update(updated, ["task", "interval"])
+        deleted, _ = PeriodicTask.objects.filter(name__regex=LEGACY_TASKS).delete()
+        
+        # Bulk operations do not send the signals notifying the beat scheduler
+        if created or updated:
+            PeriodicTasks.update_changed()
+    
+    if created or updated or deleted:
+        logger.info(
+            f"Periodic tasks synchronized: {len(created)} created, {len(updated)} updated, "
+            f"{deleted} deleted"
+        )
+    return len(created), len(updated), deleted
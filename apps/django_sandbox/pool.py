@@ -0,0 +1,188 @@
+import asyncio
+import contextlib
+import logging
+import time
+import weakref
+from typing import AsyncIterator, Dict, Optional
+
+import aiohttp
+from django.conf import settings
+from sandbox_api import ASandbox
+
+
+logger = logging.getLogger(__name__)
+
+
+
+class _PooledClient:
+    """An opened `ASandbox` shared by every coroutine of an event loop, along
+    with an `aiohttp.ClientSession` for the requests it does not support."""
+    
+    
+    def __init__(self, url: str, max_connections: int):
+        self.url = url
+        self.asandbox: ASandbox = ASandbox(url)
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.semaphore = asyncio.Semaphore(max_connections)
+        self.in_use = 0
+        self.last_used = time.monotonic()
+        self._stack = contextlib.AsyncExitStack()
+    
+    
+    async def open(self) -> None:
+        """Open the underlying `ASandbox`."""
+        await self._stack.enter_async_context(self.asandbox)
+    
+    
+    async def open_session(self) -> aiohttp.ClientSession:
+        """Return the session of this client, opening it on first use."""
+        if self.session is None:
+            self.session = await self._stack.enter_async_context(aiohttp.ClientSession())
+        return self.session
+    
+    
+    async def close(self) -> None:
+        """Close the underlying `ASandbox` and session."""
+        await self._stack.aclose()
+
+
+
+class _LoopClients:
+    """Clients opened within a single event loop, indexed by url."""
+    
+    
+    def __init__(self):
+        self.clients: Dict[str, _PooledClient] = dict()
+        self.lock = asyncio.Lock()
+
+
+
+class SandboxPool:
+    """Process-wide pool of long-lived `ASandbox` clients.
+    
+    A single client is kept per sandbox's url, allowing its HTTP session (and
+    thus its keep-alive connections) to be reused between requests. Since an
+    `ASandbox` is bound to the event loop it was opened in, clients are also
+    indexed by event loop.
+    
+    * `max_connections` - Maximum number of concurrent requests sent through
+       the same client, additional requests wait for a slot to be released.
+    * `idle_timeout` - Seconds after which a client that has not been used is
+       closed.
+    
+    Code running its own short-lived event loop (e.g. through `async_to_sync`
+    in a Celery task) should call `close()` before the loop ends."""
+    
+    
+    def __init__(self, max_connections: int, idle_timeout: float):
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._loops: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopClients]'
+        self._loops = weakref.WeakKeyDictionary()
+    
+    
+    def _current(self) -> _LoopClients:
+        """Return the clients of the running event loop, forgetting those of
+        closed loops."""
+        for loop in [loop for loop in self._loops.keys() if loop.is_closed()]:
+            del self._loops[loop]
+        
+        loop = asyncio.get_running_loop()
+        if loop not in self._loops:
+            self._loops[loop] = _LoopClients()
+        return self._loops[loop]
+    
+    
+    async def _evict_idle(self, current: _LoopClients) -> None:
+        """Close every client of `current` unused for more than
+        `idle_timeout` seconds."""
+        now = time.monotonic()
+        for url, client in list(current.clients.items()):
+            if client.in_use == 0 and now - client.last_used > self.idle_timeout:
+                del current.clients[url]
+                self.evictions += 1
+                logger.debug(f"Closing idle sandbox client of '{url}'")
+                await client.close()
+    
+    
+    @contextlib.asynccontextmanager
+    async def _borrow(self, url: str) -> AsyncIterator[_PooledClient]:
+        """Borrow the client corresponding to `url`, opening it if needed."""
+        current = self._current()
+        await self._evict_idle(current)
+        
+        client = current.clients.get(url)
+        if client is not None:
+            self.hits += 1
+        else:
+            async with current.lock:
+                client = current.clients.get(url)
+                if client is None:
+                    self.misses += 1
+                    client = _PooledClient(url, self.max_connections)
+                    await client.open()
+                    current.clients[url] = client
+                else:  # pragma: no cover
+                    self.hits += 1
+        
+        async with client.semaphore:
+            client.in_use += 1
+            try:
+                yield client
+            finally:
+                client.in_use -= 1
+                client.last_used = time.monotonic()
+    
+    
+    @contextlib.asynccontextmanager
+    async def acquire(self, url: str) -> AsyncIterator[ASandbox]:
+        """Borrow the `ASandbox` corresponding to `url`, opening it if
+        needed."""
+        async with self._borrow(url) as client:
+            yield client.asandbox
+    
+    
+    @contextlib.asynccontextmanager
+    async def acquire_session(self, url: str) -> AsyncIterator[aiohttp.ClientSession]:
+        """Borrow the `aiohttp.ClientSession` of the client corresponding to
+        `url`, for requests `ASandbox` does not support (e.g. streaming a
+        response). Requests are subject to the same `max_connections` limit
+        as those of the `ASandbox`."""
+        async with self._borrow(url) as client:
+            yield await client.open_session()
+    
+    
+    async def close(self) -> None:
+        """Close every client opened within the running event loop."""
+        current = self._current()
+        clients = list(current.clients.values())
+        current.clients.clear()
+        for client in clients:
+            await client.close()
+    
+    
+    def stats(self) -> Dict[str, int]:
+        """Return counters about the use of the pool.
+        
+        * `hits` - Number of time an opened client has been reused.
+        * `misses` - Number of time a new client had to be opened.
+        * `evictions` - Number of client closed for being idle.
+        * `clients` - Number of currently opened clients.
+        * `connections` - Number of requests currently using a client."""
+        clients = [c for current in self._loops.values() for c in current.clients.values()]
+        return {
+            "hits":        self.hits,
+            "misses":      self.misses,
+            "evictions":   self.evictions,
+            "clients":     len(clients),
+            "connections": sum(c.in_use for c in clients),
+        }
+
+
+
+sandbox_pool = SandboxPool(
+    settings.SANDBOX_POOL_MAX_CONNECTIONS, settings.SANDBOX_POOL_IDLE_TIMEOUT
+)
@@ -0,0 +1,112 @@
+from typing import Any, Dict, Iterator, List, Optional
+
+import dgeq
+from dgeq.exceptions import DgeqError
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.http import QueryDict
+
+from django_sandbox.fields import CompressedTextField
+
+
+INCLUDE = "c:include"
+
+
+
+class CompressedFieldError(DgeqError):
+    """Raised when filtering on a `CompressedTextField`, whose values are
+    stored compressed and thus cannot be compared by the database."""
+    
+    code = "COMPRESSED_FIELD"
+    details = ['field']
+    
+    
+    def __init__(self, field: str):
+        self.field = field
+    
+    
+    def __str__(self):
+        return f"Cannot filter on compressed field '{self.field}'"
+
+
+
+def resolve_field(model, path: str) -> Optional[models.Field]:
+    """Return the field of `model` designated by `path`, a dot-separated list
+    of fields spanning relations (e.g. `response.execution.stdout`), None if
+    it does not exist."""
+    field = None
+    for name in path.split("."):
+        if model is None:
+            return None
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        model = field.related_model
+    return field
+
+
+
+def filtered_fields(query_dict: QueryDict) -> Iterator[str]:
+    """Yield the path of every field filtered in `query_dict`, including the
+    fields filtered by the `filters` of a `c:join`."""
+    for key, values in query_dict.lists():
+        if not key.startswith("c:"):
+            yield key
+        elif key == "c:join":
+            for value in values:
+                join = dict(p.split("=", 1) for p in value.split("|") if "=" in p)
+                for f in filter(None, join.get("filters", "").split("'")):
+                    yield f"{join.get('field', '')}.{f.split('=', 1)[0]}"
+
+
+
+class DeferredQuery(dgeq.GenericQuery):
+    """A `dgeq.GenericQuery` which does not retrieve the heavy fields of its
+    model (listed in its `DEFERRED_FIELDS` attribute) unless they are asked
+    for.
+    
+    Heavy fields are left out of the rows, and deferred so that they are not
+    even retrieved from the database. They are included if they are given to
+    `c:show` or to `c:include` (a comma-separated list of heavy fields to
+    include along with the other fields, or `*` to include all of them).
+    
+    Fields stored compressed (see `CompressedTextField`), either of the model
+    or of a related one, cannot be filtered on : the database would compare
+    the given value to the compressed bytes, never matching. Such a filter
+    fails with the code `COMPRESSED_FIELD` instead."""
+    
+    
+    def __init__(self, model, query_dict: QueryDict, **kwargs):
+        query_dict = query_dict.copy()
+        include = query_dict.pop(INCLUDE, [""])[-1]
+        self.heavy = set(getattr(model, "DEFERRED_FIELDS", ()))
+        self.heavy -= self.heavy if include == "*" else set(include.split(","))
+        self.shown = "c:show" in query_dict
+        self.compressed = [
+            f for f in filtered_fields(query_dict)
+            if isinstance(resolve_field(model, f), CompressedTextField)
+        ]
+        
+        super().__init__(model, query_dict, **kwargs)
+    
+    
+    def evaluate(self) -> Dict[str, Any]:
+        if self.compressed:
+            e = CompressedFieldError(self.compressed[0])
+            return {
+                "status":  False,
+                "message": str(e),
+                "code":    e.code,
+                **{a: getattr(e, a) for a in e.details}
+            }
+        return super().evaluate()
+    
+    
+    def _evaluate(self) -> List[Dict[str, Any]]:
+        if not self.shown:
+            self.fields -= self.heavy
+        deferred = self.heavy - self.fields
+        if deferred:
+            self.queryset = self.queryset.defer(*deferred)
+        return super()._evaluate()
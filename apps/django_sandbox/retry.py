@@ -0,0 +1,76 @@
+import collections
+import math
+import random
+from typing import Any, Deque, Dict, Optional
+
+from django.conf import settings
+
+
+
+class RetryPolicy:
+    """Retry policy of the executions failing to reach a sandbox.
+    
+    Only idempotent executions (not saving their environment) are retried, up
+    to `attempts` attempts in total. The delay before the n-th retry is drawn
+    uniformly between 0 and `backoff * 2 ** n`, capped at `max_backoff`
+    seconds ("full jitter"), so that retries of concurrent executions do not
+    hit the sandbox at the same time."""
+    
+    
+    def __init__(self, attempts: int, backoff: float, max_backoff: float):
+        self.attempts = max(attempts, 1)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+    
+    
+    @staticmethod
+    def idempotent(config: Dict[str, Any]) -> bool:
+        """Whether the execution described by `config` can be sent more than
+        once."""
+        return not config.get("save", False)
+    
+    
+    def attempts_for(self, config: Dict[str, Any]) -> int:
+        """Return the number of attempts allowed for the execution described
+        by `config`."""
+        return self.attempts if self.idempotent(config) else 1
+    
+    
+    def delay(self, retry: int) -> float:
+        """Return the number of seconds to wait before the `retry`-th retry
+        (starting at 0)."""
+        return random.uniform(0, min(self.backoff * 2 ** retry, self.max_backoff))
+
+
+
+class LatencyTracker:
+    """Keep the latencies of the last `window` executions sent to sandboxes to
+    compute their percentiles."""
+    
+    
+    def __init__(self, window: int, min_samples: int):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = collections.deque(maxlen=window)
+    
+    
+    def record(self, latency: float) -> None:
+        """Record the latency (in seconds) of an execution."""
+        self._samples.append(latency)
+    
+    
+    def percentile(self, p: float) -> Optional[float]:
+        """Return the `p` percentile (between 0 and 1) of the recorded
+        latencies, None if less than `min_samples` were recorded."""
+        if len(self._samples) < max(self.min_samples, 1):
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(max(math.ceil(p * len(ordered)) - 1, 0), len(ordered) - 1)]
+
+
+
+retry_policy = RetryPolicy(
+    settings.SANDBOX_RETRY_ATTEMPTS, settings.SANDBOX_RETRY_BACKOFF,
+    settings.SANDBOX_RETRY_MAX_BACKOFF
+)
+
+latencies = LatencyTracker(settings.SANDBOX_LATENCY_WINDOW, settings.SANDBOX_HEDGE_MIN_SAMPLES)
@@ -0,0 +1,201 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from dateutil.parser import isoparse
+from django.conf import settings
+from django.contrib.postgres.fields.array import IndexTransform
+from django.db import models, transaction
+from django.db.models import Count, ExpressionWrapper, F, Max, Min, Q, QuerySet, Sum
+from django.db.models.functions import NullIf, Trunc
+from django.utils import timezone
+
+from django_sandbox.models import Usage, UsageAggregate
+
+
+logger = logging.getLogger(__name__)
+
+# Period of data rolled up within a single transaction.
+WINDOW = timedelta(days=1)
+
+KINDS = {UsageAggregate.MINUTE: "minute", UsageAggregate.HOUR: "hour"}
+
+
+
+def _truncate(date: datetime, resolution: int) -> datetime:
+    """Truncate `date` to the start of its bucket of `resolution` seconds."""
+    date = date.astimezone(timezone.utc)
+    if resolution == UsageAggregate.HOUR:
+        return date.replace(minute=0, second=0, microsecond=0)
+    return date.replace(second=0, microsecond=0)
+
+
+
+def _windows(queryset: QuerySet, cutoff: datetime, resolution: int
+             ) -> Iterator[Tuple[datetime, datetime]]:
+    """Yield the successive `[start, end)` windows, aligned on `resolution`,
+    covering every row of `queryset` older than `cutoff`."""
+    first = queryset.filter(date__lt=cutoff).aggregate(first=Min("date"))["first"]
+    if first is None:
+        return
+    
+    start = _truncate(first, resolution)
+    while start < cutoff:
+        end = min(start + WINDOW, cutoff)
+        yield start, end
+        start = end
+
+
+
+def _raw_aggregates() -> Dict[str, models.Aggregate]:
+    """Aggregates computing the fields of a `UsageAggregate` from `Usage`."""
+    aggregates = {
+        "samples": Count("pk"),
+        "reached": Count("pk", filter=Q(enabled=True, reached=True)),
+    }
+    for metric in UsageAggregate.METRICS:
+        # Only the current CPU usage (first element of the array) is aggregated
+        value = IndexTransform(1, models.FloatField(), metric) if metric == "cpu_usage" else metric
+        aggregates[f"{metric}_min"] = Min(value)
+        aggregates[f"{metric}_max"] = Max(value)
+        aggregates[f"{metric}_avg"] = models.Avg(value, output_field=models.FloatField())
+    return aggregates
+
+
+
+def _minute_aggregates() -> Dict[str, models.Aggregate]:
+    """Aggregates computing the fields of an hourly `UsageAggregate` from
+    minute ones, averages being weighted by the number of reached samples."""
+    aggregates = {
+        "samples": Sum("samples"),
+        "reached": Sum("reached"),
+    }
+    for metric in UsageAggregate.METRICS:
+        aggregates[f"{metric}_min"] = Min(f"{metric}_min")
+        aggregates[f"{metric}_max"] = Max(f"{metric}_max")
+        aggregates[f"{metric}_avg"] = ExpressionWrapper(
+            Sum(F(f"{metric}_avg") * F("reached"), output_field=models.FloatField())
+            / NullIf(Sum("reached"), 0),
+            output_field=models.FloatField()
+        )
+    return aggregates
+
+
+
+def _rollup(source: QuerySet, cutoff: datetime, resolution: int,
+            aggregates: Dict[str, models.Aggregate]) -> int:
+    """Roll every row of `source` older than `cutoff` up into aggregates of
+    `resolution` seconds, deleting the rolled up rows.
+    
+    `cutoff` must be aligned on `resolution` so that only complete buckets
+    are rolled up. Return the number of created aggregates."""
+    created = 0
+    for start, end in _windows(source, cutoff, resolution):
+        with transaction.atomic():
+            window = source.filter(date__gte=start, date__lt=end)
+            # Annotations are prefixed to avoid conflicts with the fields of `source`
+            rows = window.annotate(
+                agg_bucket=Trunc("date", KINDS[resolution], tzinfo=timezone.utc)
+            ).order_by().values("sandbox", "agg_bucket").annotate(
+                **{f"agg_{k}": v for k, v in aggregates.items()}
+            )
+            UsageAggregate.objects.bulk_create([
+                UsageAggregate(
+                    sandbox_id=row["sandbox"], date=row["agg_bucket"], resolution=resolution,
+                    **{k: row[f"agg_{k}"] for k in aggregates}
+                )
+                for row in rows
+            ], batch_size=1000)
+            created += len(rows)
+            window.delete()
+    return created
+
+
+
+def compact_usage(now: datetime = None) -> Tuple[int, int, int]:
+    """Roll up old `Usage` according to the retention settings.
+    
+    * `Usage` older than `SANDBOX_USAGE_RAW_RETENTION` are rolled up into
+      minute aggregates.
+    * Minute aggregates older than `SANDBOX_USAGE_MINUTE_RETENTION` are rolled
+      up into hour aggregates.
+    * Hour aggregates older than `SANDBOX_USAGE_HOUR_RETENTION` are deleted,
+      unless it is None.
+    
+    Return the number of created minute and hour aggregates, and the number
+    of deleted hour aggregates."""
+    now = now or timezone.now()
+    
+    raw_cutoff = _truncate(
+        now - timedelta(seconds=settings.SANDBOX_USAGE_RAW_RETENTION), UsageAggregate.MINUTE
+    )
+    minutes = _rollup(
+        Usage.objects.all(), raw_cutoff, UsageAggregate.MINUTE, _raw_aggregates()
+    )
+    
+    minute_cutoff = _truncate(
+        now - timedelta(seconds=settings.SANDBOX_USAGE_MINUTE_RETENTION), UsageAggregate.HOUR
+    )
+    hours = _rollup(
+        UsageAggregate.objects.filter(resolution=UsageAggregate.MINUTE), minute_cutoff,
+        UsageAggregate.HOUR, _minute_aggregates()
+    )
+    
+    deleted = 0
+    if settings.SANDBOX_USAGE_HOUR_RETENTION is not None:
+        hour_cutoff = now - timedelta(seconds=settings.SANDBOX_USAGE_HOUR_RETENTION)
+        deleted, _ = UsageAggregate.objects.filter(
+            resolution=UsageAggregate.HOUR, date__lt=hour_cutoff
+        ).delete()
+    
+    logger.info(
+        f"Usage compacted: {minutes} minute aggregates and {hours} hour aggregates created, "
+        f"{deleted} hour aggregates deleted"
+    )
+    return minutes, hours, deleted
+
+
+
+def since(values: Iterable[str]) -> Optional[datetime]:
+    """Return the lower bound of the dgeq filters `values` on a date field,
+    None if there is none.
+    
+    E.g. `since(["[2020-01-01T00:00:00+00:00,<2020-02-01T00:00:00+00:00"])`
+    return the 1st January 2020."""
+    bounds = list()
+    for value in values:
+        for f in value.split(","):
+            if f[:1] in (">", "["):
+                try:
+                    bounds.append(isoparse(f[1:]))
+                except ValueError:
+                    continue
+    return max(bounds) if bounds else None
+
+
+
+def sources(lower: Optional[datetime]) -> List[Tuple[Optional[int], Optional[datetime]]]:
+    """Return the sources needed to cover the data after `lower`, newest
+    first, as `(resolution, before)` pairs.
+    
+    `resolution` is None for raw `Usage`. `before` is the date of the first
+    row of the previous (finer) source, the source must only be used before
+    this date so that no period is covered twice. Only raw `Usage` is
+    returned if `lower` is None."""
+    if lower is None:
+        return [(None, None)]
+    if timezone.is_naive(lower):
+        lower = timezone.make_aware(lower)
+    
+    result = [(None, None)]
+    before = Usage.objects.aggregate(first=Min("date"))["first"]
+    for resolution in (UsageAggregate.MINUTE, UsageAggregate.HOUR):
+        if before is not None and lower >= before:
+            break
+        result.append((resolution, before))
+        first = UsageAggregate.objects.filter(resolution=resolution).aggregate(
+            first=Min("date")
+        )["first"]
+        if first is not None:
+            before = first
+    return result
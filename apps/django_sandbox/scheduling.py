@@ -0,0 +1,249 @@
+import abc
+import collections
+import contextlib
+import random
+import time
+from typing import Collection, Dict, Iterator, List, Optional, Union
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from common.async_db import run_sync
+from django_sandbox.breaker import CircuitBreaker, breakers
+from django_sandbox.exceptions import NoSandboxAvailableError
+from django_sandbox.models import Sandbox, Usage
+from django_sandbox.snapshot import usage_snapshot
+
+
+
+class SandboxLoad:
+    """Load of an enabled `Sandbox` according to its last polled `Usage`.
+    
+    * `sandbox` (`Sandbox`) - The sandbox.
+    * `usage` (`Usage`) - Last polled usage of the sandbox, None if it has
+       never been polled.
+    * `capacity` (`int`) - Number of containers of the sandbox (see
+       `ContainerSpecs.count`), None if unknown.
+    * `inflight` (`int`) - Number of executions currently running on the
+       sandbox on behalf of this process."""
+    
+    
+    def __init__(self, sandbox: Sandbox, usage: Optional[Usage], capacity: Optional[int],
+                 inflight: int = 0):
+        self.sandbox = sandbox
+        self.usage = usage
+        self.capacity = capacity if capacity is not None and capacity > 0 else None
+        self.inflight = inflight
+    
+    
+    def __repr__(self):
+        return f"<SandboxLoad - {self.sandbox} ({self.containers}/{self.capacity})>"
+    
+    
+    @property
+    def reachable(self) -> bool:
+        """Whether the sandbox responded to its last poll (assumed to be True
+        if it has never been polled)."""
+        return self.usage is None or self.usage.reached
+    
+    
+    @property
+    def containers(self) -> int:
+        """Estimated number of containers currently used."""
+        used = self.usage.container if self.usage is not None and self.usage.container else 0
+        return used + self.inflight
+    
+    
+    @property
+    def free(self) -> Optional[int]:
+        """Estimated number of free containers, None if the capacity of the
+        sandbox is unknown."""
+        if self.capacity is None:
+            return None
+        return max(self.capacity - self.containers, 0)
+    
+    
+    @property
+    def load(self) -> float:
+        """Load of the sandbox between 0 (idle) and 1 (every container or CPU
+        core used).
+        
+        The ratio of used containers is used when the capacity of the sandbox
+        is known, its current CPU usage otherwise."""
+        if self.capacity is not None:
+            return self.containers / self.capacity
+        if self.usage is not None and self.usage.cpu_usage:
+            return self.usage.cpu_usage[0]
+        return 0.0
+
+
+
+class SchedulingPolicy(abc.ABC):
+    """Base class of the policies used to select a sandbox."""
+    
+    
+    @abc.abstractmethod
+    def choose(self, loads: List[SandboxLoad]) -> SandboxLoad:
+        """Choose a sandbox among the given non-empty list of `loads`."""
+
+
+
+class LeastLoadedPolicy(SchedulingPolicy):
+    """Always select the sandbox with the lowest load."""
+    
+    
+    def choose(self, loads: List[SandboxLoad]) -> SandboxLoad:
+        return min(loads, key=lambda load: (load.load, -(load.free or 0)))
+
+
+
+class WeightedRoundRobinPolicy(SchedulingPolicy):
+    """Select sandboxes in turn, proportionally to their number of
+    containers.
+    
+    Uses the smooth weighted round-robin algorithm, interleaving sandboxes
+    instead of sending bursts to the one with the highest weight."""
+    
+    
+    def __init__(self):
+        self._current: Dict[int, int] = collections.defaultdict(int)
+    
+    
+    def choose(self, loads: List[SandboxLoad]) -> SandboxLoad:
+        total = 0
+        best = None
+        for load in loads:
+            weight = load.capacity or 1
+            self._current[load.sandbox.pk] += weight
+            total += weight
+            if best is None or self._current[load.sandbox.pk] > self._current[best.sandbox.pk]:
+                best = load
+        
+        self._current[best.sandbox.pk] -= total
+        return best
+
+
+
+class PowerOfTwoChoicesPolicy(SchedulingPolicy):
+    """Select the least loaded of two randomly chosen sandboxes.
+    
+    Avoids sending every request to the same sandbox when the loads are
+    stale, while still favoring the least loaded ones."""
+    
+    
+    def choose(self, loads: List[SandboxLoad]) -> SandboxLoad:
+        if len(loads) == 1:
+            return loads[0]
+        return LeastLoadedPolicy().choose(random.sample(loads, 2))
+
+
+
+class SandboxScheduler:
+    """Select the sandbox an execution should be sent to.
+    
+    The selection is based on an in-memory snapshot of the last polled
+    `Usage` of every enabled sandbox, reloaded every `ttl` seconds. Since this
+    snapshot is only updated by the poller, executions currently sent by this
+    process are also taken into account."""
+    
+    
+    def __init__(self, policy: SchedulingPolicy, ttl: float):
+        self.policy = policy
+        self.ttl = ttl
+        self._snapshot: List[SandboxLoad] = list()
+        self._loaded_at: Optional[float] = None
+        self._inflight: Dict[int, int] = collections.Counter()
+        self._polled: Dict[int, int] = dict()
+    
+    
+    @staticmethod
+    def _load() -> List[SandboxLoad]:
+        """Retrieve every enabled `Sandbox` along with its last `Usage`, taken
+        from `usage_snapshot`."""
+        sandboxes = Sandbox.objects.filter(enabled=True).select_related("container_specs")
+        usages = usage_snapshot.usages()
+        return [
+            SandboxLoad(s, usages.get(s.pk), s.container_specs.count)
+            for s in sandboxes
+        ]
+    
+    
+    def _record_polls(self) -> None:
+        """Feed the circuit breakers with the usages polled since the last
+        reload of the snapshot."""
+        for load in self._snapshot:
+            if load.usage is not None and self._polled.get(load.sandbox.pk) != load.usage.pk:
+                self._polled[load.sandbox.pk] = load.usage.pk
+                breakers.record(load.sandbox.pk, load.usage.reached)
+    
+    
+    def invalidate(self) -> None:
+        """Force the snapshot to be reloaded on next selection."""
+        self._loaded_at = None
+    
+    
+    async def snapshot(self) -> List[SandboxLoad]:
+        """Return the load of every enabled sandbox, reloading the snapshot if
+        it is older than `ttl`."""
+        now = time.monotonic()
+        if self._loaded_at is None or now - self._loaded_at > self.ttl:
+            self._snapshot = await run_sync(self._load)
+            self._loaded_at = now
+            self._record_polls()
+        
+        for load in self._snapshot:
+            load.inflight = self._inflight[load.sandbox.pk]
+        return self._snapshot
+    
+    
+    async def select(self, policy: SchedulingPolicy = None,
+                     exclude: Collection[int] = ()) -> Sandbox:
+        """Select an enabled and reachable sandbox using `policy` (default to
+        this scheduler's policy).
+        
+        Sandboxes whose circuit breaker is closed and with free containers are
+        preferred, `NoSandboxAvailableError` is raised if no sandbox can be
+        selected. Sandboxes whose primary key is in `exclude` are ignored."""
+        policy = policy or self.policy
+        loads = [
+            load for load in await self.snapshot()
+            if load.reachable and load.sandbox.pk not in exclude
+        ]
+        # Sandboxes whose breaker is open are skipped, half-open ones are only
+        # selected as a last resort
+        states = {load.sandbox.pk: breakers.get(load.sandbox.pk).state for load in loads}
+        loads = (
+            [load for load in loads if states[load.sandbox.pk] == CircuitBreaker.CLOSED]
+            or [load for load in loads if states[load.sandbox.pk] == CircuitBreaker.HALF_OPEN]
+        )
+        if not loads:
+            raise NoSandboxAvailableError("No enabled and reachable sandbox available")
+        
+        free = [load for load in loads if load.free is None or load.free > 0]
+        return policy.choose(free or loads).sandbox
+    
+    
+    @contextlib.contextmanager
+    def track(self, sandbox: Sandbox) -> Iterator[None]:
+        """Count an execution sent to `sandbox` as in-flight for the duration
+        of the context."""
+        self._inflight[sandbox.pk] += 1
+        try:
+            yield
+        finally:
+            self._inflight[sandbox.pk] -= 1
+
+
+
+def get_policy(policy: Union[str, SchedulingPolicy]) -> SchedulingPolicy:
+    """Return an instance of `policy`, which may be the dotted path of a
+    `SchedulingPolicy` subclass."""
+    if isinstance(policy, str):
+        return import_string(policy)()
+    return policy
+
+
+
+scheduler = SandboxScheduler(
+    get_policy(settings.SANDBOX_SCHEDULING_POLICY), settings.SANDBOX_POLL_USAGE_EVERY
+)
@@ -0,0 +1,159 @@
+from typing import Any, Dict, Iterable
+
+import dgeq
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import OuterRef, Subquery
+
+from common.caches import check_shared_cache
+from django_sandbox.models import Sandbox, Usage
+
+
+
+class UsageSnapshot:
+    """Last polled `Usage` of every sandbox, shared by every process through
+    the Django cache named by `alias`.
+    
+    The last usage of each sandbox is stored serialized in its own entry
+    (empty for a sandbox without usage), the entry `KEY` listing the primary
+    key of every sandbox. The snapshot is published by the poller after every
+    poll and kept up to date when a `Usage` is saved or a `Sandbox` deleted.
+    Since each update only sets the entry of its sandbox, concurrent updates of
+    different sandboxes cannot overwrite each other. Reading it takes two
+    cache accesses whatever the number of sandboxes, instead of an index scan
+    of the `Usage` table per sandbox.
+    
+    Entries expire after `timeout` seconds, so that they are not used anymore
+    if the poller stops. The snapshot is rebuilt from the database on next
+    read if any of its entries is missing, e.g. when a sandbox is created or
+    deleted.
+    
+    The cache must be shared by every process (see `check_usage_snapshot()`),
+    the poller running in the Celery workers.
+    
+    Methods are synchronous and make queries on a miss, they should be called
+    through `run_sync()`."""
+    
+    KEY = "sandbox_usage_latest"
+    
+    
+    def __init__(self, alias: str, timeout: int):
+        self.alias = alias
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+    
+    
+    @property
+    def cache(self):
+        return caches[self.alias]
+    
+    
+    def key(self, sandbox_pk: int) -> str:
+        """Return the key of the last usage of the sandbox of primary key
+        `sandbox_pk`."""
+        return f"{self.KEY}_{sandbox_pk}"
+    
+    
+    @staticmethod
+    def _load() -> Dict[int, Dict[str, Any]]:
+        """Retrieve the last `Usage` of every `Sandbox` from the database,
+        empty for sandboxes without usage."""
+        latest = Usage.objects.filter(sandbox=OuterRef("pk")).order_by("-date").values("pk")[:1]
+        pks = dict(Sandbox.objects.annotate(latest=Subquery(latest)).values_list("pk", "latest"))
+        usages = Usage.objects.select_related("sandbox").filter(pk__in=[pk for pk in pks.values() if pk])
+        return {**{pk: {} for pk in pks}, **{u.sandbox_id: dgeq.serialize(u) for u in usages}}
+    
+    
+    def _store(self, rows: Dict[int, Dict[str, Any]]) -> None:
+        """Store the entry of every sandbox in `rows`, then the list of
+        sandboxes, so that it never lists a sandbox whose entry is missing."""
+        self.cache.set_many({self.key(pk): row for pk, row in rows.items()}, self.timeout)
+        self.cache.set(self.KEY, list(rows), self.timeout)
+    
+    
+    def rows(self) -> Dict[int, Dict[str, Any]]:
+        """Return the last usage of every sandbox serialized, mapped to the
+        primary key of the sandbox. Sandboxes without usage are left out."""
+        pks = self.cache.get(self.KEY)
+        if pks is not None:
+            entries = self.cache.get_many([self.key(pk) for pk in pks])
+            if len(entries) == len(pks):
+                self.hits += 1
+                return {pk: entries[self.key(pk)] for pk in pks if entries[self.key(pk)]}
+        
+        self.misses += 1
+        rows = self._load()
+        self._store(rows)
+        return {pk: row for pk, row in rows.items() if row}
+    
+    
+    def usages(self) -> Dict[int, Usage]:
+        """Return the last `Usage` of every sandbox, mapped to the primary key
+        of the sandbox.
+        
+        Instances are built from the snapshot and are not meant to be saved,
+        their `sandbox` must not be accessed."""
+        return {
+            pk: Usage(**{f: v for f, v in row.items() if f != "sandbox"}, sandbox_id=pk)
+            for pk, row in self.rows().items()
+        }
+    
+    
+    def publish(self, usages: Iterable[Usage]) -> None:
+        """Replace the snapshot with `usages`, which must contain the last
+        usage of every sandbox."""
+        self._store({u.sandbox_id: dgeq.serialize(u) for u in usages})
+    
+    
+    def update(self, usage: Usage) -> None:
+        """Set `usage` as the last usage of its sandbox if it is more recent
+        than the current one, and if the snapshot is currently published.
+        
+        The snapshot is discarded if it does not contain the sandbox yet, to
+        be rebuilt on next read."""
+        pks = self.cache.get(self.KEY)
+        if pks is None:
+            return
+        if usage.sandbox_id not in pks:
+            self.cache.delete(self.KEY)
+            return
+        current = self.cache.get(self.key(usage.sandbox_id))
+        if not current or current["date"] <= usage.date:
+            self.cache.set(self.key(usage.sandbox_id), dgeq.serialize(usage), self.timeout)
+    
+    
+    def discard(self, sandbox_pk: int) -> None:
+        """Remove the sandbox of primary key `sandbox_pk` from the snapshot,
+        which is rebuilt on next read."""
+        self.cache.delete_many([self.KEY, self.key(sandbox_pk)])
+
+
+
+usage_snapshot = UsageSnapshot(
+    settings.SANDBOX_USAGE_SNAPSHOT, settings.SANDBOX_USAGE_SNAPSHOT_TIMEOUT
+)
+
+
+
+def update_snapshot(sender, instance: Usage, created: bool, **kwargs):
+    """Publish a newly created `Usage` in `usage_snapshot`."""
+    if created:
+        usage_snapshot.update(instance)
+
+
+
+def discard_snapshot(sender, instance: Sandbox, **kwargs):
+    """Remove a deleted `Sandbox` from `usage_snapshot`."""
+    usage_snapshot.discard(instance.pk)
+
+
+
+def check_usage_snapshot(app_configs, **kwargs):
+    """Warn if `SANDBOX_USAGE_SNAPSHOT` is not shared by every process."""
+    return check_shared_cache(
+        usage_snapshot.alias, "SANDBOX_USAGE_SNAPSHOT",
+        "usages published by the poller in the Celery workers are not seen by the scheduler "
+        "and the views, which use usages up to SANDBOX_USAGE_SNAPSHOT_TIMEOUT seconds old",
+        "django_sandbox.W002"
+    )
@@ -0,0 +1,102 @@
+from typing import Any, Dict, List, Sequence
+
+from django.db import models
+from django.db.models import Avg, Count, Max, Q, QuerySet
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+
+# Fields a `Request` collection can be grouped by.
+GROUPS = ("sandbox", "user", "bucket")
+
+# Units the date of a `Request` can be truncated to when grouped by `bucket`.
+BUCKETS = ("minute", "hour", "day", "week", "month")
+
+
+
+class Percentile(models.Aggregate):
+    """Continuous percentile of an expression, using PostgreSQL's
+    `PERCENTILE_CONT`. NULL values are ignored."""
+    
+    function = "PERCENTILE_CONT"
+    name = "Percentile"
+    template = "%(function)s(%(percentile)s) WITHIN GROUP (ORDER BY %(expressions)s)"
+    output_field = models.FloatField()
+    
+    
+    def __init__(self, expression, percentile: float, **extra):
+        if not 0 <= percentile <= 1:
+            raise ValueError(f"Percentile must be between 0 and 1 (received {percentile})")
+        super().__init__(expression, percentile=float(percentile), **extra)
+
+
+
+def percentile_name(percentile: float) -> str:
+    """Return the name of `percentile` in the statistics, e.g. `p95` for
+    0.95."""
+    return f"p{percentile * 100:g}".replace(".", "_")
+
+
+
+def execution_stats(queryset: QuerySet, group: Sequence[str] = (), bucket: str = "hour",
+                    percentiles: Sequence[float] = (0.5, 0.9, 0.99)) -> List[Dict[str, Any]]:
+    """Compute statistics about the `Request` of `queryset`, grouped by the
+    fields of `group` (see `GROUPS`), `bucket` being the unit the date is
+    truncated to when grouping by `bucket`.
+    
+    Every statistic is computed by the database, using two queries. Each row
+    contains the fields of `group` and :
+    
+    * `count` - Number of requests.
+    * `succeeded` / `failed` - Number of requests the sandbox responded to or
+      not.
+    * `cached` - Number of requests served by the execution cache.
+    * `success_ratio` - Ratio of succeeded requests.
+    * `total_time` - Average, maximum and `percentiles` of `Response.total_time`.
+    * `statuses` - Number of responses per `Response.status`."""
+    queryset = queryset.order_by()
+    if "bucket" in group:
+        queryset = queryset.annotate(bucket=Trunc("date", bucket, tzinfo=timezone.utc))
+    keys = [g for g in GROUPS if g in group]
+    
+    # Annotations are prefixed to avoid conflicts with the fields of `Request`
+    rows = queryset.values(*keys).annotate(
+        stats_count=Count("pk"),
+        stats_succeeded=Count("pk", filter=Q(success=True)),
+        stats_cached=Count("pk", filter=Q(cached=True)),
+        stats_avg=Avg("response__total_time"),
+        stats_max=Max("response__total_time"),
+        **{
+            f"stats_{percentile_name(p)}": Percentile("response__total_time", p)
+            for p in percentiles
+        }
+    ).order_by(*keys)
+    statuses = queryset.filter(response__isnull=False).values(
+        *keys, "response__status"
+    ).annotate(stats_count=Count("pk"))
+    
+    distribution = dict()
+    for row in statuses:
+        key = tuple(row[k] for k in keys)
+        distribution.setdefault(key, dict())[str(row["response__status"])] = row["stats_count"]
+    
+    stats = list()
+    for row in rows:
+        stats.append({
+            **{k: row[k] for k in keys},
+            "count":         row["stats_count"],
+            "succeeded":     row["stats_succeeded"],
+            "failed":        row["stats_count"] - row["stats_succeeded"],
+            "cached":        row["stats_cached"],
+            "success_ratio": row["stats_succeeded"] / row["stats_count"],
+            "total_time":    {
+                "avg": row["stats_avg"],
+                "max": row["stats_max"],
+                **{
+                    percentile_name(p): row[f"stats_{percentile_name(p)}"]
+                    for p in percentiles
+                },
+            },
+            "statuses":      distribution.get(tuple(row[k] for k in keys), dict()),
+        })
+    return stats
@@ -1,53 +1,180 @@
+import asyncio
 import logging
+from typing import Any, Awaitable, Dict, List, Tuple, Type, TypeVar, Union
 
 import dgeq
 from asgiref.sync import async_to_sync
 from celery import shared_task
 from channels.layers import get_channel_layer
+from django.conf import settings
 from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
 
-from django_sandbox.models import Sandbox
+from common.async_db import run_sync
+from django_sandbox.cache import detail_cache
+from django_sandbox.models import ContainerSpecs, Sandbox, SandboxSpecs, Usage
+from django_sandbox.pool import sandbox_pool
+from django_sandbox.rollup import compact_usage as _compact_usage
+from django_sandbox.snapshot import usage_snapshot
 
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
 
 
-@shared_task
-def poll_usage(sandbox_pk: int) -> None:
-    """Poll usage of a sandbox and send it to the correct group."""
-    sandbox = Sandbox.objects.get(pk=sandbox_pk)
-    usage = async_to_sync(sandbox.poll_usage)()
+
+async def _with_timeout(sandbox: Sandbox, coroutine: Awaitable[T], timeout: float
+                        ) -> Union[T, Exception]:
+    """Await `coroutine`, returning the exception instead of raising it if it
+    failed or did not complete within `timeout` seconds."""
+    try:
+        return await asyncio.wait_for(coroutine, timeout)
+    except Exception as e:
+        logger.warning(f"Could not poll sandbox {sandbox}: {e!r}")
+        return e
+
+
+
+async def _broadcast(messages: List[Tuple[str, Dict[str, Any]]]) -> None:
+    """Send every `(group, message)` of `messages` concurrently."""
     channel_layer = get_channel_layer()
+    await asyncio.gather(*(channel_layer.group_send(g, m) for g, m in messages))
+
+
+
+def _save_usages(usages: List[Usage]) -> List[Tuple[str, Dict[str, Any]]]:
+    """Save `usages` with a single query, publish them in `usage_snapshot`
+    and return the messages to send to the corresponding groups."""
+    usages = Usage.objects.bulk_create(usages)
+    usage_snapshot.publish(usages)
+    encoder = DjangoJSONEncoder()
+    return [
+        (
+            f"sandbox_usage_{u.sandbox_id}",
+            {
+                'type':    'sandbox_usage',
+                'sandbox': u.sandbox_id,
+                'usage':   encoder.encode(dgeq.serialize(u))
+            }
+        )
+        for u in usages
+    ]
+
+
+
+async def _poll_fleet_usage(timeout: float) -> None:
+    """Poll usage of every sandbox concurrently, save them with a single
+    query and send them to the correct groups."""
+    try:
+        sandboxes = await run_sync(list, Sandbox.objects.all())
+        results = await asyncio.gather(*(
+            _with_timeout(s, s.fetch_usage(), timeout) for s in sandboxes
+        ))
+    finally:
+        await sandbox_pool.close()
+    
+    usages = [
+        Usage(sandbox=s, reached=False) if isinstance(r, Exception) else r
+        for s, r in zip(sandboxes, results)
+    ]
+    await _broadcast(await run_sync(_save_usages, usages))
+
+
+
+def _updatable_fields(model: Type[models.Model]) -> List[str]:
+    """Return the name of every field of `model` but its primary key and
+    `sandbox`."""
+    return [
+        f.name for f in model._meta.concrete_fields if not f.primary_key and f.name != "sandbox"
+    ]
+
+
+
+def _save_specifications(sandboxes: List[Sandbox], results: List[Any]
+                         ) -> List[Tuple[str, Dict[str, Any]]]:
+    """Update the specifications of `sandboxes` from the corresponding
+    `results` of `Sandbox.fetch_specifications()` within a single transaction,
+    skipping failed ones.
+    
+    Return the messages to send to the corresponding groups."""
+    polled = [(s, r) for s, r in zip(sandboxes, results) if not isinstance(r, Exception)]
+    for sandbox, (raw_specs, libs) in polled:
+        sandbox.server_specs.update_from(raw_specs)
+        sandbox.container_specs.update_from(raw_specs, libs)
+    
+    with transaction.atomic():
+        SandboxSpecs.objects.bulk_update(
+            [s.server_specs for s, _ in polled], _updatable_fields(SandboxSpecs)
+        )
+        ContainerSpecs.objects.bulk_update(
+            [s.container_specs for s, _ in polled], _updatable_fields(ContainerSpecs)
+        )
+    detail_cache.invalidate(SandboxSpecs, [s.server_specs.pk for s, _ in polled])
+    detail_cache.invalidate(ContainerSpecs, [s.container_specs.pk for s, _ in polled])
     
-    async_to_sync(channel_layer.group_send)(
-        f"sandbox_usage_{sandbox_pk}",
-        {
-            'type':  'sandbox_usage',
-            'usage': DjangoJSONEncoder().encode(dgeq.serialize(usage))
-        }
-    )
+    encoder = DjangoJSONEncoder()
+    messages = list()
+    for sandbox, _ in polled:
+        messages.append((
+            f"sandbox_sandbox_specs_{sandbox.pk}",
+            {
+                'type':    'sandbox_specs',
+                'sandbox': sandbox.pk,
+                'specs':   encoder.encode(dgeq.serialize(sandbox.server_specs))
+            }
+        ))
+        messages.append((
+            f"sandbox_container_specs_{sandbox.pk}",
+            {
+                'type':    'container_specs',
+                'sandbox': sandbox.pk,
+                'specs':   encoder.encode(dgeq.serialize(sandbox.container_specs))
+            }
+        ))
+    return messages
+
+
+
+async def _poll_fleet_specifications(timeout: float) -> None:
+    """Poll specifications of every enabled sandbox concurrently, save them
+    within a single transaction and send them to the correct groups."""
+    try:
+        sandboxes = await run_sync(
+            list, Sandbox.objects.filter(enabled=True).select_related("server_specs", "container_specs")
+        )
+        results = await asyncio.gather(*(
+            _with_timeout(s, s.fetch_specifications(), timeout) for s in sandboxes
+        ))
+    finally:
+        await sandbox_pool.close()
+    
+    await _broadcast(await run_sync(_save_specifications, sandboxes, results))
 
 
 
 @shared_task
-def poll_specifications(sandbox_pk: int) -> None:
-    """Poll specifications of a sandbox and send it to the correct group."""
-    sandbox = Sandbox.objects.get(pk=sandbox_pk)
-    sandbox_specs, container_specs = async_to_sync(sandbox.poll_specifications)()
-    channel_layer = get_channel_layer()
+def poll_usage() -> None:
+    """Poll usage of every sandbox and send them to the correct groups.
     
-    async_to_sync(channel_layer.group_send)(
-        f"sandbox_sandbox_specs_{sandbox_pk}",
-        {
-            'type':  'sandbox_specs',
-            'specs': DjangoJSONEncoder().encode(dgeq.serialize(sandbox_specs))
-        }
-    )
-    async_to_sync(channel_layer.group_send)(
-        f"sandbox_container_specs_{sandbox_pk}",
-        {
-            'type':  'container_specs',
-            'specs': DjangoJSONEncoder().encode(dgeq.serialize(container_specs))
-        }
-    )
+    Sandboxes are polled concurrently, each one not answering within
+    `SANDBOX_POLL_TIMEOUT` seconds being marked as unreached."""
+    async_to_sync(_poll_fleet_usage)(settings.SANDBOX_POLL_TIMEOUT)
+
+
+
+@shared_task
+def poll_specifications() -> None:
+    """Poll specifications of every enabled sandbox and send them to the
+    correct groups.
+    
+    Sandboxes are polled concurrently, the specifications of those not
+    answering within `SANDBOX_POLL_TIMEOUT` seconds being left untouched."""
+    async_to_sync(_poll_fleet_specifications)(settings.SANDBOX_POLL_TIMEOUT)
+
+
+
+@shared_task
+def compact_usage() -> None:
+    """Roll old usages up into aggregates, see `django_sandbox.rollup`."""
+    _compact_usage()
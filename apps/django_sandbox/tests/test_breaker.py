@@ -0,0 +1,96 @@
+from django.test import SimpleTestCase
+
+from django_sandbox.breaker import CircuitBreaker, CircuitBreakers
+
+
+
+class Clock:
+    """Clock advanced manually."""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    
+    def __call__(self):
+        return self.now
+
+
+
+class CircuitBreakerTestCase(SimpleTestCase):
+    
+    def setUp(self):
+        self.clock = Clock()
+        self.breaker = CircuitBreaker(threshold=3, backoff=5, max_backoff=20, clock=self.clock)
+    
+    
+    def test_open(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(CircuitBreaker.CLOSED, self.breaker.state)
+        self.assertTrue(self.breaker.allow())
+        
+        self.breaker.record_failure()
+        self.assertEqual(CircuitBreaker.OPEN, self.breaker.state)
+        self.assertFalse(self.breaker.allow())
+    
+    
+    def test_success_resets_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(CircuitBreaker.CLOSED, self.breaker.state)
+    
+    
+    def test_half_open(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.clock.now = 5
+        self.assertEqual(CircuitBreaker.HALF_OPEN, self.breaker.state)
+        self.assertEqual(CircuitBreaker.HALF_OPEN, self.breaker.allow())
+        # Only a single probe is allowed
+        self.assertIsNone(self.breaker.allow())
+        
+        self.breaker.record_success()
+        self.assertEqual(CircuitBreaker.CLOSED, self.breaker.state)
+        self.assertTrue(self.breaker.allow())
+    
+    
+    def test_release(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.clock.now = 5
+        self.assertEqual(CircuitBreaker.HALF_OPEN, self.breaker.allow())
+        self.breaker.release()
+        self.assertEqual(CircuitBreaker.HALF_OPEN, self.breaker.allow())
+        self.assertEqual(3, self.breaker.failures)
+    
+    
+    def test_backoff(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.assertEqual(5, self.breaker.delay)
+        
+        for expected in (10, 20, 20):
+            self.clock.now += self.breaker.delay
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record_failure()
+            self.assertEqual(CircuitBreaker.OPEN, self.breaker.state)
+            self.assertEqual(expected, self.breaker.delay)
+
+
+
+class CircuitBreakersTestCase(SimpleTestCase):
+    
+    def test_record(self):
+        breakers = CircuitBreakers(threshold=1, backoff=5, max_backoff=20)
+        breakers.record(1, True)
+        breakers.record(2, False)
+        self.assertEqual(
+            {
+                1: {"state": CircuitBreaker.CLOSED, "failures": 0},
+                2: {"state": CircuitBreaker.OPEN, "failures": 1},
+            },
+            breakers.stats()
+        )
+        self.assertIs(breakers.get(2), breakers.get(2))
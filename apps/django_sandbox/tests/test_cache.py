@@ -0,0 +1,92 @@
+import dgeq
+from django.core.cache import caches
+from django.test import SimpleTestCase, TransactionTestCase
+
+from django_sandbox.cache import DetailCache, ExecutionCache, check_detail_cache
+from django_sandbox.models import Sandbox, SandboxSpecs
+
+
+
+class ExecutionCacheTestCase(SimpleTestCase):
+    
+    def setUp(self):
+        self.cache = ExecutionCache("sandbox_executions")
+        caches["sandbox_executions"].clear()
+    
+    
+    def test_cacheable(self):
+        self.assertTrue(self.cache.cacheable({"commands": ["true"]}))
+        self.assertTrue(self.cache.cacheable({"commands": ["true"], "save": False}))
+        self.assertFalse(self.cache.cacheable({"commands": ["true"], "save": True}))
+    
+    
+    def test_key(self):
+        config1 = {"commands": ["true"], "result_path": "result.txt"}
+        config2 = {"result_path": "result.txt", "commands": ["true"]}
+        self.assertEqual(self.cache.key(config1, None), self.cache.key(config2, None))
+        self.assertEqual(self.cache.key(config1, b""), self.cache.key(config1, None))
+        self.assertNotEqual(self.cache.key(config1, b"env1"), self.cache.key(config1, b"env2"))
+        self.assertNotEqual(
+            self.cache.key(config1, None), self.cache.key({"commands": ["false"]}, None)
+        )
+    
+    
+    async def test_get_set(self):
+        key = self.cache.key({"commands": ["true"]}, None)
+        self.assertIsNone(await self.cache.get(key))
+        await self.cache.set(key, {"status": 0})
+        self.assertEqual({"status": 0}, await self.cache.get(key))
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual(1, self.cache.misses)
+
+
+
+class DetailCacheTestCase(TransactionTestCase):
+    
+    def setUp(self):
+        self.cache = DetailCache("sandbox_details")
+        caches["sandbox_details"].clear()
+        self.sandbox = Sandbox.objects.create(name="Test", url="http://localhost:7000", enabled=True)
+        self.specs = SandboxSpecs.objects.get(sandbox=self.sandbox)
+    
+    
+    def test_get(self):
+        etag, row = self.cache.get(SandboxSpecs, self.specs.pk)
+        self.assertEqual(dgeq.serialize(self.specs), row)
+        self.assertEqual(self.cache.etag(row), etag)
+        
+        with self.assertNumQueries(0):
+            self.assertEqual((etag, row), self.cache.get(SandboxSpecs, self.specs.pk))
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual(1, self.cache.misses)
+    
+    
+    def test_get_does_not_exist(self):
+        with self.assertRaises(SandboxSpecs.DoesNotExist):
+            self.cache.get(SandboxSpecs, self.specs.pk + 1000)
+    
+    
+    def test_get_many_relations(self):
+        with self.assertRaises(ValueError):
+            self.cache.get(Sandbox, self.sandbox.pk)
+    
+    
+    def test_invalidated_on_save(self):
+        etag, _ = self.cache.get(SandboxSpecs, self.specs.pk)
+        self.specs.cpu_core = 8
+        self.specs.save()
+        new_etag, row = self.cache.get(SandboxSpecs, self.specs.pk)
+        self.assertNotEqual(etag, new_etag)
+        self.assertEqual(8, row["cpu_core"])
+    
+    
+    def test_invalidated_on_delete(self):
+        self.cache.get(SandboxSpecs, self.specs.pk)
+        self.sandbox.delete()
+        with self.assertRaises(SandboxSpecs.DoesNotExist):
+            self.cache.get(SandboxSpecs, self.specs.pk)
+    
+    
+    def test_check_detail_cache(self):
+        # The cache of the test settings is local to the process
+        self.assertEqual(["django_sandbox.W001"], [w.id for w in check_detail_cache(None)])
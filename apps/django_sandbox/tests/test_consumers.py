@@ -1,15 +1,19 @@
+import json
 import os
 
+import aiohttp
 import dgeq
 from channels.db import database_sync_to_async
 from channels.layers import get_channel_layer
-from channels.testing import WebsocketCommunicator
+from channels.testing import HttpCommunicator, WebsocketCommunicator
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser, Permission, User
 from django.core.exceptions import PermissionDenied
 from django.core.serializers.json import DjangoJSONEncoder
 from django.test import TransactionTestCase
+from mock import patch
 
+from common.enums import ErrorCode
 from django_sandbox.models import Sandbox
 from platon.routing import application
 
@@ -60,6 +64,42 @@ class ConsumerTestCase(TransactionTestCase):
             await communicator.connect()
     
     
+    async def test_usage_consumer_delta(self):
+        communicator = WebsocketCommunicator(
+            application, f'/ws/sandbox/usage/{self.sandbox.pk}/?format=delta'
+        )
+        communicator.scope["user"] = self.user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        
+        for container in (1, 2):
+            await self.channel_layer.group_send(
+                f"sandbox_usage_{self.sandbox.pk}",
+                {
+                    'type':  'sandbox_usage',
+                    'usage': json.dumps({"sandbox": self.sandbox.pk, "container": container})
+                }
+            )
+        
+        result = await communicator.receive_json_from()
+        self.assertEqual(
+            {"type": "key", "columns": [["sandbox"], ["container"]], "values": [self.sandbox.pk, 1]},
+            result
+        )
+        result = await communicator.receive_json_from()
+        self.assertEqual({"type": "delta", "changed": [1], "values": [2]}, result)
+        await communicator.disconnect()
+    
+    
+    async def test_usage_consumer_unknown_format(self):
+        communicator = WebsocketCommunicator(
+            application, f'/ws/sandbox/usage/{self.sandbox.pk}/?format=xml'
+        )
+        communicator.scope["user"] = self.user
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+    
+    
     async def test_sandbox_specs_consumer(self):
         communicator = WebsocketCommunicator(
             application, f'/ws/sandbox/sandbox_specs/{self.sandbox.pk}/'
@@ -122,3 +162,202 @@ class ConsumerTestCase(TransactionTestCase):
             )
             communicator.scope["user"] = AnonymousUser()
             await communicator.connect()
+    
+    
+    async def test_monitoring_consumer(self):
+        communicator = WebsocketCommunicator(application, '/ws/sandbox/monitoring/')
+        communicator.scope["user"] = self.user
+        await communicator.connect()
+        
+        await communicator.send_json_to({
+            "id":            1,
+            "action":        "subscribe",
+            "subscriptions": [[self.sandbox.pk, "usage"], [self.sandbox.pk, "sandbox_specs"]],
+        })
+        result = await communicator.receive_json_from()
+        self.assertEqual(
+            {
+                "id":            1,
+                "type":          "subscribed",
+                "subscriptions": [[self.sandbox.pk, "sandbox_specs"], [self.sandbox.pk, "usage"]],
+            },
+            result
+        )
+        
+        for container in (1, 2):
+            await self.channel_layer.group_send(
+                f"sandbox_usage_{self.sandbox.pk}",
+                {
+                    'type':    'sandbox_usage',
+                    'sandbox': self.sandbox.pk,
+                    'usage':   json.dumps({"container": container}),
+                }
+            )
+        await self.channel_layer.group_send(
+            f"sandbox_sandbox_specs_{self.sandbox.pk}",
+            {
+                'type':    'sandbox_specs',
+                'sandbox': self.sandbox.pk,
+                'specs':   json.dumps({"cpu_core": 4}),
+            }
+        )
+        result = await communicator.receive_json_from()
+        self.assertEqual(
+            {
+                "type":    "batch",
+                "updates": [
+                    {"sandbox": self.sandbox.pk, "stream": "usage", "data": {"container": 2}},
+                    {"sandbox": self.sandbox.pk, "stream": "sandbox_specs", "data": {"cpu_core": 4}},
+                ]
+            },
+            result
+        )
+        
+        await communicator.send_json_to({
+            "action": "unsubscribe", "subscriptions": [[self.sandbox.pk, "usage"]]
+        })
+        result = await communicator.receive_json_from()
+        self.assertEqual("unsubscribed", result["type"])
+        self.assertEqual([[self.sandbox.pk, "sandbox_specs"]], result["subscriptions"])
+        await communicator.disconnect()
+    
+    
+    async def test_monitoring_consumer_invalid(self):
+        await database_sync_to_async(self.user.user_permissions.remove)(
+            await database_sync_to_async(Permission.objects.get)(codename="view_containerspecs")
+        )
+        communicator = WebsocketCommunicator(application, '/ws/sandbox/monitoring/')
+        communicator.scope["user"] = self.user
+        await communicator.connect()
+        
+        await communicator.send_json_to({"action": "subscribe", "subscriptions": [[1, "unknown"]]})
+        result = await communicator.receive_json_from()
+        self.assertEqual("error", result["type"])
+        self.assertEqual(ErrorCode.ValidationError.value, result["code"])
+        
+        await communicator.send_json_to({
+            "action": "subscribe", "subscriptions": [[self.sandbox.pk, "container_specs"]]
+        })
+        result = await communicator.receive_json_from()
+        self.assertEqual("error", result["type"])
+        self.assertEqual(ErrorCode.PermissionDenied.value, result["code"])
+        await communicator.disconnect()
+    
+    
+    async def test_monitoring_consumer_permission_denied(self):
+        with self.assertRaises(PermissionDenied):
+            communicator = WebsocketCommunicator(application, '/ws/sandbox/monitoring/')
+            communicator.scope["user"] = AnonymousUser()
+            await communicator.connect()
+    
+    
+    async def test_execution_consumer(self):
+        await database_sync_to_async(self.user.user_permissions.add)(
+            await database_sync_to_async(Permission.objects.get)(codename="add_request")
+        )
+        communicator = WebsocketCommunicator(application, '/ws/sandbox/execute/')
+        communicator.scope["user"] = self.user
+        await communicator.connect()
+        
+        await communicator.send_json_to({
+            "id":      1,
+            "config":  {'commands': ['echo "test"', 'echo "test2"']},
+            "sandbox": self.sandbox.pk,
+        })
+        frames = [await communicator.receive_json_from(timeout=10) for _ in range(5)]
+        self.assertEqual(
+            ["queued", "started", "command", "command", "response"],
+            [f["type"] for f in frames]
+        )
+        self.assertTrue(all(f["id"] == 1 for f in frames))
+        self.assertEqual(self.sandbox.pk, frames[1]["sandbox"])
+        self.assertEqual("test\n", frames[2]["result"]["stdout"])
+        self.assertEqual("test2\n", frames[3]["result"]["stdout"])
+        self.assertTrue(frames[4]["request"]["success"])
+        self.assertEqual(0, frames[4]["response"]["status"])
+        await communicator.disconnect()
+    
+    
+    async def test_execution_consumer_invalid(self):
+        await database_sync_to_async(self.user.user_permissions.add)(
+            await database_sync_to_async(Permission.objects.get)(codename="add_request")
+        )
+        communicator = WebsocketCommunicator(application, '/ws/sandbox/execute/')
+        communicator.scope["user"] = self.user
+        await communicator.connect()
+        
+        await communicator.send_json_to({"config": {}, "environment": "not base64 !"})
+        result = await communicator.receive_json_from()
+        self.assertEqual("error", result["type"])
+        self.assertEqual(ErrorCode.ValidationError.value, result["code"])
+        
+        await communicator.send_json_to({"config": {}, "sandbox": 9999})
+        result = await communicator.receive_json_from()
+        self.assertEqual("error", result["type"])
+        self.assertEqual(ErrorCode.DoesNotExist.value, result["code"])
+        
+        await communicator.send_json_to({"config": {}, "sandbox": "not an int"})
+        result = await communicator.receive_json_from()
+        self.assertEqual("error", result["type"])
+        self.assertEqual(ErrorCode.ValidationError.value, result["code"])
+        await communicator.disconnect()
+    
+    
+    async def test_execution_consumer_client_error(self):
+        await database_sync_to_async(self.user.user_permissions.add)(
+            await database_sync_to_async(Permission.objects.get)(codename="add_request")
+        )
+        
+        async def execute(sandbox, user, config, environment=None):
+            raise aiohttp.ClientConnectionError("Sandbox unreachable")
+        
+        communicator = WebsocketCommunicator(application, '/ws/sandbox/execute/')
+        communicator.scope["user"] = self.user
+        await communicator.connect()
+        with patch.object(Sandbox, "execute", execute):
+            await communicator.send_json_to({
+                "id": 1, "config": {'commands': ['true']}, "sandbox": self.sandbox.pk
+            })
+            frames = [await communicator.receive_json_from(timeout=10) for _ in range(3)]
+        self.assertEqual(["queued", "started", "error"], [f["type"] for f in frames])
+        self.assertEqual(1, frames[2]["id"])
+        self.assertIn("Sandbox unreachable", frames[2]["message"])
+        self.assertEqual(ErrorCode.UNKNOWN.value, frames[2]["code"])
+        await communicator.disconnect()
+    
+    
+    async def test_execution_consumer_permission_denied(self):
+        with self.assertRaises(PermissionDenied):
+            communicator = WebsocketCommunicator(application, '/ws/sandbox/execute/')
+            communicator.scope["user"] = self.user
+            await communicator.connect()
+    
+    
+    async def test_download_consumer(self):
+        await database_sync_to_async(self.user.user_permissions.add)(
+            await database_sync_to_async(Permission.objects.get)(codename="view_response")
+        )
+        request = await self.sandbox.execute(
+            user=self.user, config={'commands': ['echo "test" > result.txt'], 'save': True}
+        )
+        
+        communicator = HttpCommunicator(
+            application, "GET",
+            f"/api/sandbox/sandbox/{self.sandbox.pk}/environment/"
+            f"{request.response.environment}/"
+        )
+        communicator.scope["user"] = self.user
+        communicator.scope["query_string"] = b"file=result.txt"
+        response = await communicator.get_response(timeout=10)
+        self.assertEqual(200, response["status"])
+        self.assertEqual(b"test\n", response["body"])
+    
+    
+    async def test_download_consumer_permission_denied(self):
+        communicator = HttpCommunicator(
+            application, "GET", f"/api/sandbox/sandbox/{self.sandbox.pk}/environment/unknown/"
+        )
+        communicator.scope["user"] = AnonymousUser()
+        response = await communicator.get_response()
+        self.assertEqual(403, response["status"])
+        self.assertEqual(ErrorCode.PermissionDenied.value, json.loads(response["body"])["code"])
@@ -0,0 +1,79 @@
+import asyncio
+from datetime import timedelta
+
+from django.core.cache import caches
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from django_sandbox.environments import EnvironmentCache
+
+
+
+class FakeASandbox:
+    """Sandbox saving every uploaded environment for `expire` seconds."""
+    
+    def __init__(self, expire=3600, status=0):
+        self.expire = expire
+        self.status = status
+        self.uploads = 0
+    
+    
+    async def execute(self, config, environment=None):
+        self.uploads += 1
+        await asyncio.sleep(0)
+        return {
+            "status":      self.status,
+            "environment": f"uuid-{self.uploads}",
+            "expire":      (timezone.now() + timedelta(seconds=self.expire)).isoformat(),
+        }
+
+
+
+class EnvironmentCacheTestCase(SimpleTestCase):
+    
+    def setUp(self):
+        self.cache = EnvironmentCache("sandbox_environments", 60)
+        caches["sandbox_environments"].clear()
+    
+    
+    def test_key(self):
+        self.assertEqual(self.cache.key(1, b"env"), self.cache.key(1, b"env"))
+        self.assertNotEqual(self.cache.key(1, b"env"), self.cache.key(2, b"env"))
+        self.assertNotEqual(self.cache.key(1, b"env1"), self.cache.key(1, b"env2"))
+    
+    
+    async def test_resolve(self):
+        asandbox = FakeASandbox()
+        self.assertEqual("uuid-1", await self.cache.resolve(1, asandbox, b"env"))
+        self.assertEqual("uuid-1", await self.cache.resolve(1, asandbox, b"env"))
+        self.assertEqual("uuid-2", await self.cache.resolve(2, asandbox, b"env"))
+        self.assertEqual(2, asandbox.uploads)
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual(2, self.cache.misses)
+    
+    
+    async def test_resolve_concurrent(self):
+        asandbox = FakeASandbox()
+        environments = await asyncio.gather(*(
+            self.cache.resolve(1, asandbox, b"env") for _ in range(10)
+        ))
+        self.assertEqual(["uuid-1"] * 10, environments)
+        self.assertEqual(1, asandbox.uploads)
+    
+    
+    async def test_resolve_expire(self):
+        asandbox = FakeASandbox(expire=30)
+        self.assertEqual("uuid-1", await self.cache.resolve(1, asandbox, b"env"))
+        self.assertEqual("uuid-2", await self.cache.resolve(1, asandbox, b"env"))
+    
+    
+    async def test_resolve_failure(self):
+        asandbox = FakeASandbox(status=-1)
+        self.assertIsNone(await self.cache.resolve(1, asandbox, b"env"))
+    
+    
+    async def test_invalidate(self):
+        asandbox = FakeASandbox()
+        await self.cache.resolve(1, asandbox, b"env")
+        await self.cache.invalidate(1, b"env")
+        self.assertEqual("uuid-2", await self.cache.resolve(1, asandbox, b"env"))
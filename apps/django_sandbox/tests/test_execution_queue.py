@@ -0,0 +1,144 @@
+import asyncio
+import gc
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.test import SimpleTestCase
+
+from django_sandbox.exceptions import QueueFullError
+from django_sandbox.execution_queue import ExecutionQueue, ExecutionTicket
+from django_sandbox.scheduling import LeastLoadedPolicy, SandboxScheduler
+
+
+
+class FakeScheduler(SandboxScheduler):
+    """Scheduler without any polled sandbox."""
+    
+    async def snapshot(self):
+        return []
+
+
+
+class FakeSandbox:
+    """Sandbox whose executions last until `release` is set."""
+    
+    def __init__(self, pk):
+        self.pk = pk
+        self.release = asyncio.Event()
+        self.running = 0
+        self.max_running = 0
+    
+    
+    async def execute(self, user, config, environment=None):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await self.release.wait()
+        self.running -= 1
+        return config
+
+
+
+class ExecutionQueueTestCase(SimpleTestCase):
+    
+    def make_queue(self, **kwargs):
+        options = {
+            "max_depth": 100, "max_per_user": 100, "max_per_course": 100,
+            "default_capacity": 2, "ticket_ttl": 60,
+            "scheduler": FakeScheduler(LeastLoadedPolicy(), 60)
+        }
+        options.update(kwargs)
+        return ExecutionQueue(**options)
+    
+    
+    async def test_capacity(self):
+        queue = self.make_queue()
+        sandbox = FakeSandbox(1)
+        tickets = [
+            await queue.submit(AnonymousUser(), {"i": i}, sandbox=sandbox) for i in range(5)
+        ]
+        await asyncio.sleep(0)
+        self.assertEqual(3, queue.stats()["depth"])
+        self.assertEqual(2, queue.stats()["running"])
+        self.assertEqual(ExecutionTicket.RUNNING, tickets[0].state)
+        self.assertEqual(ExecutionTicket.QUEUED, tickets[4].state)
+        self.assertTrue(tickets[0].started.is_set())
+        self.assertFalse(tickets[4].started.is_set())
+        
+        sandbox.release.set()
+        results = [await ticket for ticket in tickets]
+        self.assertEqual([{"i": i} for i in range(5)], results)
+        self.assertEqual(2, sandbox.max_running)
+        self.assertEqual(5, queue.stats()["completed"])
+        self.assertEqual(0, queue.stats()["depth"])
+        self.assertIs(tickets[0], queue.get(tickets[0].id))
+    
+    
+    async def test_max_depth(self):
+        queue = self.make_queue(max_depth=1, default_capacity=1)
+        sandbox = FakeSandbox(1)
+        await queue.submit(AnonymousUser(), {}, sandbox=sandbox)
+        await queue.submit(AnonymousUser(), {}, sandbox=sandbox)
+        with self.assertRaises(QueueFullError):
+            await queue.submit(AnonymousUser(), {}, sandbox=sandbox)
+        self.assertEqual(1, queue.stats()["rejected"])
+        sandbox.release.set()
+    
+    
+    async def test_max_per_user(self):
+        queue = self.make_queue(max_per_user=1, default_capacity=10)
+        sandbox = FakeSandbox(1)
+        user1, user2 = User(pk=1, username="user1"), User(pk=2, username="user2")
+        first = await queue.submit(user1, {}, sandbox=sandbox)
+        second = await queue.submit(user1, {}, sandbox=sandbox)
+        other = await queue.submit(user2, {}, sandbox=sandbox)
+        self.assertEqual(ExecutionTicket.RUNNING, first.state)
+        self.assertEqual(ExecutionTicket.QUEUED, second.state)
+        self.assertEqual(ExecutionTicket.RUNNING, other.state)
+        
+        sandbox.release.set()
+        await first
+        await asyncio.sleep(0)
+        self.assertNotEqual(ExecutionTicket.QUEUED, second.state)
+        await second
+        await other
+    
+    
+    async def test_max_per_course(self):
+        queue = self.make_queue(max_per_course=1, default_capacity=10)
+        sandbox = FakeSandbox(1)
+        first = await queue.submit(AnonymousUser(), {}, sandbox=sandbox, course="course1")
+        second = await queue.submit(AnonymousUser(), {}, sandbox=sandbox, course="course1")
+        other = await queue.submit(AnonymousUser(), {}, sandbox=sandbox, course="course2")
+        self.assertEqual(ExecutionTicket.RUNNING, first.state)
+        self.assertEqual(ExecutionTicket.QUEUED, second.state)
+        self.assertEqual(ExecutionTicket.RUNNING, other.state)
+        
+        sandbox.release.set()
+        for ticket in (first, second, other):
+            await ticket
+        self.assertTrue(second.done())
+        self.assertEqual(ExecutionTicket.DONE, second.state)
+    
+    
+    async def test_get_unreferenced(self):
+        queue = self.make_queue(ticket_ttl=0)
+        sandbox = FakeSandbox(1)
+        ticket_id = (await queue.submit(AnonymousUser(), {}, sandbox=sandbox)).id
+        gc.collect()
+        self.assertEqual(ExecutionTicket.RUNNING, queue.get(ticket_id).state)
+        
+        sandbox.release.set()
+        await queue.get(ticket_id)
+        await asyncio.sleep(0.01)
+        self.assertIsNone(queue.get(ticket_id))
+    
+    
+    async def test_cancelled(self):
+        queue = self.make_queue()
+        ticket = await queue.submit(AnonymousUser(), {}, sandbox=FakeSandbox(1))
+        await asyncio.sleep(0)
+        for task in queue._tasks:
+            task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await ticket
+        self.assertEqual(ExecutionTicket.FAILED, ticket.state)
+        self.assertEqual(0, queue.stats()["running"])
@@ -0,0 +1,70 @@
+import zlib
+
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from django_sandbox.fields import RAW, ZLIB, compress, decompress, truncate
+from django_sandbox.models import CommandResult, Response
+from django_sandbox.outputs import compress_outputs
+
+
+
+class OutputEncodingTestCase(SimpleTestCase):
+    
+    def test_truncate(self):
+        self.assertEqual("short", truncate("short", 10))
+        self.assertEqual("a" * 100, truncate("a" * 100, None))
+        text = truncate("a" * 50 + "b" * 50, 10)
+        self.assertTrue(text.startswith("aaaaa\n"))
+        self.assertTrue(text.endswith("\nbbbbb"))
+        self.assertIn("90 characters truncated", text)
+    
+    
+    def test_compress(self):
+        self.assertEqual(RAW + "small é".encode(), compress("small é", "zlib", 1024))
+        self.assertEqual(RAW + b"a" * 2048, compress("a" * 2048, None, 1024))
+        data = compress("a" * 2048, "zlib", 1024)
+        self.assertEqual(ZLIB, data[:1])
+        self.assertEqual(b"a" * 2048, zlib.decompress(data[1:]))
+    
+    
+    def test_decompress(self):
+        for text in ("", "small é", "a" * 2048):
+            self.assertEqual(text, decompress(compress(text, "zlib", 1024)))
+            self.assertEqual(text, decompress(memoryview(compress(text, "zlib", 1024))))
+
+
+
+class CompressedTextFieldTestCase(TransactionTestCase):
+    
+    def setUp(self):
+        self.response = Response.objects.create(status=0, total_time=1.0)
+    
+    
+    @override_settings(SANDBOX_OUTPUT_MAX_SIZE=1000)
+    def test_save_truncated_compressed(self):
+        CommandResult.objects.create(
+            response=self.response, command="yes", exit_code=0, stdout="y\n" * 10000, time=1.0
+        )
+        stored, = CommandResult.objects.values_list("stdout", flat=True)
+        self.assertEqual(ZLIB, bytes(stored[:1]))
+        
+        result = CommandResult.objects.get()
+        self.assertEqual(bytes(stored), bytes(result.__dict__["stdout"]))
+        self.assertTrue(result.stdout.startswith("y\n" * 250))
+        self.assertIn("19000 characters truncated", result.stdout)
+        self.assertIsInstance(result.__dict__["stdout"], str)
+        self.assertEqual("", result.stderr)
+    
+    
+    def test_compress_outputs(self):
+        result = CommandResult.objects.create(
+            response=self.response, command="yes", exit_code=0, stdout="small", time=1.0
+        )
+        with override_settings(SANDBOX_OUTPUT_COMPRESSION=None):
+            CommandResult.objects.filter(pk=result.pk).update(stdout="y" * 4096)
+        
+        self.assertEqual(1, compress_outputs())
+        stored, = CommandResult.objects.values_list("stdout", flat=True)
+        self.assertEqual(ZLIB, bytes(stored[:1]))
+        self.assertEqual("y" * 4096, CommandResult.objects.get().stdout)
+        self.assertEqual(0, compress_outputs())
@@ -0,0 +1,97 @@
+import json
+
+import msgpack
+from django.test import SimpleTestCase
+
+from django_sandbox.frames import UsageFrames, flatten
+
+
+USAGE = {
+    "id":             1,
+    "sandbox":        1,
+    "date":           "2020-01-01T00:00:00Z",
+    "enabled":        True,
+    "reached":        True,
+    "cpu_usage":      [0.5, 0.25, 0.25, 0.1],
+    "memory_storage": {"/": 1000, "/boot": 10},
+    "writing_io":     {},
+    "container":      2,
+}
+
+
+
+class FlattenTestCase(SimpleTestCase):
+    
+    def test_flatten(self):
+        columns, values = flatten(USAGE)
+        self.assertEqual(
+            [
+                ["id"], ["sandbox"], ["date"], ["enabled"], ["reached"], ["cpu_usage", 0],
+                ["cpu_usage", 1], ["cpu_usage", 2], ["cpu_usage", 3], ["memory_storage", "/"],
+                ["memory_storage", "/boot"], ["writing_io"], ["container"],
+            ],
+            columns
+        )
+        self.assertEqual(
+            [1, 1, "2020-01-01T00:00:00Z", True, True, 0.5, 0.25, 0.25, 0.1, 1000, 10, {}, 2],
+            values
+        )
+    
+    
+    def test_flatten_none(self):
+        self.assertEqual(([["cpu_usage"]], [None]), flatten({"cpu_usage": None}))
+
+
+
+class UsageFramesTestCase(SimpleTestCase):
+    
+    def test_json(self):
+        usage = json.dumps(USAGE)
+        self.assertEqual(usage, UsageFrames("json").encode(usage))
+    
+    
+    def test_delta(self):
+        frames = UsageFrames("delta")
+        
+        frame = json.loads(frames.encode(json.dumps(USAGE)))
+        self.assertEqual("key", frame["type"])
+        self.assertEqual(flatten(USAGE), (frame["columns"], frame["values"]))
+        
+        usage = dict(USAGE, id=2, cpu_usage=[0.5, 0.3, 0.25, 0.1])
+        frame = json.loads(frames.encode(json.dumps(usage)))
+        self.assertEqual({"type": "delta", "changed": [0, 6], "values": [2, 0.3]}, frame)
+        
+        frame = json.loads(frames.encode(json.dumps(usage)))
+        self.assertEqual({"type": "delta", "changed": [], "values": []}, frame)
+    
+    
+    def test_delta_columns_changed(self):
+        frames = UsageFrames("delta")
+        frames.encode(json.dumps(USAGE))
+        
+        usage = dict(USAGE, reached=False, cpu_usage=None, memory_storage=None)
+        frame = json.loads(frames.encode(json.dumps(usage)))
+        self.assertEqual("key", frame["type"])
+        self.assertEqual(flatten(usage), (frame["columns"], frame["values"]))
+    
+    
+    def test_delta_type_changed(self):
+        frames = UsageFrames("delta")
+        frames.encode(json.dumps({"container": 1}))
+        frame = json.loads(frames.encode(json.dumps({"container": True})))
+        self.assertEqual({"type": "delta", "changed": [0], "values": [True]}, frame)
+    
+    
+    def test_msgpack(self):
+        frames = UsageFrames("msgpack")
+        frame = frames.encode(json.dumps(USAGE))
+        self.assertIsInstance(frame, bytes)
+        self.assertEqual("key", msgpack.unpackb(frame, raw=False)["type"])
+        
+        frame = msgpack.unpackb(frames.encode(json.dumps(dict(USAGE, container=3))), raw=False)
+        self.assertEqual({"type": "delta", "changed": [12], "values": [3]}, frame)
+    
+    
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            UsageFrames("xml")
@@ -1,13 +1,23 @@
+import asyncio
+import io
 import os
+import tarfile
 
+from aiohttp import ClientResponseError
 from channels.db import database_sync_to_async
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import caches
 from django.test import TransactionTestCase
 from django_celery_beat.models import PeriodicTask
+from mock import patch
 
-from django_sandbox.exceptions import SandboxDisabledError
-from django_sandbox.models import ContainerSpecs, Sandbox, SandboxSpecs, Usage
+from django_sandbox.breaker import CircuitBreaker, breakers
+from django_sandbox.environments import environment_cache
+from django_sandbox.exceptions import SandboxDisabledError, SandboxUnavailableError
+from django_sandbox.models import (CommandResult, ContainerSpecs, Request, Sandbox, SandboxSpecs,
+                                   Usage)
+from django_sandbox.retry import retry_policy
 
 
 SANDBOX_URL = settings.SANDBOX_URL
@@ -23,16 +33,13 @@ class SandboxModelTests(TransactionTestCase):
         self.user = User.objects.create(username="user", password="password")
     
     
-    async def test_create_periodic_tasks(self):
-        self.assertEquals(
-            2,
-            await database_sync_to_async(PeriodicTask.objects.count)(),
-        )
+    async def test_no_periodic_tasks_per_sandbox(self):
+        count = await database_sync_to_async(PeriodicTask.objects.count)()
         await database_sync_to_async(Sandbox.objects.create)(
             name="Test2", url="http://localhost:7001/", enabled=True
         )
         self.assertEquals(
-            4,
+            count,
             await database_sync_to_async(PeriodicTask.objects.count)()
         )
     
@@ -51,6 +58,13 @@ class SandboxModelTests(TransactionTestCase):
             await self.sandbox.poll_specifications()
     
     
+    async def test_fetch_usage(self):
+        usage = await self.sandbox.fetch_usage()
+        self.assertIsNone(usage.pk)
+        self.assertEquals(usage.enabled, True)
+        self.assertEquals(0, await database_sync_to_async(Usage.objects.count)())
+    
+    
     async def test_poll_usage(self):
         usage = await self.sandbox.poll_usage()
         self.assertEquals(type(usage), Usage)
@@ -75,6 +89,95 @@ class SandboxModelTests(TransactionTestCase):
         self.assertDictEqual(config, request.config)
     
     
+    async def test_execute_command_results(self):
+        config = {
+            'commands': ['echo "test"', 'echo "test2"'],
+        }
+        
+        request = await self.sandbox.execute(user=self.user, config=config)
+        self.assertTrue(request.success)
+        results = await database_sync_to_async(list)(
+            CommandResult.objects.filter(response=request.response).order_by("pk")
+        )
+        self.assertEqual(['echo "test"', 'echo "test2"'], [r.command for r in results])
+        self.assertEqual(["test\n", "test2\n"], [r.stdout for r in results])
+        self.assertEqual(1, await database_sync_to_async(Request.objects.count)())
+    
+    
+    async def test_execute_cache(self):
+        caches["sandbox_executions"].clear()
+        config = {
+            'commands':    ['echo "test" > result.txt'],
+            'result_path': 'result.txt'
+        }
+        
+        request1 = await self.sandbox.execute(user=self.user, config=config, cache=True)
+        request2 = await self.sandbox.execute(user=self.user, config=config, cache=True)
+        self.assertTrue(request1.success)
+        self.assertTrue(request2.success)
+        self.assertFalse(request1.cached)
+        self.assertTrue(request2.cached)
+        self.assertNotEqual(request1.response.pk, request2.response.pk)
+        self.assertEqual(request1.response.result, request2.response.result)
+    
+    
+    async def test_execute_cache_save(self):
+        config = {
+            'commands': ['echo "test" > result.txt'],
+            'save':     True
+        }
+        
+        await self.sandbox.execute(user=self.user, config=config, cache=True)
+        request = await self.sandbox.execute(user=self.user, config=config, cache=True)
+        self.assertTrue(request.success)
+        self.assertFalse(request.cached)
+    
+    
+    async def test_execute_environment_cache(self):
+        caches["sandbox_environments"].clear()
+        environment = io.BytesIO()
+        with tarfile.open(fileobj=environment, mode="w:gz") as tar:
+            info = tarfile.TarInfo("input.txt")
+            info.size = 5
+            tar.addfile(info, io.BytesIO(b"test\n"))
+        config = {'commands': ['cat input.txt']}
+        
+        for _ in range(2):
+            environment.seek(0)
+            request = await self.sandbox.execute(user=self.user, config=config,
+                                                 environment=environment)
+            self.assertTrue(request.success)
+            self.assertDictEqual(config, request.config)
+            results = await database_sync_to_async(list)(request.response.execution.all())
+            self.assertEqual("test\n", results[0].stdout)
+    
+    
+    async def test_execute_environment_cache_rejected(self):
+        caches["sandbox_environments"].clear()
+        key = environment_cache.key(self.sandbox.pk, b"environment")
+        
+        # Rejects every stored environment, with a negative status or an HTTP error
+        class FakeSandbox:
+            
+            def __init__(self, raises):
+                self.raises = raises
+            
+            async def execute(self, config, environment):
+                if "environment" not in config:
+                    return {"status": 0, "stdout": environment.read().decode()}
+                if self.raises:
+                    raise ClientResponseError(None, (), status=404, message="Unknown environment")
+                return {"status": -1}
+        
+        for raises in (False, True):
+            await database_sync_to_async(caches["sandbox_environments"].set)(key, "stale-uuid")
+            r = await self.sandbox._send(
+                FakeSandbox(raises), {'commands': ['true']}, io.BytesIO(b"environment")
+            )
+            self.assertEqual({"status": 0, "stdout": "environment"}, r)
+            self.assertIsNone(await database_sync_to_async(caches["sandbox_environments"].get)(key))
+    
+    
     async def test_execute_disable(self):
         config = {
             'commands':    ['echo "test" > result.txt', 'echo "test2"'],
@@ -90,6 +193,90 @@ class SandboxModelTests(TransactionTestCase):
         self.assertIn(SandboxDisabledError.__name__, request.traceback)
     
     
+    async def test_execute_breaker_open(self):
+        config = {'commands': ['echo "test"']}
+        for _ in range(settings.SANDBOX_BREAKER_THRESHOLD):
+            breakers.record(self.sandbox.pk, False)
+        try:
+            request = await self.sandbox.execute(user=self.user, config=config)
+        finally:
+            breakers.record(self.sandbox.pk, True)
+        self.assertFalse(request.success)
+        self.assertIn(SandboxUnavailableError.__name__, request.traceback)
+    
+    
+    async def test_execute_breaker_half_open_race(self):
+        config = {'commands': ['true']}
+        breaker = breakers.get(self.sandbox.pk)
+        sent = asyncio.Queue()
+        
+        async def send(*_):
+            answer = asyncio.get_running_loop().create_future()
+            await sent.put(answer)
+            return await answer
+        
+        try:
+            with patch.object(Sandbox, "_send", side_effect=send):
+                # Allowed while the breaker is still closed
+                closed = asyncio.ensure_future(self.sandbox._send_with_retry(config, None))
+                await sent.get()
+                for _ in range(settings.SANDBOX_BREAKER_THRESHOLD):
+                    breakers.record(self.sandbox.pk, False)
+                breaker.opened_at -= breaker.delay
+                
+                probe = asyncio.ensure_future(self.sandbox._send_with_retry(config, None))
+                answer = await sent.get()
+                with self.assertRaises(SandboxUnavailableError):
+                    await self.sandbox._send_with_retry(config, None)
+                closed.cancel()
+                await asyncio.gather(closed, return_exceptions=True)
+                # The probe is still reserved by the second request
+                self.assertTrue(breaker.probing)
+                self.assertIsNone(breaker.allow())
+                
+                answer.set_result({"status": 0})
+                self.assertEqual({"status": 0}, await probe)
+                self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+        finally:
+            breakers.record(self.sandbox.pk, True)
+    
+    
+    async def test_execute_retry(self):
+        sandbox = await database_sync_to_async(Sandbox.objects.create)(
+            name="Unreachable", url="http://localhost:1/", enabled=True
+        )
+        try:
+            request = await sandbox.execute(user=self.user, config={'commands': ['true']})
+            self.assertFalse(request.success)
+            self.assertEqual(retry_policy.attempts, breakers.get(sandbox.pk).failures)
+        finally:
+            breakers.record(sandbox.pk, True)
+    
+    
+    async def test_execute_timeout(self):
+        with patch.object(Sandbox, "_send", side_effect=asyncio.TimeoutError):
+            try:
+                request = await self.sandbox.execute(user=self.user, config={'commands': ['true']})
+            finally:
+                breakers.record(self.sandbox.pk, True)
+        self.assertFalse(request.success)
+        self.assertIn("ServerTimeoutError", request.traceback)
+    
+    
+    async def test_execute_no_retry_save(self):
+        sandbox = await database_sync_to_async(Sandbox.objects.create)(
+            name="Unreachable", url="http://localhost:1/", enabled=True
+        )
+        try:
+            request = await sandbox.execute(
+                user=self.user, config={'commands': ['true'], 'save': True}
+            )
+            self.assertFalse(request.success)
+            self.assertEqual(1, breakers.get(sandbox.pk).failures)
+        finally:
+            breakers.record(sandbox.pk, True)
+    
+    
     async def test_retrieve_file(self):
         config = {
             'commands': ['echo "test" > result.txt', 'echo "test2"'],
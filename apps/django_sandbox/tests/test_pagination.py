@@ -0,0 +1,35 @@
+from datetime import datetime, timezone
+
+from django.core.exceptions import ValidationError
+from django.http import QueryDict
+from django.test import SimpleTestCase
+
+from django_sandbox.models import Request
+from django_sandbox.pagination import KeysetQuery, decode_cursor, encode_cursor
+
+
+
+class CursorTestCase(SimpleTestCase):
+    
+    def test_encode_decode(self):
+        date = datetime(2020, 1, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+        token = encode_cursor(date, 42)
+        self.assertNotIn("=", token)
+        self.assertEqual((date, 42), decode_cursor(token))
+    
+    
+    def test_decode_invalid(self):
+        for token in ("invalid", encode_cursor(datetime.now(), 1)[:-3], "WyJhIiwxXQ"):
+            with self.assertRaises(ValidationError):
+                decode_cursor(token)
+    
+    
+    def test_query_unsupported_commands(self):
+        with self.assertRaises(ValidationError):
+            KeysetQuery(Request, QueryDict("c:cursor=&c:sort=date"))
+        with self.assertRaises(ValidationError):
+            KeysetQuery(Request, QueryDict("c:cursor=&c:limit=0"))
+    
+    
+    def test_query_page_size(self):
+        self.assertEqual(5, KeysetQuery(Request, QueryDict("c:cursor=&c:limit=5")).page_size)
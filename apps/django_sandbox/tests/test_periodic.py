@@ -0,0 +1,71 @@
+import io
+
+from django.apps import apps
+from django.core.management import call_command
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django_celery_beat.models import IntervalSchedule, PeriodicTask
+
+from django_sandbox.periodic import PERIODIC_TASKS, sync_periodic_tasks
+
+
+
+class SyncPeriodicTasksTestCase(TransactionTestCase):
+    
+    def setUp(self):
+        # Tasks are already synchronized by the post_migrate signal
+        PeriodicTask.objects.all().delete()
+    
+    
+    def test_sync(self):
+        self.assertEqual((3, 0, 0), sync_periodic_tasks())
+        self.assertEqual(
+            {name for name, _, _ in PERIODIC_TASKS},
+            set(PeriodicTask.objects.values_list("name", flat=True))
+        )
+        self.assertEqual(
+            60 * 10, PeriodicTask.objects.get(name="sandbox_poll_specifications").interval.every
+        )
+    
+    
+    def test_sync_idempotent(self):
+        sync_periodic_tasks()
+        with self.assertNumQueries(3):
+            self.assertEqual((0, 0, 0), sync_periodic_tasks())
+    
+    
+    def test_sync_update(self):
+        sync_periodic_tasks()
+        with override_settings(SANDBOX_POLL_USAGE_EVERY=30):
+            self.assertEqual((0, 1, 0), sync_periodic_tasks())
+        self.assertEqual(30, PeriodicTask.objects.get(name="sandbox_poll_usage").interval.every)
+    
+    
+    def test_sync_legacy(self):
+        schedule = IntervalSchedule.objects.create(every=15, period=IntervalSchedule.SECONDS)
+        PeriodicTask.objects.create(
+            name="sandbox_poll_usage_1", interval=schedule, task='django_sandbox.tasks.poll_usage',
+            args="[1]"
+        )
+        self.assertEqual((3, 0, 1), sync_periodic_tasks())
+        self.assertFalse(PeriodicTask.objects.filter(name="sandbox_poll_usage_1").exists())
+    
+    
+    def test_command(self):
+        out = io.StringIO()
+        call_command("sync_periodic_tasks", stdout=out)
+        self.assertIn("3 created", out.getvalue())
+        self.assertEqual(3, PeriodicTask.objects.count())
+
+
+
+class ReadyTestCase(SimpleTestCase):
+    
+    def test_ready_no_query(self):
+        # SimpleTestCase fails on any query
+        apps.get_app_config("django_sandbox").ready()
+    
+    
+    @override_settings(SANDBOX_POLL_USAGE_EVERY=5)
+    def test_ready_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            apps.get_app_config("django_sandbox").ready()
@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from django_sandbox.pool import SandboxPool
+
+
+SANDBOX_URL = settings.SANDBOX_URL
+
+
+
+class SandboxPoolTestCase(SimpleTestCase):
+    
+    async def test_acquire_reuse(self):
+        pool = SandboxPool(max_connections=10, idle_timeout=60)
+        async with pool.acquire(SANDBOX_URL) as asandbox1:
+            pass
+        async with pool.acquire(SANDBOX_URL) as asandbox2:
+            self.assertEqual(1, pool.stats()["connections"])
+        
+        self.assertIs(asandbox1, asandbox2)
+        self.assertEqual(1, pool.stats()["hits"])
+        self.assertEqual(1, pool.stats()["misses"])
+        self.assertEqual(1, pool.stats()["clients"])
+        self.assertEqual(0, pool.stats()["connections"])
+        await pool.close()
+    
+    
+    async def test_acquire_session(self):
+        pool = SandboxPool(max_connections=10, idle_timeout=60)
+        async with pool.acquire_session(SANDBOX_URL) as session1:
+            self.assertEqual(1, pool.stats()["connections"])
+        async with pool.acquire_session(SANDBOX_URL) as session2:
+            pass
+        
+        self.assertIs(session1, session2)
+        self.assertEqual(1, pool.stats()["misses"])
+        await pool.close()
+        self.assertTrue(session1.closed)
+    
+    
+    async def test_acquire_different_url(self):
+        pool = SandboxPool(max_connections=10, idle_timeout=60)
+        async with pool.acquire(SANDBOX_URL) as asandbox1:
+            pass
+        async with pool.acquire("http://localhost:7001/") as asandbox2:
+            pass
+        
+        self.assertIsNot(asandbox1, asandbox2)
+        self.assertEqual(0, pool.stats()["hits"])
+        self.assertEqual(2, pool.stats()["misses"])
+        self.assertEqual(2, pool.stats()["clients"])
+        await pool.close()
+    
+    
+    async def test_evict_idle(self):
+        pool = SandboxPool(max_connections=10, idle_timeout=0)
+        async with pool.acquire(SANDBOX_URL) as asandbox1:
+            pass
+        async with pool.acquire(SANDBOX_URL) as asandbox2:
+            pass
+        
+        self.assertIsNot(asandbox1, asandbox2)
+        self.assertEqual(1, pool.stats()["evictions"])
+        self.assertEqual(2, pool.stats()["misses"])
+        await pool.close()
+    
+    
+    async def test_close(self):
+        pool = SandboxPool(max_connections=10, idle_timeout=60)
+        async with pool.acquire(SANDBOX_URL):
+            pass
+        await pool.close()
+        self.assertEqual(0, pool.stats()["clients"])
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.db import connection
+from django.http import QueryDict
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from django_sandbox.models import CommandResult, Request, Sandbox
+from django_sandbox.queries import CompressedFieldError, DeferredQuery
+
+
+SANDBOX_URL = settings.SANDBOX_URL
+
+
+
+class DeferredQueryTestCase(TransactionTestCase):
+    
+    def setUp(self):
+        sandbox = Sandbox.objects.create(name="Test", url=SANDBOX_URL, enabled=True)
+        Request.objects.create(sandbox=sandbox, success=True, config={"commands": ["true"]})
+    
+    
+    def evaluate(self, query: str):
+        with CaptureQueriesContext(connection) as context:
+            result = DeferredQuery(Request, QueryDict(query)).evaluate()
+        return result["rows"][0], context.captured_queries[-1]["sql"]
+    
+    
+    def test_deferred(self):
+        row, sql = self.evaluate("")
+        self.assertNotIn("config", row)
+        self.assertNotIn("traceback", row)
+        self.assertNotIn('"config"', sql)
+        self.assertIn("success", row)
+    
+    
+    def test_include(self):
+        row, sql = self.evaluate("c:include=config")
+        self.assertEqual({"commands": ["true"]}, row["config"])
+        self.assertNotIn("traceback", row)
+        self.assertIn('"config"', sql)
+        
+        row, _ = self.evaluate("c:include=*")
+        self.assertIn("config", row)
+        self.assertIn("traceback", row)
+    
+    
+    def test_show(self):
+        row, _ = self.evaluate("c:show=id,config")
+        self.assertEqual({"id", "config"}, set(row))
+    
+    
+    def test_compressed_filter(self):
+        queries = [
+            (CommandResult, "stdout=*test"),
+            (Request, "response.result=test"),
+            (Request, "c:join=field=response|filters=result=test"),
+        ]
+        for model, query in queries:
+            result = DeferredQuery(model, QueryDict(query)).evaluate()
+            self.assertFalse(result["status"])
+            self.assertEqual(CompressedFieldError.code, result["code"])
+        
+        self.assertTrue(DeferredQuery(Request, QueryDict("success=1")).evaluate()["status"])
@@ -0,0 +1,45 @@
+from django.test import SimpleTestCase
+
+from django_sandbox.retry import LatencyTracker, RetryPolicy
+
+
+
+class RetryPolicyTestCase(SimpleTestCase):
+    
+    def setUp(self):
+        self.policy = RetryPolicy(attempts=3, backoff=0.5, max_backoff=1)
+    
+    
+    def test_attempts_for(self):
+        self.assertEqual(3, self.policy.attempts_for({"commands": ["true"]}))
+        self.assertEqual(3, self.policy.attempts_for({"commands": ["true"], "save": False}))
+        self.assertEqual(1, self.policy.attempts_for({"commands": ["true"], "save": True}))
+        self.assertEqual(1, RetryPolicy(0, 0.5, 1).attempts_for({"commands": ["true"]}))
+    
+    
+    def test_delay(self):
+        for retry, bound in ((0, 0.5), (1, 1), (5, 1)):
+            for _ in range(100):
+                self.assertTrue(0 <= self.policy.delay(retry) <= bound)
+
+
+
+class LatencyTrackerTestCase(SimpleTestCase):
+    
+    def test_percentile(self):
+        tracker = LatencyTracker(window=100, min_samples=10)
+        for latency in range(1, 10):
+            tracker.record(latency)
+        self.assertIsNone(tracker.percentile(0.95))
+        
+        tracker.record(10)
+        self.assertEqual(10, tracker.percentile(0.95))
+        self.assertEqual(5, tracker.percentile(0.5))
+        self.assertEqual(1, tracker.percentile(0))
+    
+    
+    def test_window(self):
+        tracker = LatencyTracker(window=10, min_samples=1)
+        for latency in range(100):
+            tracker.record(latency)
+        self.assertEqual(90, tracker.percentile(0))
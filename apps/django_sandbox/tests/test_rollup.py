@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from django_sandbox import rollup
+from django_sandbox.models import Sandbox, Usage, UsageAggregate
+
+
+SANDBOX_URL = settings.SANDBOX_URL
+
+NOW = datetime(2020, 10, 1, 12, 30, 15, tzinfo=timezone.utc)
+
+
+
+@override_settings(
+    SANDBOX_USAGE_RAW_RETENTION=60 * 60 * 24, SANDBOX_USAGE_MINUTE_RETENTION=60 * 60 * 24 * 7,
+    SANDBOX_USAGE_HOUR_RETENTION=60 * 60 * 24 * 30
+)
+class CompactUsageTestCase(TransactionTestCase):
+    
+    def setUp(self):
+        self.sandbox = Sandbox.objects.create(name="Test", url=SANDBOX_URL, enabled=True)
+    
+    
+    def create_usage(self, date, **kwargs):
+        usage = Usage.objects.create(sandbox=self.sandbox, **kwargs)
+        Usage.objects.filter(pk=usage.pk).update(date=date)
+    
+    
+    def test_raw_to_minute(self):
+        old = datetime(2020, 9, 29, 10, 0, tzinfo=timezone.utc)
+        self.create_usage(old, cpu_usage=[0.2, 0, 0, 0], container=2)
+        self.create_usage(old + timedelta(seconds=15), cpu_usage=[0.4, 0, 0, 0], container=4)
+        self.create_usage(old + timedelta(seconds=30), reached=False)
+        self.create_usage(old + timedelta(minutes=1), cpu_usage=[0.5, 0, 0, 0], container=1)
+        self.create_usage(NOW - timedelta(hours=1), cpu_usage=[0.5, 0, 0, 0], container=1)
+        
+        minutes, hours, deleted = rollup.compact_usage(NOW)
+        self.assertEqual((2, 0, 0), (minutes, hours, deleted))
+        self.assertEqual(1, Usage.objects.count())
+        
+        aggregate = UsageAggregate.objects.get(resolution=UsageAggregate.MINUTE, date=old)
+        self.assertEqual(3, aggregate.samples)
+        self.assertEqual(2, aggregate.reached)
+        self.assertEqual(2, aggregate.container_min)
+        self.assertEqual(4, aggregate.container_max)
+        self.assertAlmostEqual(3, aggregate.container_avg)
+        self.assertAlmostEqual(0.3, aggregate.cpu_usage_avg)
+    
+    
+    def test_minute_to_hour(self):
+        old = datetime(2020, 9, 20, 10, 0, tzinfo=timezone.utc)
+        UsageAggregate.objects.create(
+            sandbox=self.sandbox, resolution=UsageAggregate.MINUTE, date=old, samples=4,
+            reached=4, container_min=1, container_max=3, container_avg=2
+        )
+        UsageAggregate.objects.create(
+            sandbox=self.sandbox, resolution=UsageAggregate.MINUTE,
+            date=old + timedelta(minutes=1), samples=4, reached=2, container_min=4,
+            container_max=6, container_avg=5
+        )
+        
+        minutes, hours, deleted = rollup.compact_usage(NOW)
+        self.assertEqual((0, 1, 0), (minutes, hours, deleted))
+        self.assertFalse(UsageAggregate.objects.filter(resolution=UsageAggregate.MINUTE).exists())
+        
+        aggregate = UsageAggregate.objects.get(resolution=UsageAggregate.HOUR)
+        self.assertEqual(old, aggregate.date)
+        self.assertEqual(8, aggregate.samples)
+        self.assertEqual(6, aggregate.reached)
+        self.assertEqual(1, aggregate.container_min)
+        self.assertEqual(6, aggregate.container_max)
+        self.assertAlmostEqual(3, aggregate.container_avg)
+        self.assertIsNone(aggregate.cpu_usage_avg)
+    
+    
+    def test_hour_retention(self):
+        UsageAggregate.objects.create(
+            sandbox=self.sandbox, resolution=UsageAggregate.HOUR, samples=1, reached=1,
+            date=NOW - timedelta(days=31)
+        )
+        UsageAggregate.objects.create(
+            sandbox=self.sandbox, resolution=UsageAggregate.HOUR, samples=1, reached=1,
+            date=NOW - timedelta(days=29)
+        )
+        
+        self.assertEqual((0, 0, 1), rollup.compact_usage(NOW))
+        self.assertEqual(1, UsageAggregate.objects.count())
+
+
+
+class SinceTestCase(SimpleTestCase):
+    
+    def test_since(self):
+        self.assertIsNone(rollup.since([]))
+        self.assertIsNone(rollup.since(["<2020-10-01T00:00:00+00:00"]))
+        self.assertEqual(
+            datetime(2020, 9, 1, tzinfo=timezone.utc),
+            rollup.since(["[2020-09-01T00:00:00+00:00,<2020-10-01T00:00:00+00:00"])
+        )
+        self.assertEqual(
+            datetime(2020, 9, 2, tzinfo=timezone.utc),
+            rollup.since([">2020-09-01T00:00:00+00:00", ">2020-09-02T00:00:00+00:00"])
+        )
+
+
+
+class SourcesTestCase(TransactionTestCase):
+    
+    def setUp(self):
+        self.sandbox = Sandbox.objects.create(name="Test", url=SANDBOX_URL, enabled=True)
+        self.raw = datetime.now(timezone.utc) - timedelta(hours=1)
+        usage = Usage.objects.create(sandbox=self.sandbox)
+        Usage.objects.filter(pk=usage.pk).update(date=self.raw)
+        self.minute = self.raw - timedelta(days=2)
+        UsageAggregate.objects.create(
+            sandbox=self.sandbox, resolution=UsageAggregate.MINUTE, date=self.minute, samples=4,
+            reached=4
+        )
+    
+    
+    def test_sources_raw(self):
+        self.assertEqual([(None, None)], rollup.sources(None))
+        self.assertEqual([(None, None)], rollup.sources(self.raw))
+    
+    
+    def test_sources_merged(self):
+        self.assertEqual(
+            [(None, None), (UsageAggregate.MINUTE, self.raw)],
+            rollup.sources(self.minute)
+        )
+        self.assertEqual(
+            [(None, None), (UsageAggregate.MINUTE, self.raw), (UsageAggregate.HOUR, self.minute)],
+            rollup.sources(self.minute - timedelta(seconds=1))
+        )
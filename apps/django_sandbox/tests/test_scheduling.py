@@ -0,0 +1,269 @@
+import asyncio
+from collections import Counter
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TransactionTestCase
+from mock import patch
+
+from django_sandbox import models
+from django_sandbox.breaker import breakers
+from django_sandbox.exceptions import NoSandboxAvailableError
+from django_sandbox.models import ContainerSpecs, ExecutionOutcome, Request, Sandbox, Usage
+from django_sandbox.retry import latencies
+from django_sandbox.scheduling import (LeastLoadedPolicy, PowerOfTwoChoicesPolicy, SandboxLoad,
+                                       SandboxScheduler, SchedulingPolicy, WeightedRoundRobinPolicy,
+                                       scheduler)
+
+
+SANDBOX_URL = settings.SANDBOX_URL
+
+
+
+def make_load(pk: int, container: int, capacity: int, reached: bool = True) -> SandboxLoad:
+    return SandboxLoad(
+        Sandbox(pk=pk, name=f"Sandbox {pk}", url=f"http://localhost:{7000 + pk}/", enabled=True),
+        Usage(container=container, reached=reached), capacity
+    )
+
+
+
+async def fake_perform(sandbox, user, config, environment=None, cache=False) -> ExecutionOutcome:
+    if config['commands'] == ['false']:
+        raise RuntimeError("Unexpected error")
+    return ExecutionOutcome(
+        sandbox, user, config, {"status": 0, "total_time": 0, "execution": []}
+    )
+
+
+
+class SandboxLoadTestCase(SimpleTestCase):
+    
+    def test_load_capacity(self):
+        load = make_load(1, 2, 8)
+        load.inflight = 2
+        self.assertEqual(4, load.containers)
+        self.assertEqual(4, load.free)
+        self.assertEqual(0.5, load.load)
+    
+    
+    def test_load_unknown_capacity(self):
+        load = SandboxLoad(Sandbox(pk=1), Usage(container=2, cpu_usage=[0.25, 0, 0, 0]), None)
+        self.assertIsNone(load.free)
+        self.assertEqual(0.25, load.load)
+    
+    
+    def test_never_polled(self):
+        load = SandboxLoad(Sandbox(pk=1), None, 4)
+        self.assertTrue(load.reachable)
+        self.assertEqual(0, load.load)
+
+
+
+class PolicyTestCase(SimpleTestCase):
+    
+    def test_least_loaded(self):
+        loads = [make_load(1, 3, 4), make_load(2, 1, 4), make_load(3, 2, 4)]
+        self.assertEqual(2, LeastLoadedPolicy().choose(loads).sandbox.pk)
+    
+    
+    def test_weighted_round_robin(self):
+        policy = WeightedRoundRobinPolicy()
+        loads = [make_load(1, 0, 1), make_load(2, 0, 3)]
+        chosen = [policy.choose(loads).sandbox.pk for _ in range(8)]
+        self.assertEqual({1: 2, 2: 6}, Counter(chosen))
+        self.assertNotEqual([2, 2, 2], chosen[:3])
+    
+    
+    def test_power_of_two_choices(self):
+        policy = PowerOfTwoChoicesPolicy()
+        loads = [make_load(1, 4, 4), make_load(2, 0, 4), make_load(3, 0, 4)]
+        chosen = {policy.choose(loads).sandbox.pk for _ in range(50)}
+        self.assertNotIn(1, chosen)
+        self.assertEqual(1, policy.choose(loads[:1]).sandbox.pk)
+    
+    
+    def test_incomplete_policy(self):
+        class IncompletePolicy(SchedulingPolicy):
+            pass
+        
+        with self.assertRaises(TypeError):
+            IncompletePolicy()
+
+
+
+class SandboxSchedulerTestCase(TransactionTestCase):
+    
+    def setUp(self):
+        self.sandbox1 = Sandbox.objects.create(name="Test1", url=SANDBOX_URL, enabled=True)
+        self.sandbox2 = Sandbox.objects.create(
+            name="Test2", url="http://localhost:7001/", enabled=True
+        )
+        Sandbox.objects.create(name="Test3", url="http://localhost:7002/", enabled=False)
+        ContainerSpecs.objects.filter(sandbox=self.sandbox1).update(count=4)
+        ContainerSpecs.objects.filter(sandbox=self.sandbox2).update(count=4)
+        self.scheduler = SandboxScheduler(LeastLoadedPolicy(), ttl=60)
+    
+    
+    async def test_select_least_loaded(self):
+        await database_sync_to_async(Usage.objects.create)(sandbox=self.sandbox1, container=3)
+        await database_sync_to_async(Usage.objects.create)(sandbox=self.sandbox2, container=1)
+        self.assertEqual(self.sandbox2, await self.scheduler.select())
+    
+    
+    async def test_select_skip_unreachable(self):
+        await database_sync_to_async(Usage.objects.create)(sandbox=self.sandbox1, container=0)
+        await database_sync_to_async(Usage.objects.create)(sandbox=self.sandbox2, reached=False)
+        self.assertEqual(self.sandbox1, await self.scheduler.select())
+    
+    
+    async def test_select_skip_open_breaker(self):
+        await database_sync_to_async(Usage.objects.create)(sandbox=self.sandbox1, container=3)
+        await database_sync_to_async(Usage.objects.create)(sandbox=self.sandbox2, container=1)
+        await self.scheduler.snapshot()
+        for _ in range(settings.SANDBOX_BREAKER_THRESHOLD):
+            breakers.record(self.sandbox2.pk, False)
+        try:
+            self.assertEqual(self.sandbox1, await self.scheduler.select())
+        finally:
+            breakers.record(self.sandbox2.pk, True)
+    
+    
+    async def test_select_inflight(self):
+        await database_sync_to_async(Usage.objects.create)(sandbox=self.sandbox1, container=1)
+        await database_sync_to_async(Usage.objects.create)(sandbox=self.sandbox2, container=2)
+        with self.scheduler.track(self.sandbox1), self.scheduler.track(self.sandbox1):
+            self.assertEqual(self.sandbox2, await self.scheduler.select())
+        self.assertEqual(self.sandbox1, await self.scheduler.select())
+    
+    
+    async def test_select_none_available(self):
+        await database_sync_to_async(Sandbox.objects.update)(enabled=False)
+        with self.assertRaises(NoSandboxAvailableError):
+            await self.scheduler.select()
+    
+    
+    async def test_execute_balanced(self):
+        user = await database_sync_to_async(User.objects.create)(username="user")
+        await database_sync_to_async(Sandbox.objects.filter(pk=self.sandbox2.pk).update)(
+            enabled=False
+        )
+        config = {'commands': ['echo "test"']}
+        
+        request = await Sandbox.objects.execute_balanced(user, config)
+        self.assertTrue(request.success)
+        self.assertEqual(self.sandbox1.pk, request.sandbox_id)
+    
+    
+    async def test_execute_balanced_hedge(self):
+        user = await database_sync_to_async(User.objects.create)(username="user")
+        # Both sandboxes must be able to execute
+        await database_sync_to_async(Sandbox.objects.filter(pk=self.sandbox2.pk).update)(
+            url=SANDBOX_URL.replace("localhost", "127.0.0.1")
+        )
+        config = {'commands': ['sleep 0.5', 'echo "test"']}
+        for _ in range(settings.SANDBOX_HEDGE_MIN_SAMPLES):
+            latencies.record(0)
+        
+        try:
+            request = await Sandbox.objects.execute_balanced(user, config, hedge=True)
+            self.assertTrue(request.success)
+            await asyncio.gather(*models._hedged)
+            self.assertEqual(2, await database_sync_to_async(Request.objects.count)())
+        finally:
+            latencies._samples.clear()
+    
+    
+    async def test_execute_balanced_hedge_cancelled(self):
+        started, cancelled = list(), asyncio.Event()
+        
+        async def execute(sandbox, user, config, environment=None):
+            started.append(sandbox.pk)
+            if len(started) == 1:
+                await asyncio.sleep(0.2)
+                raise RuntimeError("Primary failed")
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        
+        scheduler.invalidate()
+        for _ in range(settings.SANDBOX_HEDGE_MIN_SAMPLES):
+            latencies.record(0)
+        try:
+            with patch.object(Sandbox, "execute", execute):
+                with self.assertRaises(RuntimeError):
+                    await Sandbox.objects.execute_balanced(None, {'commands': ['true']}, hedge=True)
+                await asyncio.wait_for(cancelled.wait(), 1)
+            self.assertEqual(2, len(started))
+            self.assertFalse(models._hedged)
+        finally:
+            latencies._samples.clear()
+    
+    
+    async def test_execute_batch(self):
+        user = await database_sync_to_async(User.objects.create)(username="user")
+        await database_sync_to_async(Sandbox.objects.filter(pk=self.sandbox2.pk).update)(
+            enabled=False
+        )
+        scheduler.invalidate()
+        items = [(user, {'commands': [f'echo "{i}"']}, None) for i in range(5)]
+        
+        requests = await Sandbox.objects.execute_batch(items, concurrency=2)
+        self.assertEqual(5, len(requests))
+        self.assertTrue(all(r.success and r.sandbox_id == self.sandbox1.pk for r in requests))
+        self.assertEqual([i[1] for i in items], [r.config for r in requests])
+        self.assertEqual(5, await database_sync_to_async(Request.objects.count)())
+        stdout = await database_sync_to_async(lambda: [
+            r.response.execution.get().stdout for r in Request.objects.order_by("pk")
+        ])()
+        self.assertEqual([f"{i}\n" for i in range(5)], stdout)
+    
+    
+    async def test_execute_batch_none_available(self):
+        user = await database_sync_to_async(User.objects.create)(username="user")
+        await database_sync_to_async(Sandbox.objects.update)(enabled=False)
+        scheduler.invalidate()
+        with self.assertRaises(NoSandboxAvailableError):
+            await Sandbox.objects.execute_batch([(user, {'commands': ['true']}, None)])
+        self.assertEqual(0, await database_sync_to_async(Request.objects.count)())
+    
+    
+    async def test_execute_batch_error(self):
+        user = await database_sync_to_async(User.objects.create)(username="user")
+        await database_sync_to_async(Sandbox.objects.filter(pk=self.sandbox2.pk).update)(
+            enabled=False
+        )
+        scheduler.invalidate()
+        items = [(user, {'commands': [c]}, None) for c in ('true', 'false', 'true')]
+        
+        with patch.object(Sandbox, "perform", fake_perform):
+            requests = await Sandbox.objects.execute_batch(items)
+        self.assertEqual([True, False, True], [r.success for r in requests])
+        self.assertIn("Unexpected error", requests[1].traceback)
+        self.assertEqual(3, await database_sync_to_async(Request.objects.count)())
+    
+    
+    async def test_execute_batch_cancel(self):
+        user = await database_sync_to_async(User.objects.create)(username="user")
+        selected = list()
+        
+        async def select(policy=None, exclude=()):
+            if selected:
+                raise NoSandboxAvailableError("No sandbox available")
+            selected.append(self.sandbox1)
+            return self.sandbox1
+        
+        items = [(user, {'commands': ['true']}, None) for _ in range(3)]
+        with patch.object(Sandbox, "perform", fake_perform), patch.object(scheduler, "select", select):
+            with self.assertRaises(NoSandboxAvailableError):
+                await Sandbox.objects.execute_batch(items, concurrency=1)
+        self.assertEqual(1, await database_sync_to_async(Request.objects.count)())
+    
+    
+    async def test_select_exclude(self):
+        await database_sync_to_async(Usage.objects.create)(sandbox=self.sandbox1, container=3)
+        await database_sync_to_async(Usage.objects.create)(sandbox=self.sandbox2, container=1)
+        self.assertEqual(self.sandbox1, await self.scheduler.select(exclude={self.sandbox2.pk}))
@@ -0,0 +1,85 @@
+import dgeq
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TransactionTestCase
+
+from django_sandbox.models import Sandbox, Usage
+from django_sandbox.snapshot import check_usage_snapshot, usage_snapshot
+
+
+SANDBOX_URL = settings.SANDBOX_URL
+
+
+
+class UsageSnapshotTestCase(TransactionTestCase):
+    
+    def setUp(self):
+        caches[settings.SANDBOX_USAGE_SNAPSHOT].clear()
+        self.sandbox1 = Sandbox.objects.create(name="Test1", url=SANDBOX_URL, enabled=True)
+        self.sandbox2 = Sandbox.objects.create(
+            name="Test2", url="http://localhost:7001/", enabled=True
+        )
+    
+    
+    def test_rows_loaded_from_database(self):
+        Usage.objects.create(sandbox=self.sandbox1, container=1)
+        latest = Usage.objects.create(sandbox=self.sandbox1, container=2)
+        
+        self.assertEqual({self.sandbox1.pk: dgeq.serialize(latest)}, usage_snapshot.rows())
+        with self.assertNumQueries(0):
+            self.assertEqual({self.sandbox1.pk: dgeq.serialize(latest)}, usage_snapshot.rows())
+    
+    
+    def test_update_on_create(self):
+        usage_snapshot.rows()
+        usage = Usage.objects.create(sandbox=self.sandbox2, container=3)
+        with self.assertNumQueries(0):
+            self.assertEqual({self.sandbox2.pk: dgeq.serialize(usage)}, usage_snapshot.rows())
+    
+    
+    def test_publish(self):
+        usage1 = Usage.objects.create(sandbox=self.sandbox1, container=1)
+        usage2 = Usage.objects.create(sandbox=self.sandbox2, container=2)
+        usage_snapshot.publish([usage1, usage2])
+        
+        usages = usage_snapshot.usages()
+        self.assertEqual({self.sandbox1.pk, self.sandbox2.pk}, set(usages))
+        self.assertEqual(usage2.pk, usages[self.sandbox2.pk].pk)
+        self.assertEqual(2, usages[self.sandbox2.pk].container)
+        self.assertEqual(self.sandbox2.pk, usages[self.sandbox2.pk].sandbox_id)
+    
+    
+    def test_discard_on_delete(self):
+        Usage.objects.create(sandbox=self.sandbox1, container=1)
+        Usage.objects.create(sandbox=self.sandbox2, container=2)
+        usage_snapshot.rows()
+        self.sandbox1.delete()
+        self.assertEqual({self.sandbox2.pk}, set(usage_snapshot.rows()))
+    
+    
+    def test_update_per_sandbox(self):
+        usage_snapshot.rows()
+        usage1 = Usage.objects.create(sandbox=self.sandbox1, container=1)
+        usage2 = Usage.objects.create(sandbox=self.sandbox2, container=2)
+        self.assertEqual(
+            dgeq.serialize(usage1), caches[settings.SANDBOX_USAGE_SNAPSHOT].get(
+                usage_snapshot.key(self.sandbox1.pk)
+            )
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                {self.sandbox1.pk: dgeq.serialize(usage1), self.sandbox2.pk: dgeq.serialize(usage2)},
+                usage_snapshot.rows()
+            )
+    
+    
+    def test_update_unknown_sandbox(self):
+        usage_snapshot.rows()
+        sandbox = Sandbox.objects.create(name="Test3", url="http://localhost:7002/", enabled=True)
+        usage = Usage.objects.create(sandbox=sandbox, container=1)
+        self.assertEqual({sandbox.pk: dgeq.serialize(usage)}, usage_snapshot.rows())
+    
+    
+    def test_check_usage_snapshot(self):
+        # The cache of the test settings is local to the process
+        self.assertEqual(["django_sandbox.W002"], [w.id for w in check_usage_snapshot(None)])
@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.test import SimpleTestCase, TransactionTestCase
+
+from django_sandbox.models import Request, Response, Sandbox
+from django_sandbox.stats import Percentile, execution_stats, percentile_name
+
+
+SANDBOX_URL = settings.SANDBOX_URL
+
+
+
+class PercentileTestCase(SimpleTestCase):
+    
+    def test_percentile_name(self):
+        self.assertEqual("p50", percentile_name(0.5))
+        self.assertEqual("p99_9", percentile_name(0.999))
+    
+    
+    def test_percentile_invalid(self):
+        with self.assertRaises(ValueError):
+            Percentile("response__total_time", 1.5)
+
+
+
+class ExecutionStatsTestCase(TransactionTestCase):
+    
+    def setUp(self):
+        self.sandbox1 = Sandbox.objects.create(name="Test1", url=SANDBOX_URL, enabled=True)
+        self.sandbox2 = Sandbox.objects.create(
+            name="Test2", url="http://localhost:7001/", enabled=True
+        )
+        for status, total_time in ((0, 1.0), (0, 3.0), (1, 2.0)):
+            Request.objects.create(
+                sandbox=self.sandbox1, success=True, config={},
+                response=Response.objects.create(status=status, total_time=total_time)
+            )
+        Request.objects.create(sandbox=self.sandbox1, success=False, config={})
+        Request.objects.create(
+            sandbox=self.sandbox2, success=True, config={}, cached=True,
+            response=Response.objects.create(status=0, total_time=5.0)
+        )
+    
+    
+    def test_stats(self):
+        stats = execution_stats(Request.objects.all(), percentiles=(0.5,))
+        self.assertEqual(1, len(stats))
+        self.assertEqual(5, stats[0]["count"])
+        self.assertEqual(1, stats[0]["failed"])
+        self.assertEqual(1, stats[0]["cached"])
+        self.assertEqual(0.8, stats[0]["success_ratio"])
+        self.assertEqual({"avg": 2.75, "max": 5.0, "p50": 2.5}, stats[0]["total_time"])
+        self.assertEqual({"0": 3, "1": 1}, stats[0]["statuses"])
+    
+    
+    def test_stats_group(self):
+        stats = execution_stats(Request.objects.all(), ["sandbox", "bucket"], "day")
+        self.assertEqual([self.sandbox1.pk, self.sandbox2.pk], [s["sandbox"] for s in stats])
+        self.assertEqual(4, stats[0]["count"])
+        self.assertEqual(2.0, stats[0]["total_time"]["p50"])
+        self.assertEqual({"0": 2, "1": 1}, stats[0]["statuses"])
+        self.assertEqual({"0": 1}, stats[1]["statuses"])
+        self.assertEqual(
+            Request.objects.first().date.replace(hour=0, minute=0, second=0, microsecond=0),
+            stats[0]["bucket"]
+        )
@@ -26,6 +26,19 @@ class TaskTestCase(TransactionTestCase):
         self.user.user_permissions.add(Permission.objects.get(codename="view_sandboxspecs"))
         self.user.user_permissions.add(Permission.objects.get(codename="view_containerspecs"))
     
+    def test_poll_usage_fleet(self):
+        Sandbox.objects.create(name="Test2", url="http://localhost:7001/", enabled=False)
+        tasks.poll_usage()
+        self.assertEqual(2, Usage.objects.count())
+        self.assertTrue(Usage.objects.get(sandbox=self.sandbox).enabled)
+        self.assertFalse(Usage.objects.exclude(sandbox=self.sandbox).get().enabled)
+    
+    
+    def test_poll_usage_timeout(self):
+        with self.settings(SANDBOX_POLL_TIMEOUT=0):
+            tasks.poll_usage()
+        self.assertFalse(Usage.objects.get(sandbox=self.sandbox).reached)
+    
     """ TODO
     async def test_poll_usage(self):
         communicator = WebsocketCommunicator(
@@ -34,7 +47,7 @@ class TaskTestCase(TransactionTestCase):
         communicator.scope["user"] = self.user
         await communicator.connect()
         
-        await database_sync_to_async(tasks.poll_usage)(self.sandbox.pk)
+        await database_sync_to_async(tasks.poll_usage)()
         result = await communicator.receive_json_from()
         expected = await database_sync_to_async(Usage.objects.all().latest)()
         expected = DjangoJSONEncoder().encode(
@@ -56,7 +69,7 @@ class TaskTestCase(TransactionTestCase):
         
         await sandbox_specs_communicator.connect()
         await container_specs_communicator.connect()
-        await database_sync_to_async(tasks.poll_specifications)(self.sandbox.pk)
+        await database_sync_to_async(tasks.poll_specifications)()
         
         expected_sandbox_specs = await database_sync_to_async(SandboxSpecs.objects.get)(
             sandbox=self.sandbox
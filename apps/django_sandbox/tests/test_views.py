@@ -1,16 +1,21 @@
 import json
+from datetime import timedelta
 
 import dgeq
 
 from asgiref.sync import async_to_sync
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import caches
 from django.core.serializers.json import DjangoJSONEncoder
 from django.test import Client, TransactionTestCase
 from django.urls import reverse
+from django.utils import timezone
 
 from common.enums import ErrorCode
-from django_sandbox.models import ContainerSpecs, Sandbox, SandboxSpecs
+from django_sandbox.models import (ContainerSpecs, Request, Sandbox, SandboxSpecs, Usage,
+                                   UsageAggregate)
+from django_sandbox.scheduling import scheduler
 
 SANDBOX_URL = settings.SANDBOX_URL
 
@@ -33,6 +38,16 @@ class SandboxViewTestCase(TransactionTestCase):
         self.assertEqual(expected, response.json())
 
 
+    def test_get_single_new_usage(self):
+        url = reverse("django_sandbox:sandbox", args=(self.sandbox.pk,))
+        etag = self.client.get(url)["ETag"]
+
+        usage = Usage.objects.create(sandbox=self.sandbox)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertIn(usage.pk, response.json()["row"]["usages"])
+
+
     def test_get_collection(self):
         sandbox_dummy1 = Sandbox.objects.create(
             name="Dummy 1", url="http://localhost:7777", enabled=True
@@ -398,6 +413,152 @@ class SandboxViewTestCase(TransactionTestCase):
 
 
 
+class SandboxPoolViewTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user("test", is_superuser=True)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+
+    def test_get(self):
+        response = self.client.get(reverse("django_sandbox:pool"))
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.json()["status"])
+        self.assertEqual(
+            {"hits", "misses", "evictions", "clients", "connections"},
+            set(response.json()["row"].keys())
+        )
+
+
+    def test_get_403(self):
+        response = Client().get(reverse("django_sandbox:pool"))
+        expected = {
+            "status":  False,
+            "message": "Missing view permission on Sandbox",
+            "code":    ErrorCode.PermissionDenied.value
+        }
+        self.assertEqual(403, response.status_code)
+        self.assertEqual(expected, response.json())
+
+
+
+class DatabasePoolViewTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user("test", is_superuser=True)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+
+    def test_get(self):
+        response = self.client.get(reverse("django_sandbox:database_pool"))
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.json()["status"])
+        self.assertIn("saturation", response.json()["row"])
+        self.assertIn("wait_histogram", response.json()["row"])
+
+
+    def test_get_403(self):
+        response = Client().get(reverse("django_sandbox:database_pool"))
+        expected = {
+            "status":  False,
+            "message": "Missing view permission on Sandbox",
+            "code":    ErrorCode.PermissionDenied.value
+        }
+        self.assertEqual(403, response.status_code)
+        self.assertEqual(expected, response.json())
+
+
+
+class ExecutionQueueViewTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user("test", is_superuser=True)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+
+    def test_get(self):
+        response = self.client.get(reverse("django_sandbox:queue"))
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.json()["status"])
+        self.assertIn("depth", response.json()["row"])
+        self.assertIn("wait_avg", response.json()["row"])
+
+
+    def test_get_403(self):
+        response = Client().get(reverse("django_sandbox:queue"))
+        expected = {
+            "status":  False,
+            "message": "Missing view permission on Request",
+            "code":    ErrorCode.PermissionDenied.value
+        }
+        self.assertEqual(403, response.status_code)
+        self.assertEqual(expected, response.json())
+
+
+
+class BatchExecutionViewTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.sandbox = Sandbox.objects.create(name="Test", url=SANDBOX_URL, enabled=True)
+        self.user = User.objects.create_user("test", is_superuser=True)
+        self.client = Client()
+        self.client.force_login(self.user)
+        scheduler.invalidate()
+
+
+    def test_post(self):
+        body = {"items": [{"config": {"commands": ["true"]}}, {"config": {"commands": ["false"]}}]}
+        response = self.client.post(
+            reverse("django_sandbox:batch"), json.dumps(body), content_type="application/json"
+        )
+        self.assertEqual(200, response.status_code)
+        row = response.json()["row"]
+        self.assertEqual(2, row["total"])
+        self.assertEqual(2, row["succeeded"])
+        self.assertEqual(0, row["failed"])
+        self.assertEqual(
+            [0, 1],
+            [Request.objects.get(pk=pk).response.execution.get().exit_code for pk in row["requests"]]
+        )
+
+
+    def test_post_invalid_environment(self):
+        body = {"items": [{"config": {"commands": ["true"]}, "environment": "%%%"}]}
+        response = self.client.post(
+            reverse("django_sandbox:batch"), json.dumps(body), content_type="application/json"
+        )
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(ErrorCode.ValidationError.value, response.json()["code"])
+        self.assertEqual(0, Request.objects.count())
+
+
+    def test_post_empty(self):
+        response = self.client.post(
+            reverse("django_sandbox:batch"), json.dumps({"items": []}),
+            content_type="application/json"
+        )
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(ErrorCode.ValidationError.value, response.json()["code"])
+
+
+    def test_post_403(self):
+        response = Client().post(
+            reverse("django_sandbox:batch"), json.dumps({"items": []}),
+            content_type="application/json"
+        )
+        expected = {
+            "status":  False,
+            "message": "Missing add permission on Request",
+            "code":    ErrorCode.PermissionDenied.value
+        }
+        self.assertEqual(403, response.status_code)
+        self.assertEqual(expected, response.json())
+
+
+
 class SandboxSpecsViewTestCase(TransactionTestCase):
 
     def setUp(self):
@@ -418,6 +579,22 @@ class SandboxSpecsViewTestCase(TransactionTestCase):
         self.assertEqual(expected, response.json())
 
 
+    def test_get_single_not_modified(self):
+        url = reverse("django_sandbox:sandbox_specs", args=(self.specs.pk,))
+        etag = self.client.get(url)["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(etag, response["ETag"])
+
+        self.specs.cpu_core = 8
+        self.specs.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response["ETag"])
+        self.assertEqual(8, response.json()["row"]["cpu_core"])
+
+
     def test_get_collection(self):
         sandbox_dummy1 = Sandbox.objects.create(
             name="Dummy 1", url="http://localhost:7777", enabled=True
@@ -493,7 +670,7 @@ class ContainerSpecsViewTestCase(TransactionTestCase):
         )
         response = self.client.get(
             reverse("django_sandbox:container_specs_collection"),
-            data={"sandbox": f"]{sandbox_dummy1.pk}"}
+            data={"sandbox": f"]{sandbox_dummy1.pk}", "c:include": "*"}
         )
         expected = {
             "status": True,
@@ -507,6 +684,26 @@ class ContainerSpecsViewTestCase(TransactionTestCase):
         self.assertDictEqual(expected, response.json())
 
 
+    def test_get_collection_deferred(self):
+        response = self.client.get(reverse("django_sandbox:container_specs_collection"))
+        expected = dgeq.serialize(self.specs)
+        for field in ContainerSpecs.DEFERRED_FIELDS:
+            del expected[field]
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([expected], response.json()["rows"])
+
+        response = self.client.get(
+            reverse("django_sandbox:container_specs_collection"), data={"c:include": "bin"}
+        )
+        self.assertIn("bin", response.json()["rows"][0])
+        self.assertNotIn("libraries", response.json()["rows"][0])
+
+        response = self.client.get(
+            reverse("django_sandbox:container_specs_collection"), data={"c:show": "id,libraries"}
+        )
+        self.assertEqual({"id", "libraries"}, set(response.json()["rows"][0]))
+
+
     def test_get_404(self):
         response = self.client.get(reverse("django_sandbox:container_specs", args=(9999,)))
         expected = {
@@ -530,6 +727,45 @@ class ContainerSpecsViewTestCase(TransactionTestCase):
 
 
 
+class LatestUsageViewTestCase(TransactionTestCase):
+
+    def setUp(self):
+        caches[settings.SANDBOX_USAGE_SNAPSHOT].clear()
+        self.sandbox1 = Sandbox.objects.create(name="Test1", url=SANDBOX_URL, enabled=True)
+        self.sandbox2 = Sandbox.objects.create(
+            name="Test2", url="http://localhost:7001/", enabled=True
+        )
+        self.user = User.objects.create_user("test", is_superuser=True)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+
+    def test_get(self):
+        Usage.objects.create(sandbox=self.sandbox2, container=1)
+        latest2 = Usage.objects.create(sandbox=self.sandbox2, container=2)
+        latest1 = Usage.objects.create(sandbox=self.sandbox1, container=3)
+        response = self.client.get(reverse("django_sandbox:usage_latest"))
+        # Encode and decode the expected output so that the date format match
+        expected = json.loads(DjangoJSONEncoder().encode({
+            "status": True,
+            "rows":   [dgeq.serialize(latest1), dgeq.serialize(latest2)],
+        }))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(expected, response.json())
+
+
+    def test_get_403(self):
+        response = Client().get(reverse("django_sandbox:usage_latest"))
+        expected = {
+            "status":  False,
+            "message": "Missing view permission on Usage",
+            "code":    ErrorCode.PermissionDenied.value
+        }
+        self.assertEqual(403, response.status_code)
+        self.assertEqual(expected, response.json())
+
+
+
 class UsageViewTestCase(TransactionTestCase):
 
     def setUp(self):
@@ -594,6 +830,92 @@ class UsageViewTestCase(TransactionTestCase):
         self.assertEqual(expected, response.json())
 
 
+    def test_get_collection_cursor(self):
+        usage = async_to_sync(self.sandbox.poll_usage)()
+        response = self.client.get(
+            reverse("django_sandbox:usage_collection"), data={"c:cursor": "", "c:limit": 1}
+        )
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([usage.pk], [row["id"] for row in response.json()["rows"]])
+        
+        response = self.client.get(
+            reverse("django_sandbox:usage_collection"),
+            data={"c:cursor": response.json()["cursor"], "c:limit": 1}
+        )
+        self.assertEqual([self.usage.pk], [row["id"] for row in response.json()["rows"]])
+        self.assertIsNone(response.json()["cursor"])
+
+
+    def test_get_collection_resolution(self):
+        UsageAggregate.objects.create(
+            sandbox=self.sandbox, resolution=UsageAggregate.MINUTE, date=timezone.now(), samples=4,
+            reached=4
+        )
+        response = self.client.get(
+            reverse("django_sandbox:usage_collection"), data={"resolution": "minute"}
+        )
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(1, len(response.json()["rows"]))
+        self.assertEqual(4, response.json()["rows"][0]["samples"])
+
+        response = self.client.get(
+            reverse("django_sandbox:usage_collection"), data={"resolution": "hour"}
+        )
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([], response.json()["rows"])
+
+
+    def test_get_collection_merged(self):
+        now = self.usage.date
+        minute = UsageAggregate.objects.create(
+            sandbox=self.sandbox, resolution=UsageAggregate.MINUTE,
+            date=now - timedelta(days=2), samples=4, reached=4
+        )
+        hour = UsageAggregate.objects.create(
+            sandbox=self.sandbox, resolution=UsageAggregate.HOUR,
+            date=now - timedelta(days=10), samples=240, reached=240
+        )
+        # Rolled up into the minute aggregate, must not be returned twice
+        UsageAggregate.objects.create(
+            sandbox=self.sandbox, resolution=UsageAggregate.HOUR,
+            date=now - timedelta(days=2), samples=240, reached=240
+        )
+        since = (now - timedelta(days=30)).isoformat()
+
+        response = self.client.get(reverse("django_sandbox:usage_collection"), data={"date": f">{since}"})
+        self.assertEqual(200, response.status_code)
+        rows = response.json()["rows"]
+        self.assertEqual(
+            [(self.usage.pk, None), (minute.pk, 60), (hour.pk, 3600)],
+            [(row["id"], row.get("resolution")) for row in rows]
+        )
+
+        response = self.client.get(
+            reverse("django_sandbox:usage_collection"),
+            data={"date": f">{since}", "c:cursor": "", "c:limit": 1}
+        )
+        self.assertEqual([self.usage.pk], [row["id"] for row in response.json()["rows"]])
+        response = self.client.get(
+            reverse("django_sandbox:usage_collection"),
+            data={"date": f">{since}", "c:cursor": response.json()["cursor"], "c:limit": 2}
+        )
+        self.assertEqual([minute.pk, hour.pk], [row["id"] for row in response.json()["rows"]])
+        self.assertIsNone(response.json()["cursor"])
+
+        response = self.client.get(
+            reverse("django_sandbox:usage_collection"), data={"date": f">{since}", "c:sort": "date"}
+        )
+        self.assertEqual(400, response.status_code)
+
+
+    def test_get_collection_resolution_400(self):
+        response = self.client.get(
+            reverse("django_sandbox:usage_collection"), data={"resolution": "day"}
+        )
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(ErrorCode.ValidationError.value, response.json()["code"])
+
+
 
 class ResponseViewTestCase(TransactionTestCase):
 
@@ -788,6 +1110,34 @@ class RequestViewTestCase(TransactionTestCase):
         self.assertEqual(expected, response.json())
 
 
+    def test_get_collection_cursor(self):
+        Request.objects.bulk_create([
+            Request(sandbox=self.sandbox, success=True, config={}) for _ in range(4)
+        ])
+        expected = list(Request.objects.order_by("-date", "-pk").values_list("pk", flat=True))
+        
+        pks, cursor = list(), ""
+        for _ in range(3):
+            response = self.client.get(
+                reverse("django_sandbox:request_collection"),
+                data={"c:cursor": cursor, "c:limit": 2}
+            )
+            self.assertEqual(200, response.status_code)
+            pks += [row["id"] for row in response.json()["rows"]]
+            cursor = response.json()["cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(expected, pks)
+        self.assertIsNone(cursor)
+
+
+    def test_get_collection_cursor_invalid(self):
+        for data in ({"c:cursor": "invalid"}, {"c:cursor": "", "c:start": 2}):
+            response = self.client.get(reverse("django_sandbox:request_collection"), data=data)
+            self.assertEqual(400, response.status_code)
+            self.assertEqual(ErrorCode.ValidationError.value, response.json()["code"])
+
+
     def test_get_403(self):
         response = Client().get(reverse("django_sandbox:request", args=(self.request.pk,)))
         expected = {
@@ -797,3 +1147,47 @@ class RequestViewTestCase(TransactionTestCase):
         }
         self.assertEqual(403, response.status_code)
         self.assertEqual(expected, response.json())
+
+
+
+class ExecutionStatsViewTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.sandbox = Sandbox.objects.create(name="Test", url=SANDBOX_URL, enabled=True)
+        self.user = User.objects.create_user("test", is_superuser=True)
+        Request.objects.create(sandbox=self.sandbox, success=False, config={})
+        self.client = Client()
+        self.client.force_login(self.user)
+
+
+    def test_get(self):
+        response = self.client.get(
+            reverse("django_sandbox:request_stats"),
+            data={"group": "sandbox,user", "percentiles": "0.5", "success": "0"}
+        )
+        self.assertEqual(200, response.status_code)
+        rows = response.json()["rows"]
+        self.assertEqual(1, len(rows))
+        self.assertEqual(self.sandbox.pk, rows[0]["sandbox"])
+        self.assertIsNone(rows[0]["user"])
+        self.assertEqual(1, rows[0]["failed"])
+        self.assertEqual({"avg": None, "max": None, "p50": None}, rows[0]["total_time"])
+
+
+    def test_get_400(self):
+        for data in ({"group": "unknown"}, {"bucket": "year"}, {"percentiles": "2"},
+                     {"c:limit": "1"}, {"unknown": "1"}):
+            response = self.client.get(reverse("django_sandbox:request_stats"), data=data)
+            self.assertEqual(400, response.status_code)
+            self.assertFalse(response.json()["status"])
+
+
+    def test_get_403(self):
+        response = Client().get(reverse("django_sandbox:request_stats"))
+        expected = {
+            "status":  False,
+            "message": "Missing view permission on Request",
+            "code":    ErrorCode.PermissionDenied.value
+        }
+        self.assertEqual(403, response.status_code)
+        self.assertEqual(expected, response.json())
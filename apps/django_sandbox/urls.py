@@ -9,6 +9,11 @@ urlpatterns = [
     path('sandbox/<int:pk>/', views.SandboxView.as_view(), name='sandbox'),
     path('sandbox/', views.SandboxView.as_view(), name='sandbox_collection'),
     
+    path('pool/', views.SandboxPoolView.as_view(), name='pool'),
+    path('database_pool/', views.DatabasePoolView.as_view(), name='database_pool'),
+    path('queue/', views.ExecutionQueueView.as_view(), name='queue'),
+    path('batch/', views.BatchExecutionView.as_view(), name='batch'),
+    
     path('sandbox_specs/<int:pk>/', views.SandboxSpecsView.as_view(), name='sandbox_specs'),
     path('sandbox_specs/', views.SandboxSpecsView.as_view(), name='sandbox_specs_collection'),
     
@@ -17,9 +22,11 @@ urlpatterns = [
     
     path('usage/<int:pk>/', views.UsageView.as_view(), name='usage'),
     path('usage/', views.UsageView.as_view(), name='usage_collection'),
+    path('usage/latest/', views.LatestUsageView.as_view(), name='usage_latest'),
     
     path('request/<int:pk>/', views.RequestView.as_view(), name='request'),
     path('request/', views.RequestView.as_view(), name='request_collection'),
+    path('request/stats/', views.ExecutionStatsView.as_view(), name='request_stats'),
     
     path('command_result/<int:pk>/', views.CommandResultView.as_view(), name='command_result'),
     path('command_result/', views.CommandResultView.as_view(), name='command_result_collection'),
@@ -28,8 +35,19 @@ urlpatterns = [
     path('response/', views.ResponseView.as_view(), name='response_collection'),
 ]
 
+# Streaming endpoints handled by consumers, mounted under `api/sandbox/` (see
+# `platon.routing`).
+http_urlpatterns = [
+    re_path(
+        r'^sandbox/(?P<pk>\d+)/environment/(?P<environment>[\w-]+)/$',
+        consumers.DownloadConsumer
+    ),
+]
+
 websocket_urlpatterns = [
     re_path(r'ws/sandbox/usage/(?P<pk>\d+)/$', consumers.UsageConsumer),
     re_path(r'ws/sandbox/sandbox_specs/(?P<pk>\d+)/$', consumers.SandboxSpecsConsumer),
     re_path(r'ws/sandbox/container_specs/(?P<pk>\d+)/$', consumers.ContainerSpecsConsumer),
+    re_path(r'ws/sandbox/monitoring/$', consumers.MonitoringConsumer),
+    re_path(r'ws/sandbox/execute/$', consumers.ExecutionConsumer),
 ]
@@ -1,16 +1,48 @@
+import base64
+import binascii
+import io
 import json
-from typing import Optional
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
 
 import dgeq
-from channels.db import database_sync_to_async
+from django.conf import settings
 from django.core.exceptions import PermissionDenied, ValidationError
-from django.http import Http404, JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, QueryDict
+from django.utils.cache import get_conditional_response, patch_cache_control
 
-from common.async_db import has_perm_async
+from common.async_db import check_perm, database_executor, has_perm_async, run_sync
 from common.enums import ErrorCode
 from common.mixins import AsyncView
 from common.validators import check_unknown_fields, check_unknown_missing_fields
-from .models import CommandResult, ContainerSpecs, Request, Response, Sandbox, SandboxSpecs, Usage
+from .cache import detail_cache
+from .exceptions import NoSandboxAvailableError
+from .execution_queue import execution_queue
+from .models import (CommandResult, ContainerSpecs, Request, Response, Sandbox, SandboxSpecs, Usage,
+                     UsageAggregate)
+from .pagination import CURSOR, KeysetQuery, encode_cursor
+from .pool import sandbox_pool
+from .queries import DeferredQuery
+from .rollup import sources, since
+from .snapshot import usage_snapshot
+from .stats import BUCKETS, GROUPS, execution_stats
+
+
+
+def detail_response(request, etag: str, row: Dict[str, Any]) -> HttpResponse:
+    """Return a response containing `row` along with its `ETag`, or a
+    `304 Not Modified` response if `etag` matches the `If-None-Match` header
+    of `request`.
+    
+    Clients must revalidate the row on every request, since it depends on
+    their permissions and changes over time."""
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse({"status": True, "row": row})
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 
@@ -23,20 +55,19 @@ class SandboxView(AsyncView):
     async def get(self, request, pk: Optional[int] = None):
         """Allow to get a single or a collection of `Sandbox`."""
         try:
-            if not await has_perm_async(request.user, "django_sandbox.view_sandbox"):
-                raise PermissionDenied("Missing view permission on Sandbox")
-            
-            if pk is not None:
-                sandbox = await database_sync_to_async(Sandbox.objects.get)(pk=pk)
-                response = {
-                    "status": True,
-                    "row":    await database_sync_to_async(dgeq.serialize)(sandbox)
-                }
-            else:
-                query = dgeq.GenericQuery(
+            def get():
+                check_perm(request.user, "django_sandbox.view_sandbox", "Missing view permission on Sandbox")
+                if pk is not None:
+                    # Not cached, its row contains its usages and executions
+                    row = dgeq.serialize(Sandbox.objects.get(pk=pk))
+                    return detail_cache.etag(row), row
+                return None, DeferredQuery(
                     Sandbox, request.GET, user=request.user, use_permissions=True
-                )
-                response = await database_sync_to_async(query.evaluate)()
+                ).evaluate()
+            
+            etag, response = await run_sync(get)
+            if etag is not None:
+                return detail_response(request, etag, response)
             status = 200
         
         except Sandbox.DoesNotExist as e:
@@ -64,18 +95,22 @@ class SandboxView(AsyncView):
             if pk is not None:
                 raise Http404("Page not found")
             
-            if not await has_perm_async(request.user, "django_sandbox.create_sandbox"):
-                raise PermissionDenied("Missing create permission on Sandbox")
+            def create():
+                check_perm(
+                    request.user, "django_sandbox.create_sandbox",
+                    "Missing create permission on Sandbox"
+                )
+                kwargs = json.loads(request.body)
+                check_unknown_missing_fields({"name", "url", "enabled"}, kwargs)
+                sandbox = Sandbox(**kwargs)
+                sandbox.full_clean()
+                sandbox.save()
+                return {
+                    "status": True,
+                    "row":    dgeq.serialize(sandbox)
+                }
             
-            kwargs = json.loads(request.body)
-            check_unknown_missing_fields({"name", "url", "enabled"}, kwargs)
-            sandbox = Sandbox(**kwargs)
-            await database_sync_to_async(sandbox.full_clean)()
-            await database_sync_to_async(sandbox.save)()
-            response = {
-                "status": True,
-                "row":    await database_sync_to_async(dgeq.serialize)(sandbox)
-            }
+            response = await run_sync(create)
             status = 201
         
         except json.JSONDecodeError as e:  # pragma
@@ -118,15 +153,21 @@ class SandboxView(AsyncView):
         try:
             if pk is None:
                 raise Http404("Page not found")
-            if not await has_perm_async(request.user, "django_sandbox.delete_sandbox"):
-                raise PermissionDenied("Missing delete permission on Sandbox")
             
-            sandbox = await database_sync_to_async(Sandbox.objects.get)(pk=pk)
-            response = {
-                "status": True,
-                "row":    await database_sync_to_async(dgeq.serialize)(sandbox)
-            }
-            await database_sync_to_async(sandbox.delete)()
+            def delete():
+                check_perm(
+                    request.user, "django_sandbox.delete_sandbox",
+                    "Missing delete permission on Sandbox"
+                )
+                sandbox = Sandbox.objects.get(pk=pk)
+                row = dgeq.serialize(sandbox)
+                sandbox.delete()
+                return {
+                    "status": True,
+                    "row":    row
+                }
+            
+            response = await run_sync(delete)
             status = 200
         
         except Sandbox.DoesNotExist as e:
@@ -162,21 +203,24 @@ class SandboxView(AsyncView):
             if pk is None:
                 raise Http404("Page not found")
             
-            if not await has_perm_async(request.user, "django_sandbox.change_sandbox"):
-                raise PermissionDenied("Missing change permission on Sandbox")
-            
-            sandbox = await database_sync_to_async(Sandbox.objects.get)(pk=pk)
-            kwargs = json.loads(request.body)
-            check_unknown_fields({"name", "url", "enabled"}, kwargs)
-            for k, v in kwargs.items():
-                setattr(sandbox, k, v)
-            await database_sync_to_async(sandbox.full_clean)()
-            await database_sync_to_async(sandbox.save)()
+            def update():
+                check_perm(
+                    request.user, "django_sandbox.change_sandbox",
+                    "Missing change permission on Sandbox"
+                )
+                sandbox = Sandbox.objects.get(pk=pk)
+                kwargs = json.loads(request.body)
+                check_unknown_fields({"name", "url", "enabled"}, kwargs)
+                for k, v in kwargs.items():
+                    setattr(sandbox, k, v)
+                sandbox.full_clean()
+                sandbox.save()
+                return {
+                    "status": True,
+                    "row":    dgeq.serialize(sandbox)
+                }
             
-            response = {
-                "status": True,
-                "row":    await database_sync_to_async(dgeq.serialize)(sandbox)
-            }
+            response = await run_sync(update)
             status = 200
         
         except Sandbox.DoesNotExist as e:
@@ -228,24 +272,26 @@ class SandboxView(AsyncView):
             if pk is None:
                 raise Http404("Page not found")
             
-            if not await has_perm_async(request.user, "django_sandbox.change_sandbox"):
-                raise PermissionDenied("Missing change permission on Sandbox")
-            
-            # Check that the sandbox exists
-            await database_sync_to_async(Sandbox.objects.get)(pk=pk)
-            
-            kwargs = json.loads(request.body)
-            check_unknown_missing_fields({"name", "url", "enabled"}, kwargs)
-            sandbox = await database_sync_to_async(Sandbox.objects.get)(pk=pk)
-            for k, v in kwargs.items():
-                setattr(sandbox, k, v)
-            await database_sync_to_async(sandbox.full_clean)()
-            await database_sync_to_async(sandbox.save)()
+            def overwrite():
+                check_perm(
+                    request.user, "django_sandbox.change_sandbox",
+                    "Missing change permission on Sandbox"
+                )
+                # Retrieved first so that a missing sandbox is reported before
+                # an invalid body
+                sandbox = Sandbox.objects.get(pk=pk)
+                kwargs = json.loads(request.body)
+                check_unknown_missing_fields({"name", "url", "enabled"}, kwargs)
+                for k, v in kwargs.items():
+                    setattr(sandbox, k, v)
+                sandbox.full_clean()
+                sandbox.save()
+                return {
+                    "status": True,
+                    "row":    dgeq.serialize(sandbox)
+                }
             
-            response = {
-                "status": True,
-                "row":    await database_sync_to_async(dgeq.serialize)(sandbox)
-            }
+            response = await run_sync(overwrite)
             status = 200
         
         except Sandbox.DoesNotExist as e:
@@ -292,6 +338,195 @@ class SandboxView(AsyncView):
 
 
 
+class SandboxPoolView(AsyncView):
+    """Allow to get the counters of this process' pool of sandbox clients."""
+    
+    http_method_names = ['get']
+    
+    
+    async def get(self, request):
+        try:
+            if not await has_perm_async(request.user, "django_sandbox.view_sandbox"):
+                raise PermissionDenied("Missing view permission on Sandbox")
+            
+            response = {
+                "status": True,
+                "row":    sandbox_pool.stats()
+            }
+            status = 200
+        
+        except PermissionDenied as e:
+            response = {
+                "status":  False,
+                "message": str(e),
+                "code":    ErrorCode.from_exception(e).value
+            }
+            status = 403
+        
+        return JsonResponse(response, status=status)
+
+
+
+class DatabasePoolView(AsyncView):
+    """Allow to get the metrics of this process' pool of threads running the
+    database work of views and consumers."""
+    
+    http_method_names = ['get']
+    
+    
+    async def get(self, request):
+        try:
+            if not await has_perm_async(request.user, "django_sandbox.view_sandbox"):
+                raise PermissionDenied("Missing view permission on Sandbox")
+            
+            response = {
+                "status": True,
+                "row":    database_executor.stats()
+            }
+            status = 200
+        
+        except PermissionDenied as e:
+            response = {
+                "status":  False,
+                "message": str(e),
+                "code":    ErrorCode.from_exception(e).value
+            }
+            status = 403
+        
+        return JsonResponse(response, status=status)
+
+
+
+class ExecutionQueueView(AsyncView):
+    """Allow to get the counters of this process' execution queue."""
+    
+    http_method_names = ['get']
+    
+    
+    async def get(self, request):
+        try:
+            if not await has_perm_async(request.user, "django_sandbox.view_request"):
+                raise PermissionDenied("Missing view permission on Request")
+            
+            response = {
+                "status": True,
+                "row":    execution_queue.stats()
+            }
+            status = 200
+        
+        except PermissionDenied as e:
+            response = {
+                "status":  False,
+                "message": str(e),
+                "code":    ErrorCode.from_exception(e).value
+            }
+            status = 403
+        
+        return JsonResponse(response, status=status)
+
+
+
+class BatchExecutionView(AsyncView):
+    """Allow to execute a batch of requests, distributed across the enabled
+    sandboxes."""
+    
+    http_method_names = ['post']
+    
+    
+    async def post(self, request):
+        """Execute every item of the batch on behalf of the user.
+        
+        The body must be a JSON object containing :
+        
+        * `items` (`list`) - Executions of the batch (at most
+           `SANDBOX_BATCH_MAX_SIZE`), each being an object with a `config`
+           (see `Sandbox.execute()`) and an optional base64-encoded tgz
+           `environment`.
+        * `cache` (`bool`) - Optional, whether deterministic executions may be
+           served from the cache.
+        
+        The response contains a summary of the batch and the id of the
+        `Request` created for each item, in the same order."""
+        try:
+            if not await has_perm_async(request.user, "django_sandbox.add_request"):
+                raise PermissionDenied("Missing add permission on Request")
+            
+            kwargs = json.loads(request.body)
+            if not isinstance(kwargs, dict):
+                raise ValidationError({"items": ["This field is required"]})
+            check_unknown_fields({"items", "cache"}, kwargs)
+            if not isinstance(kwargs.get("items"), list) or not kwargs["items"]:
+                raise ValidationError({"items": ["This field must be a non-empty list"]})
+            if len(kwargs["items"]) > settings.SANDBOX_BATCH_MAX_SIZE:
+                raise ValidationError({"items": [
+                    f"A batch contains at most {settings.SANDBOX_BATCH_MAX_SIZE} items"
+                ]})
+            
+            items = list()
+            for i, item in enumerate(kwargs["items"]):
+                if not isinstance(item, dict) or not isinstance(item.get("config"), dict):
+                    raise ValidationError({"items": [f"Item {i}: config must be an object"]})
+                environment = None
+                if item.get("environment") is not None:
+                    try:
+                        environment = io.BytesIO(
+                            base64.b64decode(item["environment"], validate=True)
+                        )
+                    except (binascii.Error, TypeError):
+                        raise ValidationError({"items": [f"Item {i}: invalid base64 environment"]})
+                items.append((request.user, item["config"], environment))
+            
+            start = time.monotonic()
+            requests = await Sandbox.objects.execute_batch(items, cache=bool(kwargs.get("cache")))
+            response = {
+                "status": True,
+                "row":    {
+                    "total":     len(requests),
+                    "succeeded": sum(r.success for r in requests),
+                    "failed":    sum(not r.success for r in requests),
+                    "cached":    sum(r.cached for r in requests),
+                    "elapsed":   time.monotonic() - start,
+                    "requests":  [r.pk for r in requests],
+                }
+            }
+            status = 200
+        
+        except json.JSONDecodeError as e:
+            response = {
+                "status":  False,
+                "message": str(e),
+                "code":    ErrorCode.from_exception(e).value
+            }
+            status = 400
+        
+        except ValidationError as e:
+            response = {
+                "status":  False,
+                "message": str(e.message_dict),
+                "code":    ErrorCode.from_exception(e).value
+            }
+            status = 400
+        
+        except PermissionDenied as e:
+            response = {
+                "status":  False,
+                "message": str(e),
+                "code":    ErrorCode.from_exception(e).value
+            }
+            status = 403
+        
+        except NoSandboxAvailableError as e:
+            response = {
+                "status":  False,
+                "message": str(e),
+                "code":    ErrorCode.from_exception(e).value
+            }
+            status = 503
+        
+        return JsonResponse(response, status=status)
+
+
+
 class SandboxSpecsView(AsyncView):
     """Allow to get a single or a collection of `SandboxSpecs`."""
     
@@ -300,20 +535,17 @@ class SandboxSpecsView(AsyncView):
     
     async def get(self, request, pk: Optional[int] = None):
         try:
-            if not await has_perm_async(request.user, "django_sandbox.view_sandboxspecs"):
-                raise PermissionDenied("Missing view permission on SandboxSpecs")
-            
-            if pk is not None:
-                specs = await database_sync_to_async(SandboxSpecs.objects.get)(pk=pk)
-                response = {
-                    "status": True,
-                    "row":    await database_sync_to_async(dgeq.serialize)(specs)
-                }
-            else:
-                query = dgeq.GenericQuery(
+            def get():
+                check_perm(request.user, "django_sandbox.view_sandboxspecs", "Missing view permission on SandboxSpecs")
+                if pk is not None:
+                    return detail_cache.get(SandboxSpecs, pk)
+                return None, DeferredQuery(
                     SandboxSpecs, request.GET, user=request.user, use_permissions=True
-                )
-                response = await database_sync_to_async(query.evaluate)()
+                ).evaluate()
+            
+            etag, response = await run_sync(get)
+            if etag is not None:
+                return detail_response(request, etag, response)
             status = 200
         
         except SandboxSpecs.DoesNotExist as e:
@@ -344,20 +576,19 @@ class ContainerSpecsView(AsyncView):
     
     async def get(self, request, pk: Optional[int] = None):
         try:
-            if not await has_perm_async(request.user, "django_sandbox.view_containerspecs"):
-                raise PermissionDenied("Missing view permission on ContainerSpecs")
-            
-            if pk is not None:
-                specs = await database_sync_to_async(ContainerSpecs.objects.get)(pk=pk)
-                response = {
-                    "status": True,
-                    "row":    await database_sync_to_async(dgeq.serialize)(specs)
-                }
-            else:
-                query = dgeq.GenericQuery(
-                    ContainerSpecs, request.GET, user=request.user, use_permissions=True
+            def get():
+                check_perm(
+                    request.user, "django_sandbox.view_containerspecs", "Missing view permission on ContainerSpecs"
                 )
-                response = await database_sync_to_async(query.evaluate)()
+                if pk is not None:
+                    return detail_cache.get(ContainerSpecs, pk)
+                return None, DeferredQuery(
+                    ContainerSpecs, request.GET, user=request.user, use_permissions=True
+                ).evaluate()
+            
+            etag, response = await run_sync(get)
+            if etag is not None:
+                return detail_response(request, etag, response)
             status = 200
         
         except ContainerSpecs.DoesNotExist as e:
@@ -381,29 +612,119 @@ class ContainerSpecsView(AsyncView):
 
 
 class UsageView(AsyncView):
-    """Allow to get a single or a collection of `Usage`."""
+    """Allow to get a single or a collection of `Usage`.
+    
+    Since old `Usage` are rolled up into `UsageAggregate`, a collection whose
+    `date` filter starts before the oldest raw `Usage` merges the sources
+    covering it, newest first : raw `Usage` for the recent part, then minute
+    and hour aggregates for the older parts (see `rollup.sources()`), rows of
+    aggregates being those having a `resolution`. Such a collection is always
+    paginated with a cursor, `c:aggregate` and `c:annotate` cannot be used.
+    Only raw `Usage` is used without a lower bound.
+    
+    A single resolution can be forced with the `resolution` parameter (`raw`,
+    `minute`, `hour` or `auto`).
+    
+    Collections are paginated with a cursor instead of offsets when `c:cursor`
+    is given (empty for the first page), see `KeysetQuery`."""
     
     http_method_names = ['get']
     
+    RESOLUTIONS = {
+        "raw":    None,
+        "minute": UsageAggregate.MINUTE,
+        "hour":   UsageAggregate.HOUR,
+    }
+    
+    # Commands which cannot be applied over several sources.
+    UNMERGEABLE = ("c:aggregate", "c:annotate")
+    
+    
+    @staticmethod
+    def query(query_dict: QueryDict, user, resolution: Optional[int],
+              keyset: bool = False) -> DeferredQuery:
+        """Return the query of `query_dict` on the source of `resolution`."""
+        query_class = KeysetQuery if keyset or CURSOR in query_dict else DeferredQuery
+        if resolution is None:
+            return query_class(Usage, query_dict, user=user, use_permissions=True)
+        query_dict = query_dict.copy()
+        query_dict["resolution"] = str(resolution)
+        return query_class(UsageAggregate, query_dict, user=user, use_permissions=True)
+    
+    
+    def merged(self, query_dict: QueryDict, user,
+               parts: List[Tuple[Optional[int], Optional[datetime]]]) -> Dict[str, Any]:
+        """Evaluate `query_dict` over every source of `parts` (see
+        `rollup.sources()`), newest first, until a page is filled.
+        
+        Every source is paginated with the same cursor (see `KeysetQuery`),
+        which works across sources since their periods do not overlap."""
+        if unsupported := set(self.UNMERGEABLE) & set(query_dict.keys()):
+            raise ValidationError({
+                f: ["Cannot be used on a period covering several resolutions"] for f in unsupported
+            })
+        page_size = KeysetQuery._page_size(query_dict.get("c:limit"))
+        
+        response = {"status": True, "rows": [], "cursor": None}
+        for i, (resolution, before) in enumerate(parts):
+            part = query_dict.copy()
+            part["c:limit"] = str(page_size - len(response["rows"]))
+            if before is not None:
+                part.appendlist("date", f"<{before.isoformat()}")
+            
+            result = self.query(part, user, resolution, keyset=True).evaluate()
+            if not result["status"]:
+                return result
+            response["rows"] += result["rows"]
+            response["cursor"] = result["cursor"]
+            if "count" in result:
+                response["count"] = response.get("count", 0) + result["count"]
+            
+            if len(response["rows"]) >= page_size:
+                # The next page starts at the next source, whose rows are all
+                # older than the first row of this one
+                if response["cursor"] is None and i + 1 < len(parts):
+                    response["cursor"] = encode_cursor(parts[i + 1][1], 0)
+                break
+        return response
+    
     
     async def get(self, request, pk: Optional[int] = None):
         try:
-            if not await has_perm_async(request.user, "django_sandbox.view_usage"):
-                raise PermissionDenied("Missing view permission on Usage")
+            def get():
+                check_perm(request.user, "django_sandbox.view_usage", "Missing view permission on Usage")
+                if pk is not None:
+                    usage = Usage.objects.get(pk=pk)
+                    response = {
+                        "status": True,
+                        "row":    dgeq.serialize(usage)
+                    }
+                else:
+                    query_dict = request.GET.copy()
+                    resolution = query_dict.pop("resolution", ["auto"])[-1]
+                    if resolution == "auto":
+                        parts = sources(since(query_dict.getlist("date")))
+                        if len(parts) > 1:
+                            return self.merged(query_dict, request.user, parts)
+                        resolution = None
+                    elif resolution in self.RESOLUTIONS:
+                        resolution = self.RESOLUTIONS[resolution]
+                    else:
+                        raise ValidationError({"resolution": [f"Unknown resolution '{resolution}'"]})
+                    response = self.query(query_dict, request.user, resolution).evaluate()
+                return response
             
-            if pk is not None:
-                usage = await database_sync_to_async(Usage.objects.get)(pk=pk)
-                response = {
-                    "status": True,
-                    "row":    await database_sync_to_async(dgeq.serialize)(usage)
-                }
-            else:
-                query = dgeq.GenericQuery(
-                    Usage, request.GET, user=request.user, use_permissions=True
-                )
-                response = await database_sync_to_async(query.evaluate)()
+            response = await run_sync(get)
             status = 200
         
+        except ValidationError as e:
+            response = {
+                "status":  False,
+                "message": str(e.message_dict),
+                "code":    ErrorCode.from_exception(e).value
+            }
+            status = 400
+        
         except Usage.DoesNotExist as e:
             response = {
                 "status":  False,
@@ -425,27 +746,28 @@ class UsageView(AsyncView):
 
 
 class ResponseView(AsyncView):
-    """Allow to get a single or a collection of `Response`."""
+    """Allow to get a single or a collection of `Response`.
+    
+    Collections cannot be filtered on `result`, which is stored compressed
+    (see `DeferredQuery`)."""
     
     http_method_names = ['get']
     
     
     async def get(self, request, pk: Optional[int] = None):
         try:
-            if not await has_perm_async(request.user, "django_sandbox.view_response"):
-                raise PermissionDenied("Missing view permission on Response")
-            
-            if pk is not None:
-                execution = await database_sync_to_async(Response.objects.get)(pk=pk)
-                response = {
-                    "status": True,
-                    "row":    await database_sync_to_async(dgeq.serialize)(execution)
-                }
-            else:
-                query = dgeq.GenericQuery(
+            def get():
+                check_perm(request.user, "django_sandbox.view_response", "Missing view permission on Response")
+                if pk is not None:
+                    return {
+                        "status": True,
+                        "row":    dgeq.serialize(Response.objects.get(pk=pk))
+                    }
+                return DeferredQuery(
                     Response, request.GET, user=request.user, use_permissions=True
-                )
-                response = await database_sync_to_async(query.evaluate)()
+                ).evaluate()
+            
+            response = await run_sync(get)
             status = 200
         
         except Response.DoesNotExist as e:
@@ -469,27 +791,30 @@ class ResponseView(AsyncView):
 
 
 class CommandResultView(AsyncView):
-    """Allow to get a single or a collection of `CommandResult`."""
+    """Allow to get a single or a collection of `CommandResult`.
+    
+    Collections cannot be filtered on `stdout` and `stderr`, which are stored
+    compressed (see `DeferredQuery`)."""
     
     http_method_names = ['get']
     
     
     async def get(self, request, pk: Optional[int] = None):
         try:
-            if not await has_perm_async(request.user, "django_sandbox.view_commandresult"):
-                raise PermissionDenied("Missing view permission on CommandResult")
-            
-            if pk is not None:
-                execution = await database_sync_to_async(CommandResult.objects.get)(pk=pk)
-                response = {
-                    "status": True,
-                    "row":    await database_sync_to_async(dgeq.serialize)(execution)
-                }
-            else:
-                query = dgeq.GenericQuery(
-                    CommandResult, request.GET, user=request.user, use_permissions=True
+            def get():
+                check_perm(
+                    request.user, "django_sandbox.view_commandresult", "Missing view permission on CommandResult"
                 )
-                response = await database_sync_to_async(query.evaluate)()
+                if pk is not None:
+                    return {
+                        "status": True,
+                        "row":    dgeq.serialize(CommandResult.objects.get(pk=pk))
+                    }
+                return DeferredQuery(
+                    CommandResult, request.GET, user=request.user, use_permissions=True
+                ).evaluate()
+            
+            response = await run_sync(get)
             status = 200
         
         except CommandResult.DoesNotExist as e:
@@ -512,30 +837,79 @@ class CommandResultView(AsyncView):
 
 
 
-class RequestView(AsyncView):
-    """Allow to get a single or a collection of `Request`."""
+class LatestUsageView(AsyncView):
+    """Allow to get the last polled `Usage` of every sandbox, taken from
+    `usage_snapshot` rather than from the database."""
     
     http_method_names = ['get']
     
     
-    async def get(self, request, pk: Optional[int] = None):
+    async def get(self, request):
         try:
-            if not await has_perm_async(request.user, "django_sandbox.view_request"):
-                raise PermissionDenied("Missing view permission on Request")
-            
-            if pk is not None:
-                execution = await database_sync_to_async(Request.objects.get)(pk=pk)
-                response = {
+            def get():
+                check_perm(request.user, "django_sandbox.view_usage", "Missing view permission on Usage")
+                rows = usage_snapshot.rows()
+                return {
                     "status": True,
-                    "row":    await database_sync_to_async(dgeq.serialize)(execution)
+                    "rows":   [rows[pk] for pk in sorted(rows)]
                 }
-            else:
-                query = dgeq.GenericQuery(
-                    Request, request.GET, user=request.user, use_permissions=True
+            
+            response = await run_sync(get)
+            status = 200
+        
+        except PermissionDenied as e:
+            response = {
+                "status":  False,
+                "message": str(e),
+                "code":    ErrorCode.from_exception(e).value
+            }
+            status = 403
+        
+        return JsonResponse(response, status=status)
+
+
+
+class RequestView(AsyncView):
+    """Allow to get a single or a collection of `Request`.
+    
+    Collections are paginated with a cursor instead of offsets when `c:cursor`
+    is given (empty for the first page), see `KeysetQuery`."""
+    
+    http_method_names = ['get']
+    
+    
+    async def get(self, request, pk: Optional[int] = None):
+        try:
+            def get():
+                check_perm(
+                    request.user, "django_sandbox.view_request", "Missing view permission on Request"
                 )
-                response = await database_sync_to_async(query.evaluate)()
+                
+                if pk is not None:
+                    execution = Request.objects.get(pk=pk)
+                    response = {
+                        "status": True,
+                        "row":    dgeq.serialize(execution)
+                    }
+                else:
+                    query_class = KeysetQuery if CURSOR in request.GET else DeferredQuery
+                    query = query_class(
+                        Request, request.GET, user=request.user, use_permissions=True
+                    )
+                    response = query.evaluate()
+                return response
+            
+            response = await run_sync(get)
             status = 200
         
+        except ValidationError as e:
+            response = {
+                "status":  False,
+                "message": str(e.message_dict),
+                "code":    ErrorCode.from_exception(e).value
+            }
+            status = 400
+        
         except Request.DoesNotExist as e:
             response = {
                 "status":  False,
@@ -553,3 +927,81 @@ class RequestView(AsyncView):
             status = 403
         
         return JsonResponse(response, status=status)
+
+
+
+class ExecutionStatsView(AsyncView):
+    """Allow to get statistics about the executions (see
+    `stats.execution_stats()`).
+    
+    Parameters :
+    
+    * `group` - Comma-separated fields to group by, among `sandbox`, `user`
+       and `bucket`.
+    * `bucket` - Unit of the date buckets (`minute`, `hour`, `day`, `week` or
+       `month`), default to `hour`.
+    * `percentiles` - Comma-separated percentiles of `total_time` to compute,
+       default to `0.5,0.9,0.99`.
+    
+    Every other parameter is a dgeq filter on `Request` (e.g.
+    `date=>2020-01-01T00:00:00` or `sandbox=1`), compressed fields such as
+    `response.result` excepted (see `DeferredQuery`)."""
+    
+    http_method_names = ['get']
+    
+    
+    async def get(self, request):
+        try:
+            def compute():
+                check_perm(
+                    request.user, "django_sandbox.view_request", "Missing view permission on Request"
+                )
+                
+                query_dict = request.GET.copy()
+                group = [g for g in query_dict.pop("group", [""])[-1].split(",") if g]
+                if unknown := set(group) - set(GROUPS):
+                    raise ValidationError({"group": [f"Unknown fields {sorted(unknown)}"]})
+                bucket = query_dict.pop("bucket", ["hour"])[-1]
+                if bucket not in BUCKETS:
+                    raise ValidationError({"bucket": [f"Unknown bucket '{bucket}'"]})
+                try:
+                    percentiles = [
+                        float(p) for p in query_dict.pop("percentiles", ["0.5,0.9,0.99"])[-1].split(",")
+                    ]
+                    if not all(0 <= p <= 1 for p in percentiles):
+                        raise ValueError
+                except ValueError:
+                    raise ValidationError({"percentiles": ["Must be numbers between 0 and 1"]})
+                if commands := [k for k in query_dict.keys() if k.startswith("c:")]:
+                    raise ValidationError({c: ["Commands cannot be used"] for c in commands})
+                
+                # dgeq is only used to filter the queryset
+                query_dict["c:evaluate"] = "0"
+                query = DeferredQuery(
+                    Request, query_dict, user=request.user, use_permissions=True
+                )
+                response = query.evaluate()
+                if response["status"]:
+                    response["rows"] = execution_stats(query.queryset, group, bucket, percentiles)
+                return response
+            
+            response = await run_sync(compute)
+            status = 200 if response["status"] else 400
+        
+        except ValidationError as e:
+            response = {
+                "status":  False,
+                "message": str(e.message_dict),
+                "code":    ErrorCode.from_exception(e).value
+            }
+            status = 400
+        
+        except PermissionDenied as e:
+            response = {
+                "status":  False,
+                "message": str(e),
+                "code":    ErrorCode.from_exception(e).value
+            }
+            status = 403
+        
+        return JsonResponse(response, status=status)
@@ -1,6 +1,28 @@
 from django.apps import AppConfig
+from django.core import checks
+from django.db.models.signals import m2m_changed, post_delete, post_save
 
 
 class PlAuthConfig(AppConfig):
     name = 'pl_auth'
     verbose_name = 'Auth'
+
+
+    def ready(self):
+        """Invalidate the cached permissions of users when they change, and
+        check that they are cached in a cache shared by every process."""
+        from django.contrib.auth.models import Group, Permission, User
+
+        from pl_auth.models import Profile
+        from pl_auth.permissions import (check_permission_cache, clear_permissions, invalidate_user,
+                                         invalidate_user_relations)
+
+        post_save.connect(invalidate_user, sender=User)
+        post_delete.connect(invalidate_user, sender=User)
+        post_save.connect(invalidate_user, sender=Profile)
+        m2m_changed.connect(invalidate_user_relations, sender=User.groups.through)
+        m2m_changed.connect(invalidate_user_relations, sender=User.user_permissions.through)
+        m2m_changed.connect(clear_permissions, sender=Group.permissions.through)
+        post_delete.connect(clear_permissions, sender=Group)
+        post_delete.connect(clear_permissions, sender=Permission)
+        checks.register(check_permission_cache, checks.Tags.caches)
@@ -0,0 +1,22 @@
+from django.contrib.auth.backends import ModelBackend
+
+from pl_auth.permissions import permission_cache
+
+
+class CachedModelBackend(ModelBackend):
+    """A `ModelBackend` retrieving the permissions of users from
+    `permission_cache` instead of querying them on every request.
+
+    As with `ModelBackend`, permissions are then kept on the user object for
+    the rest of the request."""
+
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if (user_obj.is_active and not user_obj.is_anonymous and obj is None
+                and not hasattr(user_obj, '_perm_cache')):
+            permissions = permission_cache.get(user_obj.pk)
+            if permissions is None:
+                permissions = super().get_all_permissions(user_obj)
+                permission_cache.set(user_obj.pk, permissions)
+            user_obj._perm_cache = permissions
+        return super().get_all_permissions(user_obj, obj)
@@ -0,0 +1,100 @@
+from typing import Iterable, Optional, Set
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+
+from common.caches import check_shared_cache
+
+
+class PermissionCache:
+    """Cache of the set of permissions of each user, as returned by
+    `ModelBackend.get_all_permissions()`.
+
+    Sets are stored in the Django cache named by `alias` for `timeout`
+    seconds. Entries are invalidated by the signals connected in
+    `PlAuthConfig.ready()` when a user, its profile, its groups or its
+    permissions change. Since a change to a group or a permission can affect
+    any user, the whole cache is cleared in this case, the cache named by
+    `alias` must thus not be used for anything else.
+
+    Invalidations are only seen by the processes sharing the cache. With a
+    cache local to each process, a revoked permission is still granted by the
+    other processes for up to `timeout` seconds (see `check_permission_cache()`),
+    `timeout` should thus be kept short."""
+
+
+    def __init__(self, alias: str, timeout: int):
+        self.alias = alias
+        self.timeout = timeout
+
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+
+    @staticmethod
+    def key(user_pk: int) -> str:
+        return f"permissions_{user_pk}"
+
+
+    def get(self, user_pk: int) -> Optional[Set[str]]:
+        """Return the permissions of the user of primary key `user_pk`, None
+        if absent."""
+        return self.cache.get(self.key(user_pk))
+
+
+    def set(self, user_pk: int, permissions: Set[str]) -> None:
+        """Store the permissions of the user of primary key `user_pk`."""
+        self.cache.set(self.key(user_pk), permissions, self.timeout)
+
+
+    def invalidate(self, user_pks: Iterable[int]) -> None:
+        """Remove the permissions of the users whose primary key are in
+        `user_pks`."""
+        self.cache.delete_many([self.key(pk) for pk in user_pks])
+
+
+    def clear(self) -> None:
+        """Remove the permissions of every user."""
+        self.cache.clear()
+
+
+permission_cache = PermissionCache(settings.PERMISSION_CACHE, settings.PERMISSION_CACHE_TIMEOUT)
+
+
+def check_permission_cache(app_configs, **kwargs):
+    """Warn if `PERMISSION_CACHE` is not shared by every process."""
+    return check_shared_cache(
+        permission_cache.alias, "PERMISSION_CACHE",
+        "permissions revoked by a process are still granted by the others for up to "
+        "PERMISSION_CACHE_TIMEOUT seconds",
+        "pl_auth.W001"
+    )
+
+
+def invalidate_user(sender, instance, **kwargs):
+    """Invalidate the permissions of a saved or deleted `User` or `Profile`
+    (e.g. `is_active`, `is_superuser` or `role` changed)."""
+    permission_cache.invalidate([instance.pk if isinstance(instance, User) else instance.user_id])
+
+
+def invalidate_user_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    """Invalidate the permissions of the users whose groups or permissions
+    changed."""
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        permission_cache.invalidate([instance.pk])
+    elif pk_set is not None:
+        permission_cache.invalidate(pk_set)
+    else:  # Every user was removed from a group or a permission
+        permission_cache.clear()
+
+
+def clear_permissions(sender, **kwargs):
+    """Clear every permissions when those of a group changed, or when a group
+    or a permission is deleted."""
+    if kwargs.get("action", "post_").startswith("post_"):
+        permission_cache.clear()
@@ -0,0 +1,74 @@
+from django.contrib.auth.models import Group, Permission, User
+from django.test import TestCase
+from pl_lti.role import Role
+
+from pl_auth.permissions import check_permission_cache, permission_cache
+
+
+class PermissionCacheTestCase(TestCase):
+    """ Test the caching of the permissions of users. """
+
+
+    def setUp(self):
+        permission_cache.clear()
+        self.user = User.objects.create_user(username='user', password='12345')
+        self.group = Group.objects.create(name='group')
+        self.permission = Permission.objects.get(codename='view_usage')
+
+
+    def has_perm(self):
+        """Check the permission on a fresh user object, as done by a new
+        request."""
+        return User.objects.get(pk=self.user.pk).has_perm('django_sandbox.view_usage')
+
+
+    def test_cached(self):
+        self.assertFalse(self.has_perm())
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertFalse(user.has_perm('django_sandbox.view_usage'))
+
+
+    def test_user_permissions_changed(self):
+        self.assertFalse(self.has_perm())
+        self.user.user_permissions.add(self.permission)
+        self.assertTrue(self.has_perm())
+        self.permission.user_set.remove(self.user)
+        self.assertFalse(self.has_perm())
+
+
+    def test_groups_changed(self):
+        self.group.permissions.add(self.permission)
+        self.assertFalse(self.has_perm())
+        self.user.groups.add(self.group)
+        self.assertTrue(self.has_perm())
+        self.group.user_set.clear()
+        self.assertFalse(self.has_perm())
+
+
+    def test_group_permissions_changed(self):
+        self.user.groups.add(self.group)
+        self.assertFalse(self.has_perm())
+        self.group.permissions.add(self.permission)
+        self.assertTrue(self.has_perm())
+        self.group.delete()
+        self.assertFalse(self.has_perm())
+
+
+    def test_user_and_profile_saved(self):
+        self.user.user_permissions.add(self.permission)
+        self.assertTrue(self.has_perm())
+
+        permission_cache.set(self.user.pk, set())
+        self.user.profile.role = Role.INSTRUCTOR
+        self.user.profile.save()
+        self.assertTrue(self.has_perm())
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(self.has_perm())
+
+
+    def test_check_permission_cache(self):
+        # The cache of the test settings is local to the process
+        self.assertEqual(["pl_auth.W001"], [w.id for w in check_permission_cache(None)])
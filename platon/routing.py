@@ -1,11 +1,20 @@
 from channels.auth import AuthMiddlewareStack
+from channels.http import AsgiHandler
 from channels.routing import ProtocolTypeRouter, URLRouter
+from django.urls import re_path
 
 from django_sandbox import urls as django_sandbox_url
 
 
 application = ProtocolTypeRouter({
-    # (http->django views is added by default)
+    # Streaming endpoints are handled by consumers, every other request by
+    # django views
+    "http":      URLRouter([
+        re_path(r'^api/sandbox/', AuthMiddlewareStack(
+            URLRouter(django_sandbox_url.http_urlpatterns)
+        )),
+        re_path(r'', AsgiHandler),
+    ]),
     "websocket": AuthMiddlewareStack(
         URLRouter(
             django_sandbox_url.websocket_urlpatterns
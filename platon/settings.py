@@ -165,11 +165,77 @@ DATABASES = {
 
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+CACHES = {
+    'default':            {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Responses of deterministic sandbox executions, least recently used
+    # entries are evicted beyond MAX_ENTRIES.
+    'sandbox_executions': {
+        'BACKEND':  'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sandbox_executions',
+        'TIMEOUT':  60 * 60,
+        'OPTIONS':  {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # UUID of the environments saved on sandboxes, entries expire with the
+    # environments themselves.
+    'sandbox_environments': {
+        'BACKEND':  'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sandbox_environments',
+        'OPTIONS':  {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # Rows returned by the detail endpoints of SandboxSpecs and ContainerSpecs.
+    # Entries are invalidated by the process modifying the rows (e.g. the Celery
+    # worker polling specifications), a cache shared by every process (e.g.
+    # Redis) must be used in production for the others to see the invalidation
+    # before TIMEOUT (warning django_sandbox.W001).
+    'sandbox_details':    {
+        'BACKEND':  'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sandbox_details',
+        'TIMEOUT':  60 * 10,
+        'OPTIONS':  {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # Last polled usage of every sandbox (see SANDBOX_USAGE_SNAPSHOT), must be
+    # shared by every process (e.g. Redis) in production for them to see the
+    # usages polled by the Celery workers (warning django_sandbox.W002).
+    'sandbox_usage_snapshot': {
+        'BACKEND':  'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sandbox_usage_snapshot',
+    },
+    # Permissions of users (see PERMISSION_CACHE). Entries are invalidated by
+    # the process modifying the permissions, a cache shared by every process
+    # (e.g. Redis) must be used in production for the others to see the
+    # invalidation: with this local cache, a revoked permission stays granted
+    # by other processes for up to PERMISSION_CACHE_TIMEOUT (warning
+    # pl_auth.W001). Cleared entirely when the permissions of a group change,
+    # it must not be used for anything else.
+    'permissions':        {
+        'BACKEND':  'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'permissions',
+        'OPTIONS':  {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
 # Authentication
 AUTHENTICATION_BACKENDS = (
-    'django.contrib.auth.backends.ModelBackend',
+    'pl_auth.backends.CachedModelBackend',
     'pl_lti.backends.LTIAuthBackend',
 )
+# Cache (see CACHES) storing the permissions of users, and seconds they are kept.
+# The timeout bounds how long a revoked permission can still be granted by a
+# process not sharing the cache, raise it only with a shared cache.
+PERMISSION_CACHE = 'permissions'
+PERMISSION_CACHE_TIMEOUT = 10
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -254,14 +320,116 @@ CELERY_TIMEZONE = 'Europe/Paris'
 #                            Project's Settings                                #
 ################################################################################
 
+# Database thread pool's settings
+#################################
+# Number of threads (per process) running the database work of async views and
+# consumers. Each thread holds its own database connection, this number times
+# the number of ASGI processes must thus stay below PostgreSQL's max_connections.
+ASYNC_DB_THREADS = 16
+# Upper bounds (in seconds) of the buckets of the histogram of the time spent
+# by jobs waiting for a thread.
+ASYNC_DB_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+# Saturation of the pool (running and waiting jobs over the number of threads)
+# above which a warning is logged.
+ASYNC_DB_SATURATION_WARNING = 1.5
+# Minimum seconds between two saturation warnings.
+ASYNC_DB_WARNING_INTERVAL = 60
+
 # Sandbox's settings
 ####################
 # Seconds between polls of sandboxes usage. Must not be less than 30.
 SANDBOX_POLL_USAGE_EVERY = 15
 # Seconds between polls of sandboxes specifications. Must not be less than 300.
 SANDBOX_POLL_SPECS_EVERY = 60 * 10
+# Seconds a sandbox has to answer a poll before being considered unreached.
+SANDBOX_POLL_TIMEOUT = 10
+# Consecutive failed requests (polls or executions) after which no execution
+# is sent to a sandbox anymore.
+SANDBOX_BREAKER_THRESHOLD = 3
+# Seconds before a probe execution is sent to a failing sandbox, doubled after
+# every failed probe up to SANDBOX_BREAKER_MAX_BACKOFF.
+SANDBOX_BREAKER_BACKOFF = 5
+SANDBOX_BREAKER_MAX_BACKOFF = 60 * 5
+# Maximum number of attempts of an idempotent execution (not saving its
+# environment) failing to reach its sandbox.
+SANDBOX_RETRY_ATTEMPTS = 3
+# Maximum delay (in seconds) before the first retry, doubled after every retry
+# up to SANDBOX_RETRY_MAX_BACKOFF. The actual delay is randomly chosen below.
+SANDBOX_RETRY_BACKOFF = 0.2
+SANDBOX_RETRY_MAX_BACKOFF = 2
+# Number of executions whose latency is kept to compute percentiles.
+SANDBOX_LATENCY_WINDOW = 1000
+# Whether balanced executions are hedged by default: a duplicate is sent to
+# another sandbox when the first one takes longer than the
+# SANDBOX_HEDGE_PERCENTILE of the observed latencies.
+SANDBOX_HEDGE = False
+SANDBOX_HEDGE_PERCENTILE = 0.95
+# Number of latencies needed before executions are hedged.
+SANDBOX_HEDGE_MIN_SAMPLES = 20
+# Maximum number of executions of a batch running at once.
+SANDBOX_BATCH_CONCURRENCY = 32
+# Maximum number of executions in a single batch sent to the batch endpoint.
+SANDBOX_BATCH_MAX_SIZE = 1000
+# Number of characters of a command's stdout / stderr (and of an execution's
+# result) that are saved, the middle of longer outputs is dropped. None to
+# save them entirely.
+SANDBOX_OUTPUT_MAX_SIZE = 64 * 1024
+# Codec used to compress saved outputs, either 'zlib', 'zstd' (requires the
+# `zstandard` package) or None.
+SANDBOX_OUTPUT_COMPRESSION = 'zlib'
+# Outputs shorter than this number of bytes are saved uncompressed.
+SANDBOX_OUTPUT_COMPRESSION_THRESHOLD = 1024
+# Cache (see CACHES) storing the last polled usage of every sandbox, and seconds
+# after which it is rebuilt from the database if the poller did not update it.
+SANDBOX_USAGE_SNAPSHOT = 'sandbox_usage_snapshot'
+SANDBOX_USAGE_SNAPSHOT_TIMEOUT = SANDBOX_POLL_USAGE_EVERY * 3
+# Seconds raw usages are kept before being rolled up into minute aggregates.
+SANDBOX_USAGE_RAW_RETENTION = 60 * 60 * 24
+# Seconds minute aggregates are kept before being rolled up into hour aggregates.
+SANDBOX_USAGE_MINUTE_RETENTION = 60 * 60 * 24 * 7
+# Seconds hour aggregates are kept, None to keep them forever.
+SANDBOX_USAGE_HOUR_RETENTION = None
+# Seconds between compactions of usages.
+SANDBOX_USAGE_COMPACT_EVERY = 60 * 60
 # Default sandbox url
 SANDBOX_URL = 'http://localhost:7000/'
+# Maximum number of concurrent requests a process sends to a single sandbox.
+SANDBOX_POOL_MAX_CONNECTIONS = 100
+# Seconds after which an unused sandbox client (and its connections) is closed.
+SANDBOX_POOL_IDLE_TIMEOUT = 60
+# Policy used by Sandbox.objects.execute_balanced() to select a sandbox, see
+# django_sandbox.scheduling for the available policies.
+SANDBOX_SCHEDULING_POLICY = 'django_sandbox.scheduling.LeastLoadedPolicy'
+# Seconds during which the updates received by a monitoring websocket
+# (see MonitoringConsumer) are coalesced into a single frame.
+SANDBOX_MONITORING_BATCH_DELAY = 0.5
+# Maximum number of (sandbox, stream) pairs a monitoring websocket can
+# subscribe to.
+SANDBOX_MONITORING_MAX_SUBSCRIPTIONS = 300
+# Maximum number of executions waiting in the execution queue of a process.
+SANDBOX_QUEUE_MAX_DEPTH = 1000
+# Maximum number of queued executions running at once for a single user.
+SANDBOX_QUEUE_MAX_PER_USER = 2
+# Maximum number of queued executions running at once for a single course.
+SANDBOX_QUEUE_MAX_PER_COURSE = 100
+# Number of containers assumed for a sandbox whose specifications were not polled yet.
+SANDBOX_QUEUE_DEFAULT_CAPACITY = 4
+# Seconds a finished queued execution can still be retrieved by its ticket's id.
+SANDBOX_QUEUE_TICKET_TTL = 60 * 5
+# Cache (see CACHES) storing the responses of executions made with `cache=True`.
+SANDBOX_EXECUTION_CACHE = 'sandbox_executions'
+# Cache (see CACHES) storing the UUID of the environments saved on sandboxes,
+# so that identical environments are only sent once. None to always send them.
+SANDBOX_ENVIRONMENT_CACHE = 'sandbox_environments'
+# Seconds before their expiration environments saved on sandboxes stop being
+# used.
+SANDBOX_ENVIRONMENT_CACHE_MARGIN = 60
+# Cache (see CACHES) storing the rows returned by the detail endpoints of
+# SandboxSpecs and ContainerSpecs.
+SANDBOX_DETAIL_CACHE = 'sandbox_details'
+# Size (in bytes) of the chunks environments downloaded from sandboxes are
+# streamed by.
+SANDBOX_DOWNLOAD_CHUNK_SIZE = 64 * 1024
 ################################################################################
 
 if APPS_DIR not in sys.path:  # pragma: no cover